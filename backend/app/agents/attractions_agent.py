@@ -1,81 +1,62 @@
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
-from datetime import datetime
-from dotenv import load_dotenv
-import os
-
-from app.planner import generate_plan
-from app.schemas import TravelPlan
-
-load_dotenv()
-
-if not os.getenv("OPENAI_API_KEY"):
-    raise ValueError("OPENAI_API_KEY missing in .env file")
-
-
-limiter = Limiter(key_func=get_remote_address)
-
-app = FastAPI()
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
-
-
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:3000"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-
-class TravelRequest(BaseModel):
-    source: str
-    destination: str
-    depart_date: str
-    return_date: str
-    theme: str = "Luxury"
-    num_days: Optional[int] = None
-
-
-@app.get("/health")
-async def health():
-    return {"status": "healthy", "server_time": datetime.now().isoformat()}
-
-
-@app.post("/api/generate_plan")
-@limiter.limit("5/minute")
-async def create_plan(request: Request, req: TravelRequest):
-
-    if not req.depart_date or not req.return_date:
-        raise HTTPException(400, "Both depart_date and return_date are required")
-
-    if not req.num_days:
-        d1 = datetime.fromisoformat(req.depart_date)
-        d2 = datetime.fromisoformat(req.return_date)
-        req.num_days = max(1, (d2 - d1).days)
-
-    city_map = {"GOI": "Goa", "DEL": "Delhi", "JAI": "Jaipur", "BOM": "Mumbai"}
-    destination_city = city_map.get(req.destination.upper(), req.destination)
-
-    payload = {
-        "source": req.source.upper(),
-        "destination": req.destination.upper(),
-        "destination_city": destination_city,
-        "depart_date": req.depart_date,
-        "return_date": req.return_date,
-        "num_days": req.num_days,
-        "theme": req.theme,
-    }
+import logging
+from typing import Dict, Any, List
+from app.utils.openai_helper import ask_llm, ask_llm_async
+from app.schemas import AttractionsResponse
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = """
+Return ONLY valid JSON: an "attractions" list; "why" is one short line, "best_time" e.g. early morning.
+"""
+
+SAMPLE = [
+    {"name": "Old Town Heritage Walk", "why": "Historic streets and local architecture", "best_time": "Morning"},
+    {"name": "City Museum", "why": "Art and history of the region", "best_time": "Afternoon"},
+    {"name": "Sunset Viewpoint", "why": "Panoramic views over the city", "best_time": "Evening"}
+]
+
+def _to_attractions(data: Any) -> List[Dict[str, Any]]:
+    if isinstance(data, list):
+        return [item for item in data if isinstance(item, dict)]
+    if isinstance(data, dict):
+        for key in ("attractions", "places", "items", "results", "data"):
+            if key in data and isinstance(data[key], list):
+                return [item for item in data[key] if isinstance(item, dict)]
+        maybe = []
+        for k, v in data.items():
+            if isinstance(v, str):
+                maybe.append({"name": k, "why": v, "best_time": ""})
+        if maybe:
+            return maybe
+    return []
+
+def _prompt(state: Dict[str, Any]) -> str:
+    dest = state.get("destination", "Unknown")
+    theme = state.get("theme", "General")
+    return f"Suggest 6 must-see attractions in {dest} for a {theme} trip. For each give one short line on why to visit and the best time of day."
+
+def _from_raw(raw: Any) -> List[Dict[str, Any]]:
+    if raw is None:
+        logger.warning("attractions_agent: ask_llm returned None")
+        return SAMPLE
+    normalized = _to_attractions(raw)
+    if not normalized:
+        logger.warning("attractions_agent: normalization empty; raw=%s", repr(raw)[:1000])
+        return SAMPLE
+    return normalized
+
+def attractions_agent(state: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        raw = ask_llm(_prompt(state), SYSTEM_PROMPT, schema=AttractionsResponse)
+        return {"attractions": _from_raw(raw)}
+    except Exception:
+        logger.exception("attractions_agent error")
+        return {"attractions": SAMPLE}
 
+async def attractions_agent_async(state: Dict[str, Any]) -> Dict[str, Any]:
     try:
-        result = generate_plan(payload)
-        return TravelPlan(**result).model_dump()
-    except Exception as e:
-        raise HTTPException(500, f"Travel plan generation failed: {str(e)}")
+        raw = await ask_llm_async(_prompt(state), SYSTEM_PROMPT, schema=AttractionsResponse)
+        return {"attractions": _from_raw(raw)}
+    except Exception:
+        logger.exception("attractions_agent error")
+        return {"attractions": SAMPLE}
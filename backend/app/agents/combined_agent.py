@@ -0,0 +1,90 @@
+import asyncio
+import logging
+from typing import Dict, Any
+from app.utils.openai_helper import ask_llm, ask_llm_async
+from app.schemas import CombinedResponse
+from app.agents.hotels_agent import hotels_agent, hotels_agent_async, _to_hotels, _prompt as _hotels_prompt, FALLBACK as HOTELS_FALLBACK
+from app.agents.restaurants_agent import restaurants_agent, restaurants_agent_async, _to_restaurants, _prompt as _restaurants_prompt
+from app.agents.transport_agent import (
+    transport_agent, transport_agent_async, _to_transport, _prompt as _transport_prompt, FALLBACK as TRANSPORT_FALLBACK
+)
+from app.agents.weather_agent import (
+    weather_agent, weather_agent_async, _to_weather, _prompt as _weather_prompt, FALLBACK as WEATHER_FALLBACK
+)
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = """
+Return ONLY valid JSON with one key per section: hotels, restaurants, transport and weather.
+"""
+
+# section -> (prompt, normaliser, fallback agent, async fallback agent)
+SECTIONS = {
+    "hotels": (_hotels_prompt, _to_hotels, hotels_agent, hotels_agent_async),
+    "restaurants": (_restaurants_prompt, _to_restaurants, restaurants_agent, restaurants_agent_async),
+    "transport": (_transport_prompt, _to_transport, transport_agent, transport_agent_async),
+    "weather": (_weather_prompt, _to_weather, weather_agent, weather_agent_async),
+}
+
+
+def _prompt(state: Dict[str, Any]) -> str:
+    tasks = "\n".join(
+        f"{i}. {key}: {prompt(state)}"
+        for i, (key, (prompt, _, _, _)) in enumerate(SECTIONS.items(), start=1)
+    )
+    return f"Answer all of the following in one JSON object, one key per section.\n{tasks}"
+
+
+def _split(raw: Any) -> Dict[str, Any]:
+    """
+    Pull each section out of the combined answer using the per-agent normalisers.
+    Sections that are missing or don't normalise are left out.
+    """
+    out: Dict[str, Any] = {}
+    if not isinstance(raw, dict):
+        return out
+    for key, (_, normalize, _, _) in SECTIONS.items():
+        try:
+            section = normalize(raw.get(key))
+        except Exception:
+            continue
+        # the normalisers pad or replace what's missing, so a fallback means "not answered"
+        if section and section not in (HOTELS_FALLBACK, TRANSPORT_FALLBACK, WEATHER_FALLBACK):
+            out[key] = section
+    return out
+
+
+def combined_agent(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    One LLM round trip for hotels, restaurants, transport and weather.
+    Any section missing from the answer is produced by its own agent instead.
+    """
+    try:
+        out = _split(ask_llm(_prompt(state), SYSTEM_PROMPT, schema=CombinedResponse))
+    except Exception:
+        logger.exception("combined_agent error")
+        out = {}
+
+    for key, (_, _, agent, _) in SECTIONS.items():
+        if key not in out:
+            logger.warning("combined_agent: %s missing; falling back to %s_agent", key, key)
+            out.update(agent(state))
+    return out
+
+
+async def combined_agent_async(state: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        out = _split(await ask_llm_async(_prompt(state), SYSTEM_PROMPT, schema=CombinedResponse))
+    except Exception:
+        logger.exception("combined_agent error")
+        out = {}
+
+    missing = [key for key in SECTIONS if key not in out]
+    if missing:
+        logger.warning("combined_agent: %s missing; falling back to per-agent calls", ", ".join(missing))
+        results = await asyncio.gather(
+            *(SECTIONS[key][3](state) for key in missing)
+        )
+        for result in results:
+            out.update(result)
+    return out
@@ -1,21 +1,36 @@
 import logging
 from typing import Dict, Any
-from app.utils.serpapi_helper import fetch_flights
+from app.utils.serpapi_helper import (
+    fetch_fare_calendar, fetch_fare_calendar_async, fetch_flights, fetch_flights_async
+)
 
 logger = logging.getLogger(__name__)
 
+def _search_args(state: Dict[str, Any]) -> tuple:
+    src = state.get("source", "BOM")
+    dest_code = state.get("destination_code", "GOI")
+    depart = state.get("depart_date")
+    ret = state.get("return_date")
+    return src, dest_code, depart, ret
+
+def _flex_days(state: Dict[str, Any]) -> int:
+    try:
+        return max(0, int(state.get("flex_days") or 0))
+    except (TypeError, ValueError):
+        return 0
+
 def flights_agent(state: Dict[str, Any]) -> Dict[str, Any]:
     """
     STRICT: Only fetch flights from SerpAPI.
     No LLM fallback. No sample fallback unless SerpAPI hard fails.
+    With flex_days set, the +/- window is searched too and a fare calendar is added.
     """
     try:
-        src = state.get("source", "BOM")
-        dest_code = state.get("destination_code", "GOI")
-        depart = state.get("depart_date")
-        ret = state.get("return_date")
+        if _flex_days(state):
+            flights, calendar = fetch_fare_calendar(*_search_args(state), days=_flex_days(state))
+            return {"flights": flights if isinstance(flights, list) else [], "fare_calendar": calendar}
 
-        flights = fetch_flights(src, dest_code, depart, ret)
+        flights = fetch_flights(*_search_args(state))
 
         # If fetch_flights returned None or invalid, return empty list
         if not isinstance(flights, list):
@@ -26,3 +41,17 @@ def flights_agent(state: Dict[str, Any]) -> Dict[str, Any]:
     except Exception:
         logger.exception("flights_agent error")
         return {"flights": []}
+
+async def flights_agent_async(state: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        if _flex_days(state):
+            flights, calendar = await fetch_fare_calendar_async(*_search_args(state), days=_flex_days(state))
+            return {"flights": flights if isinstance(flights, list) else [], "fare_calendar": calendar}
+
+        flights = await fetch_flights_async(*_search_args(state))
+        if not isinstance(flights, list):
+            flights = []
+        return {"flights": flights}
+    except Exception:
+        logger.exception("flights_agent error")
+        return {"flights": []}
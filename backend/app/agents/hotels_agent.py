@@ -1,38 +1,41 @@
 import logging
 from typing import Dict, Any
-from app.utils.openai_helper import ask_llm
+from app.utils.openai_helper import ask_llm, ask_llm_async
+from app.schemas import Hotels
 
 logger = logging.getLogger(__name__)
 
 SYSTEM_PROMPT = """
-Return ONLY valid JSON.
-Format:
-{
-  "budget": [
-    {"name":"", "price":"", "area":"", "highlights":["",""]}
-  ],
-  "mid_range": [
-    {"name":"", "price":"", "area":"", "highlights":["",""]}
-  ],
-  "luxury": [
-    {"name":"", "price":"", "area":"", "highlights":["",""]}
-  ]
-}
+Return ONLY valid JSON: hotels grouped into budget, mid_range and luxury tiers.
 """
 
+FALLBACK = {"budget": [], "mid_range": [], "luxury": []}
+
+def _prompt(state: Dict[str, Any]) -> str:
+    dest = state.get("destination", "Unknown")
+    theme = state.get("theme", "General")
+    return f"Suggest 3 hotels each for budget, mid-range and luxury in {dest}. Theme: {theme} in Indian currency."
+
+def _to_hotels(data: Any) -> Dict[str, Any]:
+    if not isinstance(data, dict):
+        raise ValueError("Invalid hotels response")
+    for k in ["budget", "mid_range", "luxury"]:
+        if k not in data:
+            data[k] = []
+    return data
+
 def hotels_agent(state: Dict[str, Any]) -> Dict[str, Any]:
     try:
-        dest = state.get("destination", "Unknown")
-        theme = state.get("theme", "General")
-        prompt = f"Suggest 3 hotels each for budget, mid-range and luxury in {dest}. Theme: {theme} in Indian currency."
-        data = ask_llm(prompt, SYSTEM_PROMPT)
-      
-        if not isinstance(data, dict):
-            raise ValueError("Invalid hotels response")
-        for k in ["budget", "mid_range", "luxury"]:
-            if k not in data:
-                data[k] = []
-        return {"hotels": data}
+        data = ask_llm(_prompt(state), SYSTEM_PROMPT, schema=Hotels)
+        return {"hotels": _to_hotels(data)}
     except Exception as e:
         logger.exception("hotels_agent error")
-        return {"hotels": {"budget": [], "mid_range": [], "luxury": []}}
+        return {"hotels": FALLBACK}
+
+async def hotels_agent_async(state: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        data = await ask_llm_async(_prompt(state), SYSTEM_PROMPT, schema=Hotels)
+        return {"hotels": _to_hotels(data)}
+    except Exception:
+        logger.exception("hotels_agent error")
+        return {"hotels": FALLBACK}
@@ -1,17 +1,13 @@
 import logging
 import re
 from typing import Dict, Any, List
-from app.utils.openai_helper import ask_llm
+from app.utils.openai_helper import ask_llm, ask_llm_async
+from app.schemas import ItineraryResponse
 
 logger = logging.getLogger(__name__)
 
 SYSTEM_PROMPT = """
-Return ONLY valid JSON.
-Format: An array of objects:
-[
-  {"day": 1, "morning": "short", "afternoon": "short", "evening": "short"},
-  ...
-]
+Return ONLY valid JSON: an "itinerary" list with one entry per day (day, morning, afternoon, evening).
 Important:
 - The 'destination' value you receive may be an IATA code; treat any code as the corresponding CITY NAME.
 - If the state contains "trip_type": "business", you may include corporate activities. Otherwise, ALWAYS produce a TOURIST itinerary (no company visits, no headquarters, no R&D tours).
@@ -34,28 +30,67 @@ _CORPORATE_KEYWORDS = [
 _CORP_RE = re.compile("|".join(_CORPORATE_KEYWORDS), flags=re.IGNORECASE)
 
 
+# Applied in this order, case-insensitively, to any slot that mentions a corporate keyword.
+_SUBSTITUTIONS = [
+    ("headquarters", "a local museum"),
+    ("R&D", "a science/technology exhibit"),
+    ("research and development", "a technology museum"),
+    ("seminar", "a local cultural talk"),
+    ("workshop", "a handicraft workshop"),
+    ("presentation", "a guided museum tour"),
+    ("meeting", "a leisurely city walk"),
+    ("network", "a food tour or cultural meetup"),
+    ("executive", "local leaders/historians"),
+    ("employees", "locals"),
+    ("company", "local attraction"),
+    ("business", "leisure"),
+    ("product launch", "local festival or event")
+]
+_REPLACEMENTS = {old.lower(): new for old, new in _SUBSTITUTIONS}
+# One pass over the text: no term contains another, so the leftmost match is the
+# same span the in-order substitutions would have replaced.
+_SUBSTITUTION_RE = re.compile("|".join(re.escape(old) for old, _ in _SUBSTITUTIONS), flags=re.IGNORECASE)
+_ORDERED_RES = [(re.compile(re.escape(old), flags=re.IGNORECASE), new) for old, new in _SUBSTITUTIONS]
+
+
+def _overlap_patterns() -> List[str]:
+    """
+    Text where one pass and the in-order substitutions can disagree: two terms
+    sharing letters ("networkshop"), or a replacement running into the following
+    text to spell a later term ("headquarters" + "eeting" -> "a local museum" + "eeting").
+    """
+    patterns = set()
+    for i, (a, new_a) in enumerate(_SUBSTITUTIONS):
+        for j, (b, _) in enumerate(_SUBSTITUTIONS):
+            a_l, b_l, new_l = a.lower(), b.lower(), new_a.lower()
+            for k in range(1, min(len(a_l), len(b_l))):
+                if i != j and a_l[-k:] == b_l[:k]:
+                    patterns.add(a_l + b_l[k:])
+            if j > i:
+                for k in range(1, min(len(new_l), len(b_l))):
+                    if new_l[-k:] == b_l[:k]:
+                        patterns.add(a_l + b_l[k:])
+    return sorted(patterns)
+
+
+_OVERLAP_RE = re.compile("|".join(re.escape(p) for p in _overlap_patterns()), flags=re.IGNORECASE)
+
+
+def _replace(match: "re.Match") -> str:
+    return _REPLACEMENTS[match.group(0).lower()]
+
+
 def _sanitize_text_for_tourist(text: str) -> str:
     if not text:
         return ""
     if _CORP_RE.search(text):
-        substitutions = [
-            ("headquarters", "a local museum"),
-            ("R&D", "a science/technology exhibit"),
-            ("research and development", "a technology museum"),
-            ("seminar", "a local cultural talk"),
-            ("workshop", "a handicraft workshop"),
-            ("presentation", "a guided museum tour"),
-            ("meeting", "a leisurely city walk"),
-            ("network", "a food tour or cultural meetup"),
-            ("executive", "local leaders/historians"),
-            ("employees", "locals"),
-            ("company", "local attraction"),
-            ("business", "leisure"),
-            ("product launch", "local festival or event")
-        ]
-        sanitized = text
-        for old, new in substitutions:
-            sanitized = re.sub(re.escape(old), new, sanitized, flags=re.IGNORECASE)
+        if _OVERLAP_RE.search(text):
+            # rare enough that the exact, slower path is fine
+            sanitized = text
+            for pattern, new in _ORDERED_RES:
+                sanitized = pattern.sub(new, sanitized)
+        else:
+            sanitized = _SUBSTITUTION_RE.sub(_replace, text)
         if _CORP_RE.search(sanitized):
             return "Explore a cultural attraction nearby."
         return sanitized
@@ -100,48 +135,66 @@ def _to_itinerary(data: Any, num_days: int) -> List[Dict[str, Any]]:
     return out
 
 
+def _prompt(state: Dict[str, Any]) -> str:
+    dest_city = state.get("destination") or state.get("destination_code") or "Unknown"
+    dest_code = state.get("destination_code", "")
+    days = int(state.get("num_days", 1))
+    trip_type = state.get("trip_type", "tourist").lower()
+    theme = state.get("theme", "General")
+
+    
+    extra = f" (IATA: {dest_code})" if dest_code else ""
+    return (
+        f"Destination: {dest_city}{extra}.\n"
+        f"Trip type: {trip_type}.\n"
+        f"Theme: {theme}.\n"
+        f"Create a {days}-day itinerary for {dest_city}. "
+        "Keep each slot to one short sentence and avoid any corporate visits unless trip_type='business'."
+    )
+
+
+def _from_raw(raw: Any, state: Dict[str, Any]) -> List[Dict[str, Any]]:
+    days = int(state.get("num_days", 1))
+    trip_type = state.get("trip_type", "tourist").lower()
+
+    if raw is None:
+        logger.warning("itinerary_agent: ask_llm returned None; using SAMPLE")
+        return _to_itinerary(SAMPLE, days)
+
+    itinerary = _to_itinerary(raw, days)
+
+    
+    if trip_type != "business":
+        for day in itinerary:
+            for slot in ("morning", "afternoon", "evening"):
+                original = day.get(slot, "") or ""
+                sanitized = _sanitize_text_for_tourist(original)
+                if not sanitized.strip() and _CORP_RE.search(original):
+                    sanitized = "Explore a cultural attraction nearby."
+                day[slot] = sanitized if sanitized else original
+
+    
+    for d in itinerary:
+        for slot in ("morning", "afternoon", "evening"):
+            d[slot] = (d.get(slot) or "").strip()
+
+    return itinerary
+
+
 def itinerary_agent(state: Dict[str, Any]) -> Dict[str, Any]:
     try:
-        
-        dest_city = state.get("destination") or state.get("destination_code") or "Unknown"
-        dest_code = state.get("destination_code", "")
-        days = int(state.get("num_days", 1))
-        trip_type = state.get("trip_type", "tourist").lower()
-        depart_date = state.get("depart_date") or ""
-
-        
-        extra = f" (IATA: {dest_code})" if dest_code else ""
-        prompt = (
-            f"Destination: {dest_city}{extra}.\n"
-            f"Trip type: {trip_type}.\n"
-            f"Create a {days}-day itinerary for {dest_city}. "
-            "Keep each slot to one short sentence and avoid any corporate visits unless trip_type='business'."
-        )
-
-        raw = ask_llm(prompt, SYSTEM_PROMPT)
-
-        if raw is None:
-            logger.warning("itinerary_agent: ask_llm returned None; using SAMPLE")
-            return {"itinerary": _to_itinerary(SAMPLE, days)}
-
-        itinerary = _to_itinerary(raw, days)
-
-        
-        if trip_type != "business":
-            for day in itinerary:
-                for slot in ("morning", "afternoon", "evening"):
-                    original = day.get(slot, "") or ""
-                    sanitized = _sanitize_text_for_tourist(original)
-                    if not sanitized.strip() and _CORP_RE.search(original):
-                        sanitized = "Explore a cultural attraction nearby."
-                    day[slot] = sanitized if sanitized else original
-
-        
-        for d in itinerary:
-            for slot in ("morning", "afternoon", "evening"):
-                d[slot] = (d.get(slot) or "").strip()
+        raw = ask_llm(_prompt(state), SYSTEM_PROMPT, schema=ItineraryResponse)
+        return {"itinerary": _from_raw(raw, state)}
 
-        return {"itinerary": itinerary}
+    except Exception:
+        logger.exception("itinerary_agent error")
+        return {"itinerary": _to_itinerary(SAMPLE, int(state.get("num_days", 1)))}
+
+
+async def itinerary_agent_async(state: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        raw = await ask_llm_async(_prompt(state), SYSTEM_PROMPT, schema=ItineraryResponse)
+        return {"itinerary": _from_raw(raw, state)}
 
     except Exception:
         logger.exception("itinerary_agent error")
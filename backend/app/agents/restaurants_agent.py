@@ -1,15 +1,12 @@
 import logging
 from typing import Dict, Any, List
-from app.utils.openai_helper import ask_llm
+from app.utils.openai_helper import ask_llm, ask_llm_async
+from app.schemas import RestaurantsResponse
 
 logger = logging.getLogger(__name__)
 
 SYSTEM_PROMPT = """
-Return ONLY valid JSON.
-Format:
-[
-  {"name":"", "cuisine":"", "must_try": ["dish1", "dish2"]}
-]
+Return ONLY valid JSON: a "restaurants" list with name, cuisine and must_try dishes for each.
 """
 
 SAMPLE = [
@@ -33,19 +30,32 @@ def _to_restaurants(data: Any) -> List[Dict[str, Any]]:
             return maybe
     return []
 
+def _prompt(state: Dict[str, Any]) -> str:
+    dest = state.get("destination", "Unknown")
+    return f"Suggest 6 restaurants in {dest} covering budget, mid-range and splurge options. For each include cuisine and 1-2 must-try dishes."
+
+def _from_raw(raw: Any) -> List[Dict[str, Any]]:
+    if raw is None:
+        logger.warning("restaurants_agent: ask_llm returned None")
+        return SAMPLE
+    normalized = _to_restaurants(raw)
+    if not normalized:
+        logger.warning("restaurants_agent: normalization empty; raw=%s", repr(raw)[:1000])
+        return SAMPLE
+    return normalized
+
 def restaurants_agent(state: Dict[str, Any]) -> Dict[str, Any]:
     try:
-        dest = state.get("destination", "Unknown")
-        prompt = f"Suggest 6 restaurants in {dest} covering budget, mid-range and splurge options. For each include cuisine and 1-2 must-try dishes."
-        raw = ask_llm(prompt, SYSTEM_PROMPT)
-        if raw is None:
-            logger.warning("restaurants_agent: ask_llm returned None")
-            return {"restaurants": SAMPLE}
-        normalized = _to_restaurants(raw)
-        if not normalized:
-            logger.warning("restaurants_agent: normalization empty; raw=%s", repr(raw)[:1000])
-            return {"restaurants": SAMPLE}
-        return {"restaurants": normalized}
+        raw = ask_llm(_prompt(state), SYSTEM_PROMPT, schema=RestaurantsResponse)
+        return {"restaurants": _from_raw(raw)}
+    except Exception:
+        logger.exception("restaurants_agent error")
+        return {"restaurants": SAMPLE}
+
+async def restaurants_agent_async(state: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        raw = await ask_llm_async(_prompt(state), SYSTEM_PROMPT, schema=RestaurantsResponse)
+        return {"restaurants": _from_raw(raw)}
     except Exception:
         logger.exception("restaurants_agent error")
         return {"restaurants": SAMPLE}
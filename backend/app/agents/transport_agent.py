@@ -1,23 +1,41 @@
 import logging
 from typing import Dict, Any
-from app.utils.openai_helper import ask_llm
+from pydantic import ValidationError
+from app.utils.openai_helper import ask_llm, ask_llm_async
+from app.schemas import Transport
 
 logger = logging.getLogger(__name__)
 
 SYSTEM_PROMPT = """
-Return ONLY valid JSON.
-Format:
-{"best_way":"e.g. taxi/metro", "avg_cost":"e.g. ₹500/day", "tips":"short tips"}
+Return ONLY valid JSON. best_way e.g. taxi/metro, avg_cost e.g. ₹500/day, tips kept short.
 """
 
+FALLBACK = {"best_way": "", "avg_cost": "", "tips": ""}
+
+def _prompt(state: Dict[str, Any]) -> str:
+    dest = state.get("destination", "Unknown")
+    return f"Best ways to get around {dest} for tourists. Provide an average per-day cost and short practical tips."
+
+def _to_transport(data: Any) -> Dict[str, Any]:
+    """The transport section, or FALLBACK if the response is empty or not a Transport."""
+    try:
+        return Transport.model_validate(data).model_dump()
+    except ValidationError:
+        logger.warning("transport_agent: invalid response; raw=%s", repr(data)[:1000])
+        return FALLBACK
+
 def transport_agent(state: Dict[str, Any]) -> Dict[str, Any]:
     try:
-        dest = state.get("destination", "Unknown")
-        prompt = f"Best ways to get around {dest} for tourists. Provide an average per-day cost and short practical tips."
-        data = ask_llm(prompt, SYSTEM_PROMPT)
-        if not isinstance(data, dict):
-            raise ValueError("Invalid transport response")
-        return {"transport": data}
+        data = ask_llm(_prompt(state), SYSTEM_PROMPT, schema=Transport)
+        return {"transport": _to_transport(data)}
     except Exception as e:
         logger.exception("transport_agent error")
-        return {"transport": {"best_way": "", "avg_cost": "", "tips": ""}}
+        return {"transport": FALLBACK}
+
+async def transport_agent_async(state: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        data = await ask_llm_async(_prompt(state), SYSTEM_PROMPT, schema=Transport)
+        return {"transport": _to_transport(data)}
+    except Exception:
+        logger.exception("transport_agent error")
+        return {"transport": FALLBACK}
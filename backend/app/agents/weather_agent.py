@@ -1,42 +1,61 @@
+import calendar
 import logging
 from typing import Dict, Any
-from app.utils.openai_helper import ask_llm
+from pydantic import ValidationError
+from app.utils.openai_helper import ask_llm, ask_llm_async
+from app.schemas import Weather
 
 logger = logging.getLogger(__name__)
 
 SYSTEM_PROMPT = """
-Return ONLY valid JSON.
-Format:
-{
-  "summary": "short text",
-  "temperature": "e.g. 28°C",
-  "recommendation": "short advice"
-}
+Return ONLY valid JSON. summary is short text, temperature e.g. 28°C, recommendation is short advice.
 """
 
+FALLBACK = {
+    "summary": "Not available",
+    "temperature": "",
+    "recommendation": ""
+}
+
+def _travel_month(state: Dict[str, Any]) -> str:
+    depart = state.get("depart_date") or ""
+    try:
+        return calendar.month_name[int(depart[5:7])]
+    except (ValueError, IndexError):
+        return ""
+
+def _prompt(state: Dict[str, Any]) -> str:
+    dest = state.get("destination", "Unknown")
+    days = int(state.get("num_days", 3))
+    month = _travel_month(state)
+    when = f" in {month}" if month else ""
+    return f"Provide a {days}-day weather summary for {dest}{when} and a short recommendation for travelers."
+
+def _to_weather(data: Any) -> Dict[str, Any]:
+    """The weather section, or FALLBACK if the response is empty or not a Weather."""
+    try:
+        return Weather.model_validate(data).model_dump()
+    except ValidationError:
+        logger.warning("weather_agent: invalid response; raw=%s", repr(data)[:1000])
+        return FALLBACK
+
 def weather_agent(state: Dict[str, Any]) -> Dict[str, Any]:
     """
     Uses ONLY OpenAI structured output.
     You don't have openweather_helper so no real API calls.
     """
     try:
-        dest = state.get("destination", "Unknown")
-        days = int(state.get("num_days", 3))
-
-        prompt = f"Provide a {days}-day weather summary for {dest} and a short recommendation for travelers."
-        data = ask_llm(prompt, SYSTEM_PROMPT)
-
-        if not isinstance(data, dict):
-            raise ValueError("Invalid weather response")
-
-        return {"weather": data}
+        data = ask_llm(_prompt(state), SYSTEM_PROMPT, schema=Weather)
+        return {"weather": _to_weather(data)}
 
     except Exception as e:
         logger.exception("weather_agent error")
-        return {
-            "weather": {
-                "summary": "Not available",
-                "temperature": "",
-                "recommendation": ""
-            }
-        }
+        return {"weather": FALLBACK}
+
+async def weather_agent_async(state: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        data = await ask_llm_async(_prompt(state), SYSTEM_PROMPT, schema=Weather)
+        return {"weather": _to_weather(data)}
+    except Exception:
+        logger.exception("weather_agent error")
+        return {"weather": FALLBACK}
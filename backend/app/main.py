@@ -1 +1,432 @@
+from fastapi import Depends, FastAPI, Header, HTTPException, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+from slowapi.util import get_remote_address
+from datetime import datetime
+from dotenv import load_dotenv
+import asyncio
+import json
+import logging
+import math
+import os
 
+# before the app modules, which read their settings from the environment at import
+load_dotenv()
+
+from app.planner import generate_plan_async, generate_plans_async, revise_plan_async, stream_plan_async, warm_up
+from app.schemas import TravelPlan
+from app.utils.airports import airport_index, city_for_code, resolve_code
+from app.utils.cache import agent_cache
+from app.utils.job_queue import JOB_POLL_SECONDS, PRIORITY_DEFAULT, TERMINAL, LocalJobQueue, QueueFullError, job_queue
+from app.utils.metrics import REGISTRY, PROMETHEUS_CONTENT_TYPE
+from app.utils.openai_helper import llm_limiter
+from app.utils.plan_store import plan_store
+from app.utils.rate_limit import CLIENT_LIMIT, check_client_async
+from app.utils.semantic_cache import semantic_cache
+
+logger = logging.getLogger(__name__)
+
+# Load the IATA map, agents and LLM clients at startup instead of on the first request.
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "1") != "0"
+
+# Largest list /api/generate_plans accepts in one call.
+BATCH_MAX_PLANS = int(os.getenv("BATCH_MAX_PLANS", "50"))
+
+# Run plan job workers inside the app: "1", "0", or "auto" (only with the local
+# queue, which separate worker processes can't reach).
+JOB_WORKERS_IN_APP = os.getenv("JOB_WORKERS_IN_APP", "auto")
+# On shutdown, in-app workers take no new jobs and get this long to finish theirs.
+JOB_DRAIN_SECONDS = float(os.getenv("JOB_DRAIN_SECONDS", "30"))
+
+app = FastAPI()
+
+
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["http://localhost:3000"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+
+class TravelRequest(BaseModel):
+    source: str
+    destination: str
+    depart_date: str
+    return_date: str
+    theme: str = "Luxury"
+    num_days: Optional[int] = None
+    bypass_cache: bool = False
+    # "parallel": one LLM call per agent; "combined": hotels/restaurants/transport/weather in one call;
+    # "pack": attractions/transport/weather from the offline knowledge pack where it has them
+    mode: Literal["parallel", "combined", "pack"] = "parallel"
+    # optional overall time budget; capped by PLAN_DEADLINE_SECONDS
+    deadline_seconds: Optional[float] = None
+    # also search flights leaving/returning up to this many days earlier or later
+    # and add a fare calendar to the plan (capped by FLEX_MAX_DAYS)
+    flex_days: int = Field(0, ge=0)
+
+
+class PlanJobRequest(TravelRequest):
+    # 0-9, higher runs first
+    priority: int = Field(PRIORITY_DEFAULT, ge=0, le=9)
+
+
+class PlanRevision(BaseModel):
+    """Fields to change on a stored plan; anything left out keeps its previous value."""
+    source: Optional[str] = None
+    destination: Optional[str] = None
+    depart_date: Optional[str] = None
+    return_date: Optional[str] = None
+    theme: Optional[str] = None
+    num_days: Optional[int] = None
+    bypass_cache: bool = False
+    mode: Optional[Literal["parallel", "combined", "pack"]] = None
+    deadline_seconds: Optional[float] = None
+    flex_days: Optional[int] = Field(None, ge=0)
+
+
+@app.on_event("startup")
+async def startup():
+    if not os.getenv("OPENAI_API_KEY"):
+        logger.warning("OPENAI_API_KEY missing in .env file — plans will use fallback sections")
+    if STARTUP_WARMUP:
+        timings = await asyncio.to_thread(warm_up)
+        logger.info("warm-up done: %s", timings)
+    in_app = JOB_WORKERS_IN_APP == "1" or (JOB_WORKERS_IN_APP == "auto" and isinstance(job_queue, LocalJobQueue))
+    if in_app:
+        from app.worker import run_worker
+        app.state.jobs_stopping = asyncio.Event()
+        app.state.job_workers = asyncio.create_task(run_worker(job_queue, stopping=app.state.jobs_stopping))
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    # imported here so the app module doesn't pull in requests/httpx just to load
+    from app.utils.serpapi_helper import close_async_client
+    workers = getattr(app.state, "job_workers", None)
+    if workers is not None:
+        app.state.jobs_stopping.set()
+        try:
+            await asyncio.wait_for(workers, JOB_DRAIN_SECONDS)
+        except asyncio.TimeoutError:
+            logger.warning("shutdown: plan jobs still running after %.0fs — cancelled", JOB_DRAIN_SECONDS)
+    await close_async_client()
+
+
+@app.get("/health")
+async def health():
+    return {"status": "healthy", "server_time": datetime.now().isoformat()}
+
+
+@app.get("/metrics")
+async def metrics():
+    return Response(REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    from app.utils.serpapi_helper import flight_cache_stats
+    return {
+        "agents": agent_cache.stats(),
+        "lru_entries": len(agent_cache.lru),
+        "flights": flight_cache_stats(),
+        "semantic": semantic_cache.stats(),
+        "llm_concurrency": llm_limiter.snapshot(),
+    }
+
+
+@app.get("/api/airports")
+async def airports(q: str = "", limit: int = 8):
+    """
+    Autocomplete over airport codes, city names and aliases: exact matches
+    first, then prefix matches, then close spellings. Served from prebuilt
+    in-memory indexes.
+    """
+    return JSONResponse(
+        {"query": q, "results": airport_index().search(q, max(0, min(limit, 20)))},
+        headers={"Cache-Control": "public, max-age=3600"},
+    )
+
+
+async def rate_limit(request: Request) -> None:
+    """
+    Per-client token bucket (RATE_LIMIT_PER_MINUTE), kept in Redis so the limit
+    holds across all workers rather than per process.
+    """
+    await _charge_client(request, 1)
+
+
+async def _charge_client(request: Request, plans: int) -> None:
+    """Take one token per plan the request asks for; 429 if the client hasn't that many left."""
+    decision = await check_client_async(get_remote_address(request), plans)
+    if not decision.allowed:
+        raise HTTPException(
+            429, "Rate limit exceeded", headers={"Retry-After": str(max(1, math.ceil(decision.retry_after)))}
+        )
+
+
+def _build_payload(req: TravelRequest) -> dict:
+    if not req.depart_date or not req.return_date:
+        raise HTTPException(400, "Both depart_date and return_date are required")
+
+    if not req.num_days:
+        d1 = datetime.fromisoformat(req.depart_date)
+        d2 = datetime.fromisoformat(req.return_date)
+        req.num_days = max(1, (d2 - d1).days)
+
+    # free text ("goa", "Bengaluru") becomes an IATA code here, so SerpAPI never sees it
+    source, destination = resolve_code(req.source), resolve_code(req.destination)
+    for field, value, code in (("source", req.source, source), ("destination", req.destination, destination)):
+        if not code:
+            raise HTTPException(400, f"Unknown airport or city for {field}: {value!r}")
+
+    return {
+        "source": source,
+        "destination": destination,
+        "destination_city": city_for_code(destination),
+        "depart_date": req.depart_date,
+        "return_date": req.return_date,
+        "num_days": req.num_days,
+        "theme": req.theme,
+        "bypass_cache": req.bypass_cache,
+        "mode": req.mode,
+        "deadline_seconds": req.deadline_seconds,
+        "flex_days": req.flex_days,
+    }
+
+
+@app.post("/api/generate_plan", dependencies=[Depends(rate_limit)])
+async def create_plan(req: TravelRequest):
+
+    payload = _build_payload(req)
+
+    try:
+        result = await generate_plan_async(payload)
+        return TravelPlan(**result).model_dump()
+    except Exception as e:
+        raise HTTPException(500, f"Travel plan generation failed: {str(e)}")
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in (t[2:] if t.startswith("W/") else t for t in tags)
+
+
+@app.get("/api/plans/{plan_id}")
+async def get_plan(plan_id: str, if_none_match: Optional[str] = Header(None)):
+    """
+    A stored plan by its ID (meta.plan_id of a generated plan). Served with an
+    ETag; a client sending it back in If-None-Match gets 304 while the plan is
+    unchanged, without the plan being loaded.
+    """
+
+    headers = {"Cache-Control": "private, no-cache"}
+    if if_none_match:
+        etag = await plan_store.etag_async(plan_id)
+        if etag is not None and _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={**headers, "ETag": etag})
+
+    record = await plan_store.get_async(plan_id)
+    if record is None:
+        raise HTTPException(404, f"Unknown plan {plan_id}")
+    return JSONResponse(record["plan"], headers={**headers, "ETag": record["etag"]})
+
+
+@app.post("/api/plans/{plan_id}/revise", dependencies=[Depends(rate_limit)])
+async def revise_plan(plan_id: str, rev: PlanRevision):
+    """
+    Re-plan a stored plan with some of its request fields changed. Only the
+    agents that depend on a changed field run again; the other sections are
+    reused. The revised plan gets its own plan_id in meta.
+    """
+
+    previous = await plan_store.get_async(plan_id)
+    if previous is None:
+        raise HTTPException(404, f"Unknown plan {plan_id}")
+
+    changes = rev.model_dump(exclude_none=True)
+    # moved dates mean a new trip length unless one is given
+    if ("depart_date" in changes or "return_date" in changes) and "num_days" not in changes:
+        changes["num_days"] = None
+    # bypass_cache and deadline_seconds apply to one call, they aren't carried over
+    fields = {k: v for k, v in previous["request"].items()
+              if k in TravelRequest.model_fields and k not in ("bypass_cache", "deadline_seconds")}
+    payload = _build_payload(TravelRequest(**{**fields, **changes}))
+
+    try:
+        result = await revise_plan_async(plan_id, previous, payload)
+        return TravelPlan(**result).model_dump()
+    except Exception as e:
+        raise HTTPException(500, f"Travel plan revision failed: {str(e)}")
+
+
+@app.post("/api/generate_plan/stream", dependencies=[Depends(rate_limit)])
+async def stream_plan(req: TravelRequest):
+    """
+    Server-Sent Events version of /api/generate_plan.
+    Each section is sent as its own event (flights, hotels, ...) as soon as its
+    agent finishes; the itinerary comes last, followed by a "done" event.
+    """
+
+    payload = _build_payload(req)
+
+    async def events():
+        try:
+            async for event, data in stream_plan_async(payload):
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': f'Travel plan generation failed: {str(e)}'})}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/api/generate_plans")
+async def create_plans(reqs: List[TravelRequest], request: Request):
+    """
+    Batch version of /api/generate_plan for many trips in one call.
+    Plans run a few at a time and share identical work (one flight search per
+    route/dates, one hotels/restaurants/... call per destination). Each plan is
+    sent as a Server-Sent "plan" event with its index in the request list as soon
+    as it is ready; a plan that fails becomes an "error" event; "done" comes last.
+    """
+
+    if not reqs:
+        raise HTTPException(400, "At least one travel request is required")
+    if len(reqs) > BATCH_MAX_PLANS:
+        raise HTTPException(413, f"At most {BATCH_MAX_PLANS} travel requests per batch")
+
+    if CLIENT_LIMIT.enabled and len(reqs) > CLIENT_LIMIT.capacity:
+        raise HTTPException(413, f"At most {int(CLIENT_LIMIT.capacity)} travel requests per batch from one client")
+
+    payloads = [_build_payload(req) for req in reqs]
+    # one token per plan, like the same plans sent one at a time
+    await _charge_client(request, len(payloads))
+
+    async def events():
+        failed = 0
+        async for index, result, error in generate_plans_async(payloads):
+            if error is None:
+                try:
+                    plan = TravelPlan(**result).model_dump()
+                except Exception as e:
+                    error = str(e)
+            if error is not None:
+                failed += 1
+                yield f"event: error\ndata: {json.dumps({'index': index, 'detail': f'Travel plan generation failed: {error}'})}\n\n"
+            else:
+                yield f"event: plan\ndata: {json.dumps({'index': index, 'plan': plan})}\n\n"
+        yield f"event: done\ndata: {json.dumps({'count': len(payloads), 'failed': failed})}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _sse(event: str, data, event_id: Optional[int] = None) -> str:
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{prefix}event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/api/plan_jobs", status_code=202, dependencies=[Depends(rate_limit)])
+async def create_plan_job(req: PlanJobRequest):
+    """
+    Queue a plan and return its job ID straight away. A worker picks it up by
+    priority; follow it with GET /api/plan_jobs/{job_id} or subscribe to
+    /api/plan_jobs/{job_id}/events. Disconnecting doesn't cancel the job.
+    """
+
+    # the priority also orders the job's upstream calls under the concurrency limits
+    payload = dict(_build_payload(req), priority=req.priority)
+    try:
+        job_id = await job_queue.submit_async(payload, req.priority)
+    except QueueFullError as e:
+        raise HTTPException(503, str(e), headers={"Retry-After": "5"})
+    except ConnectionError as e:
+        raise HTTPException(503, str(e))
+    return {
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/api/plan_jobs/{job_id}",
+        "events_url": f"/api/plan_jobs/{job_id}/events",
+    }
+
+
+async def _get_job(job_id: str) -> dict:
+    try:
+        job = await job_queue.get_async(job_id)
+    except ConnectionError as e:
+        raise HTTPException(503, str(e))
+    if job is None:
+        raise HTTPException(404, f"Unknown plan job {job_id}")
+    return job
+
+
+@app.get("/api/plan_jobs/{job_id}")
+async def get_plan_job(job_id: str):
+    """Job status, the sections finished so far and, once done, the whole plan."""
+
+    job = await _get_job(job_id)
+    sections = {}
+    for event, data in await job_queue.events_async(job_id):
+        if event not in ("status", "request", "done"):
+            sections[event] = data
+    return {
+        "job_id": job_id,
+        "status": job["status"],
+        "priority": job.get("priority"),
+        "created_at": job.get("created_at"),
+        "started_at": job.get("started_at"),
+        "finished_at": job.get("finished_at"),
+        "sections": sections,
+        "plan": job.get("plan"),
+        "plan_id": job.get("plan_id"),
+        "error": job.get("error"),
+    }
+
+
+@app.get("/api/plan_jobs/{job_id}/events")
+async def plan_job_events(job_id: str, last_event_id: Optional[str] = Header(None)):
+    """
+    Server-Sent Events for a job: "status" changes, each plan section as it is
+    ready (same events as /api/generate_plan/stream) and a final status of
+    "done" or "failed". Every event has an id; reconnecting with Last-Event-ID
+    resumes after it.
+    """
+
+    await _get_job(job_id)
+    try:
+        cursor = int(last_event_id) + 1 if last_event_id else 0
+    except ValueError:
+        cursor = 0
+
+    async def events():
+        nonlocal cursor
+        while True:
+            batch = await job_queue.events_async(job_id, cursor)
+            for event, data in batch:
+                yield _sse(event, data, cursor)
+                cursor += 1
+                if event == "status" and data.get("status") in TERMINAL:
+                    return
+            if not batch:
+                if await job_queue.get_async(job_id) is None:
+                    yield _sse("error", {"detail": f"Plan job {job_id} expired"})
+                    return
+                await asyncio.sleep(JOB_POLL_SECONDS)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
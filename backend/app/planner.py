@@ -1,68 +1,434 @@
-import json
 import time
 import logging
 import os
-from typing import Any, Dict
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
 from datetime import datetime, timedelta
 
-from app.agents.flights_agent import flights_agent
-from app.agents.hotels_agent import hotels_agent
-from app.agents.attractions_agent import attractions_agent
-from app.agents.restaurants_agent import restaurants_agent
-from app.agents.transport_agent import transport_agent
-from app.agents.weather_agent import weather_agent
-from app.agents.itinerary_agent import itinerary_agent
-from app.schemas import TravelPlan
+from app.schemas import TravelPlan, SECTION_ADAPTERS
+from app.utils.airports import airport_index, city_for_code, resolve_code
+from app.utils.cache import AGENT_CACHE_FIELDS, agent_cache, agent_cache_key, state_field
+from app.utils.deadline import deadline_scope
+from app.utils.knowledge_pack import PACK_FIELDS, knowledge_pack
+from app.utils.metrics import AGENT_CALLS, AGENT_DURATION, AGENT_FALLBACKS, PLAN_DURATION
+from app.utils import openai_helper
+from app.utils.openai_helper import track_usage
+from app.utils.plan_store import plan_id_for, plan_store
+from app.utils.rate_limit import exhausted_budgets, exhausted_budgets_async
+from app.utils.resilience import set_request_priority
+from app.utils.semantic_cache import bypass_semantic_cache
 
 logger = logging.getLogger(__name__)
 
 
-def _load_iata_map() -> Dict[str, str]:
+class AgentSpec(NamedTuple):
+    run: Callable[[Dict[str, Any]], Dict[str, Any]]
+    run_async: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+    # state update the agent produces when it cannot get a real answer
+    fallback: Callable[[Dict[str, Any]], Dict[str, Any]]
+    # names of agents whose output this agent reads from state
+    deps: Tuple[str, ...] = ()
+
+
+def _from_pack(name: str, spec: AgentSpec) -> AgentSpec:
+    """`spec`, answered from the knowledge pack when it has a fresh entry."""
+
+    def packed(state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        value = knowledge_pack.get(name, state)
+        if value is None:
+            return None
+        state["meta"]["cache"][name] = "pack"
+        return {name: value}
+
+    def run(state: Dict[str, Any]) -> Dict[str, Any]:
+        return packed(state) or spec.run(state)
+
+    async def run_async(state: Dict[str, Any]) -> Dict[str, Any]:
+        return packed(state) or await spec.run_async(state)
+
+    return spec._replace(run=run, run_async=run_async)
+
+
+@functools.lru_cache(maxsize=None)
+def planner_modes() -> Dict[str, Dict[str, AgentSpec]]:
+    """
+    Agent graphs per planner mode. The agent modules are imported here, on the
+    first plan (or at startup by warm_up), rather than when this module loads.
+    """
+    from app.agents.flights_agent import flights_agent, flights_agent_async
+    from app.agents.hotels_agent import hotels_agent, hotels_agent_async, FALLBACK as HOTELS_FALLBACK
+    from app.agents.attractions_agent import attractions_agent, attractions_agent_async, SAMPLE as ATTRACTIONS_SAMPLE
+    from app.agents.restaurants_agent import restaurants_agent, restaurants_agent_async, SAMPLE as RESTAURANTS_SAMPLE
+    from app.agents.transport_agent import transport_agent, transport_agent_async, FALLBACK as TRANSPORT_FALLBACK
+    from app.agents.weather_agent import weather_agent, weather_agent_async, FALLBACK as WEATHER_FALLBACK
+    from app.agents.itinerary_agent import itinerary_agent, itinerary_agent_async, SAMPLE as ITINERARY_SAMPLE, _to_itinerary
+    from app.agents.combined_agent import combined_agent, combined_agent_async, SECTIONS as COMBINED_SECTIONS
+
+    # Every agent today reads only the request fields, so all of them (itinerary
+    # included) start in the first wave; a dependency listed here delays an agent
+    # until those sections are merged into its state.
+    agent_graph: Dict[str, AgentSpec] = {
+        "flights": AgentSpec(flights_agent, flights_agent_async, lambda s: {"flights": [], "fare_calendar": None}),
+        "hotels": AgentSpec(hotels_agent, hotels_agent_async, lambda s: {"hotels": HOTELS_FALLBACK}),
+        "attractions": AgentSpec(attractions_agent, attractions_agent_async, lambda s: {"attractions": ATTRACTIONS_SAMPLE}),
+        "restaurants": AgentSpec(restaurants_agent, restaurants_agent_async, lambda s: {"restaurants": RESTAURANTS_SAMPLE}),
+        "transport": AgentSpec(transport_agent, transport_agent_async, lambda s: {"transport": TRANSPORT_FALLBACK}),
+        "weather": AgentSpec(weather_agent, weather_agent_async, lambda s: {"weather": WEATHER_FALLBACK}),
+        "itinerary": AgentSpec(
+            itinerary_agent, itinerary_agent_async,
+            lambda s: {"itinerary": _to_itinerary(ITINERARY_SAMPLE, int(s.get("num_days", 1)))}
+        ),
+    }
+
+    # "combined" mode: hotels, restaurants, transport and weather come from one LLM call.
+    combined_graph: Dict[str, AgentSpec] = {
+        name: spec for name, spec in agent_graph.items() if name not in COMBINED_SECTIONS
+    }
+    combined_graph["combined"] = AgentSpec(
+        combined_agent, combined_agent_async,
+        lambda s: {k: v for name in COMBINED_SECTIONS for k, v in agent_graph[name].fallback(s).items()}
+    )
+
+    # "pack" mode: attractions, transport and weather come from the offline
+    # knowledge pack, with the LLM agent only for cities/entries it lacks.
+    pack_graph = {
+        name: _from_pack(name, spec) if name in PACK_FIELDS else spec for name, spec in agent_graph.items()
+    }
+
+    return {
+        "parallel": agent_graph,
+        "combined": combined_graph,
+        "pack": pack_graph,
+    }
+
+
+def agent_graph() -> Dict[str, AgentSpec]:
+    """The full per-agent graph ("parallel" mode)."""
+    return planner_modes()["parallel"]
+
+
+def _graph_for(state: Dict[str, Any]) -> Dict[str, AgentSpec]:
+    modes = planner_modes()
+    return modes.get(state.get("mode"), modes["parallel"])
+
+
+def warm_up(clients: bool = True) -> Dict[str, float]:
+    """
+    Do the one-off work the first plan would otherwise pay for: build the
+    airport index, import and register the agents, build the LLM clients.
+    Returns how long each step took, in ms. clients=False leaves out
+    everything holding connections, for a process that is about to fork.
+    """
+    timings: Dict[str, float] = {}
+    steps = [("airports", airport_index), ("agents", planner_modes)]
+    if clients:
+        steps.append(("llm_clients", openai_helper.warm_up))
+    for step, fn in steps:
+        started = time.perf_counter()
+        fn()
+        timings[step] = round((time.perf_counter() - started) * 1000, 1)
+    return timings
+
+
+PLANNER_MAX_WORKERS = int(os.getenv("PLANNER_MAX_WORKERS", "32"))
+
+# Whole-plan deadline; requests may ask for less, never more.
+PLAN_DEADLINE_SECONDS = float(os.getenv("PLAN_DEADLINE_SECONDS", "30"))
+
+# Per-agent time budgets (seconds), each capped by the plan deadline.
+# An agent that runs over is replaced by its fallback and listed in meta["degraded"].
+AGENT_BUDGETS: Dict[str, float] = {
+    "flights": float(os.getenv("BUDGET_FLIGHTS", "15")),
+    "hotels": float(os.getenv("BUDGET_HOTELS", "20")),
+    "attractions": float(os.getenv("BUDGET_ATTRACTIONS", "20")),
+    "restaurants": float(os.getenv("BUDGET_RESTAURANTS", "20")),
+    "transport": float(os.getenv("BUDGET_TRANSPORT", "15")),
+    "weather": float(os.getenv("BUDGET_WEATHER", "15")),
+    "itinerary": float(os.getenv("BUDGET_ITINERARY", "25")),
+    "combined": float(os.getenv("BUDGET_COMBINED", "25")),
+}
+
+_executor = ThreadPoolExecutor(max_workers=PLANNER_MAX_WORKERS, thread_name_prefix="planner")
+
+# Opt-in: an identical request within this many seconds is answered from
+# plan_store instead of being planned again. 0 (the default) always plans anew.
+PLAN_REUSE_SECONDS = float(os.getenv("PLAN_REUSE_SECONDS", "0"))
+
+# How many plans of one generate_plans_async batch run at the same time.
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+# agent cache key -> task producing that section, shared by all plans of one
+# batch so e.g. two trips to the same city make one hotels call between them
+_batch_work: contextvars.ContextVar[Optional[Dict[str, "asyncio.Future"]]] = contextvars.ContextVar("batch_work", default=None)
+
+
+# State fields each agent's sections depend on ("month" = month of depart_date).
+# A plan revision reruns an agent only when one of these changed.
+AGENT_INPUTS: Dict[str, Tuple[str, ...]] = {
+    **AGENT_CACHE_FIELDS,
+    "flights": ("source", "destination_code", "depart_date", "return_date", "flex_days"),
+    "itinerary": ("destination", "destination_code", "num_days", "theme"),
+}
+
+
+def _agent_inputs(state: Dict[str, Any]) -> Dict[str, str]:
+    fields = {field for inputs in AGENT_INPUTS.values() for field in inputs}
+    return {field: state_field(state, field) for field in sorted(fields)}
+
+
+def _is_fallback(section: str, value: Any, state: Dict[str, Any]) -> bool:
+    """Whether an agent's section is its fallback, or empty (which no agent answers on purpose)."""
+    spec = agent_graph().get(section)
+    return spec is not None and (not value or value == spec.fallback(state).get(section))
+
+
+def _cacheable(name: str, state: Dict[str, Any], result: Dict[str, Any]) -> bool:
+    section = result.get(name)
+    return bool(section) and not _is_fallback(name, section, state)
+
+
+def _agent_state(state: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Load a small IATA->City mapping JSON shipped with the repo.
+    Snapshot of `state` for one agent run, with a meta slot of its own: the
+    graph runner merges it into the plan's meta only if the agent finishes in
+    time, so an abandoned agent that completes later leaves the plan alone.
     """
-    base = os.path.dirname(__file__)  
-    path = os.path.join(base, "utils", "iata_city_map.json")
+    meta = state["meta"]
+    slot = {"cache": {}, "timings_ms": {}, "fallbacks": [], "degraded": [], "llm_usage": meta.get("llm_usage")}
+    return dict(state, meta=slot)
+
+
+def _merge_meta(state: Dict[str, Any], slot: Dict[str, Any]) -> None:
+    meta = state["meta"]
+    meta["cache"].update(slot["cache"])
+    meta["timings_ms"].update(slot["timings_ms"])
+    meta["fallbacks"].extend(slot["fallbacks"])
+    meta["degraded"].extend(slot["degraded"])
+
+
+def _record_agent(name: str, state: Dict[str, Any], started: float, outcome: str, result: Dict[str, Any]) -> None:
+    if state["meta"].get("abandoned"):
+        # already recorded as a timeout when the planner gave up on it
+        return
+    elapsed = time.perf_counter() - started
+    AGENT_DURATION.observe(elapsed, agent=name)
+    AGENT_CALLS.inc(agent=name, outcome=outcome)
+
+    meta = state["meta"]
+    meta["timings_ms"][name] = round(elapsed * 1000, 1)
+    for section, value in result.items():
+        if _is_fallback(section, value, state):
+            AGENT_FALLBACKS.inc(section=section)
+            meta["fallbacks"].append(section)
+
+
+def _agent_deadline(name: str, state: Dict[str, Any]) -> float:
+    """Absolute monotonic time by which `name` must finish if it starts now."""
+    return min(state["deadline"], time.monotonic() + AGENT_BUDGETS.get(name, PLAN_DEADLINE_SECONDS))
+
+
+def _degrade(name: str, spec: AgentSpec, state: Dict[str, Any], started: float) -> Dict[str, Any]:
+    logger.warning("planner: %s_agent exceeded its time budget; using fallback", name)
+    result = spec.fallback(state)
+    state["meta"]["degraded"].append(name)
+    _record_agent(name, state, started, "timeout", result)
+    return result
+
+
+def _run_agent(name: str, spec: AgentSpec, state: Dict[str, Any]) -> Dict[str, Any]:
+    with deadline_scope(_agent_deadline(name, state) - time.monotonic()):
+        return _run_agent_inner(name, spec, state)
+
+
+def _run_agent_inner(name: str, spec: AgentSpec, state: Dict[str, Any]) -> Dict[str, Any]:
+    started = time.perf_counter()
+    key = agent_cache_key(name, state)
+    if key and not state.get("bypass_cache"):
+        value, tier = agent_cache.get(name, key)
+        if tier:
+            state["meta"]["cache"][name] = tier
+            _record_agent(name, state, started, "cache_hit", {})
+            return {name: value}
+
     try:
-        with open(path, "r", encoding="utf-8") as fh:
-            data = json.load(fh)
-           
-            return {k.upper(): v for k, v in data.items()}
-    except FileNotFoundError:
-        logger.warning("iata_city_map.json not found at %s — falling back to empty map", path)
-        return {}
+        result = spec.run(state) or {}
     except Exception:
-        logger.exception("Failed to load iata_city_map.json")
-        return {}
+        logger.exception("planner: %s_agent failed; continuing with available data", name)
+        result = spec.fallback(state)
+        _record_agent(name, state, started, "error", result)
+        return result
+
+    if key and _cacheable(name, state, result):
+        agent_cache.set(name, key, result[name])
+    _record_agent(name, state, started, "success", result)
+    return result
 
 
-IATA_TO_CITY = _load_iata_map()
+def _ready(pending: Dict[str, AgentSpec], finished: set) -> list:
+    return [name for name, spec in pending.items() if all(d in finished for d in spec.deps)]
 
 
-def _resolve_city_from_code(code: str) -> str:
+def _run_graph(state: Dict[str, Any], graph: Dict[str, AgentSpec]) -> Dict[str, Any]:
     """
-    Return a human-readable city name for a given IATA code.
-    If unknown, return the code itself so the LLM receives something (but we prefer explicit names).
+    Run the agents in `graph` on the shared thread pool.
+    An agent is submitted as soon as all of its dependencies have finished, and it
+    receives a snapshot of the state so agents never see each other mid-update.
+    Results (and each agent's meta slot) are merged into `state` on the calling thread.
     """
-    if not code:
-        return ""
-    code_u = code.upper()
-    return IATA_TO_CITY.get(code_u, code_u)
+    pending = dict(graph)
+    finished = set()
+    running = {}
+    # future -> (deadline, started, agent state) so overdue agents can be abandoned
+    budgets = {}
 
+    while pending or running:
+        for name in _ready(pending, finished):
+            spec = pending.pop(name)
+            # each agent gets its own copy of the caller's context (usage tracking etc.)
+            ctx = contextvars.copy_context()
+            agent_state = _agent_state(state)
+            fut = _executor.submit(ctx.run, _run_agent, name, spec, agent_state)
+            running[fut] = name
+            budgets[fut] = (_agent_deadline(name, state), time.perf_counter(), agent_state)
 
-def generate_plan(data: Dict[str, Any]) -> Dict[str, Any]:
+        if not running:
+            logger.error("planner: unsatisfiable dependencies for %s; skipping", sorted(pending))
+            break
+
+        next_deadline = min(deadline for deadline, _, _ in budgets.values())
+        done, _ = wait(running, timeout=max(0.0, next_deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+        for fut in done:
+            name = running.pop(fut)
+            _, _, agent_state = budgets.pop(fut)
+            state.update(fut.result())
+            _merge_meta(state, agent_state["meta"])
+            finished.add(name)
+
+        # Threads can't be cancelled: an overdue agent is left to finish in the
+        # background (its own timeouts are already short); its result and its
+        # meta slot are never merged, and it records no metrics from here on.
+        now = time.monotonic()
+        for fut in [f for f, (deadline, _, _) in budgets.items() if deadline <= now and not f.done()]:
+            name = running.pop(fut)
+            _, started, agent_state = budgets.pop(fut)
+            agent_state["meta"]["abandoned"] = True
+            state.update(_degrade(name, graph[name], state, started))
+            finished.add(name)
+
+    return state
+
+
+async def _run_agent_async(name: str, spec: AgentSpec, state: Dict[str, Any]) -> Dict[str, Any]:
+    started = time.perf_counter()
+    budget = _agent_deadline(name, state) - time.monotonic()
+    with deadline_scope(budget):
+        try:
+            return await asyncio.wait_for(_run_agent_async_inner(name, spec, state), max(0.0, budget))
+        except asyncio.TimeoutError:
+            return _degrade(name, spec, state, started)
+
+
+async def _run_agent_async_inner(name: str, spec: AgentSpec, state: Dict[str, Any]) -> Dict[str, Any]:
+    started = time.perf_counter()
+    key = agent_cache_key(name, state)
+    if key and not state.get("bypass_cache"):
+        value, tier = await agent_cache.get_async(name, key)
+        if tier:
+            state["meta"]["cache"][name] = tier
+            _record_agent(name, state, started, "cache_hit", {})
+            return {name: value}
+
+    shared = _batch_work.get() if key else None
+    reused = shared is not None and key in shared
+    try:
+        if shared is None:
+            result = await spec.run_async(state) or {}
+        else:
+            if not reused:
+                shared[key] = asyncio.ensure_future(spec.run_async(state))
+            # shielded: this plan timing out must not cancel work other plans wait on
+            result = await asyncio.shield(shared[key]) or {}
+    except Exception:
+        logger.exception("planner: %s_agent failed; continuing with available data", name)
+        result = spec.fallback(state)
+        _record_agent(name, state, started, "error", result)
+        return result
+
+    if reused:
+        state["meta"]["cache"][name] = "batch"
+        _record_agent(name, state, started, "shared", result)
+        return result
+
+    if key and _cacheable(name, state, result):
+        await agent_cache.set_async(name, key, result[name])
+    _record_agent(name, state, started, "success", result)
+    return result
+
+
+async def _iter_graph_async(state: Dict[str, Any], graph: Dict[str, AgentSpec]) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Event-loop twin of _run_graph: same scheduling, but agents are asyncio tasks
+    so many plans can share one worker without blocking it.
+    Yields (agent name, state update) as each agent finishes, after merging it.
+    """
+    pending = dict(graph)
+    finished = set()
+    running = {}
+
+    try:
+        while pending or running:
+            for name in _ready(pending, finished):
+                spec = pending.pop(name)
+                agent_state = _agent_state(state)
+                running[asyncio.ensure_future(_run_agent_async(name, spec, agent_state))] = name, agent_state
+
+            if not running:
+                logger.error("planner: unsatisfiable dependencies for %s; skipping", sorted(pending))
+                break
+
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name, agent_state = running.pop(task)
+                update = task.result()
+                state.update(update)
+                _merge_meta(state, agent_state["meta"])
+                finished.add(name)
+                yield name, update
+    finally:
+        # consumer went away (e.g. client disconnected from a stream)
+        for task in running:
+            task.cancel()
+
+
+async def _run_graph_async(state: Dict[str, Any], graph: Dict[str, AgentSpec]) -> Dict[str, Any]:
+    async for _ in _iter_graph_async(state, graph):
+        pass
+    return state
+
+
+def _plan_budget(data: Dict[str, Any]) -> float:
+    try:
+        requested = float(data.get("deadline_seconds") or PLAN_DEADLINE_SECONDS)
+    except (TypeError, ValueError):
+        requested = PLAN_DEADLINE_SECONDS
+    return max(0.0, min(requested, PLAN_DEADLINE_SECONDS))
+
+
+def _build_state(data: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Sequential planner (Option B).
     State contains both:
       - destination_code: IATA code (used by flights_agent/SerpAPI)
       - destination: human-readable city name (used by LLM agents)
     """
 
-    source_code = (data.get("source") or "BOM").upper()
-    dest_code = (data.get("destination") or data.get("destination_code") or "GOI").upper()
+    source_code = resolve_code(data.get("source") or "") or "BOM"
+    dest_code = resolve_code(data.get("destination") or data.get("destination_code") or "") or "GOI"
 
     
-    destination_city = data.get("destination_city") or data.get("destination_name") or _resolve_city_from_code(dest_code)
+    destination_city = data.get("destination_city") or data.get("destination_name") or city_for_code(dest_code)
 
     days = int(data.get("num_days", 3))
     theme = data.get("theme", "Luxury")
@@ -83,50 +449,54 @@ def generate_plan(data: Dict[str, Any]) -> Dict[str, Any]:
         "theme": theme,
         "depart_date": depart,
         "return_date": return_d,
+        "flex_days": int(data.get("flex_days") or 0),
         "flights": [],
+        "fare_calendar": None,
         "hotels": {},
         "attractions": [],
         "restaurants": [],
         "transport": {},
         "weather": {},
-        "itinerary": []
+        "itinerary": [],
+        "bypass_cache": bool(data.get("bypass_cache")),
+        "mode": data.get("mode") if data.get("mode") in planner_modes() else "parallel",
+        # agents write to a slot of their own (see _agent_state), merged in
+        # when they finish
+        "meta": {"cache": {}, "timings_ms": {}, "fallbacks": [], "degraded": [], "llm_usage": track_usage()},
+        "started": time.perf_counter(),
+        "deadline": time.monotonic() + _plan_budget(data)
     }
+    # like the usage totals, carried into the agents' threads/tasks
+    bypass_semantic_cache(state["bypass_cache"])
+    set_request_priority(data.get("priority"))
+    return state
 
-    try:
-        state.update(flights_agent(state))
-    except Exception:
-        logger.exception("planner: flights_agent failed; continuing with available data")
 
-    try:
-        state.update(hotels_agent(state))
-    except Exception:
-        logger.exception("planner: hotels_agent failed; continuing")
-
-    try:
-        state.update(attractions_agent(state))
-    except Exception:
-        logger.exception("planner: attractions_agent failed; continuing")
+def _apply_budgets(state: Dict[str, Any], exhausted: list) -> None:
+    """
+    With a shared upstream budget spent, answer from the agent cache even if the
+    request asked to bypass it; whatever isn't cached comes back as fallback data.
+    """
+    state["meta"]["budget_exhausted"] = exhausted
+    if exhausted:
+        logger.warning("planner: upstream budget exhausted (%s); preferring cached sections", ", ".join(exhausted))
+        state["bypass_cache"] = False
+        bypass_semantic_cache(False)
 
-    try:
-        state.update(restaurants_agent(state))
-    except Exception:
-        logger.exception("planner: restaurants_agent failed; continuing")
 
-    try:
-        state.update(transport_agent(state))
-    except Exception:
-        logger.exception("planner: transport_agent failed; continuing")
-
-    try:
-        state.update(weather_agent(state))
-    except Exception:
-        logger.exception("planner: weather_agent failed; continuing")
+def _finish_meta(state: Dict[str, Any], planner: str) -> Dict[str, Any]:
+    elapsed = time.perf_counter() - state["started"]
+    PLAN_DURATION.observe(elapsed, planner=planner, mode=state.get("mode"))
+    return {
+        **state.get("meta", {}),
+        "planner": planner,
+        "mode": state.get("mode"),
+        "total_ms": round(elapsed * 1000, 1),
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ")
+    }
 
-    try:
-        state.update(itinerary_agent(state))
-    except Exception:
-        logger.exception("planner: itinerary_agent failed; continuing")
 
+def _build_result(state: Dict[str, Any], planner: str) -> Dict[str, Any]:
     result = {
         "source": state.get("source"),
         "destination": state.get("destination"), 
@@ -135,16 +505,14 @@ def generate_plan(data: Dict[str, Any]) -> Dict[str, Any]:
         "num_days": state.get("num_days"),
         "theme": state.get("theme"),
         "flights": state.get("flights", []),
+        "fare_calendar": state.get("fare_calendar"),
         "hotels": state.get("hotels", {"budget": [], "mid_range": [], "luxury": []}),
         "attractions": state.get("attractions", []),
         "restaurants": state.get("restaurants", []),
         "transport": state.get("transport", {}),
         "weather": state.get("weather", {}),
         "itinerary": state.get("itinerary", []),
-        "meta": {
-            "planner": "sequential",
-            "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ")
-        }
+        "meta": _finish_meta(state, planner)
     }
 
     try:
@@ -153,3 +521,213 @@ def generate_plan(data: Dict[str, Any]) -> Dict[str, Any]:
         
         logger.exception("TravelPlan validation failed — returning best-effort result")
         return result
+
+
+def generate_plan(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Parallel planner.
+    Agents run concurrently following agent_graph(), so a plan takes roughly as long
+    as its slowest agent rather than the sum of all of them.
+    """
+    state = _build_state(data)
+    _apply_budgets(state, exhausted_budgets())
+    _run_graph(state, _graph_for(state))
+    return _build_result(state, "parallel")
+
+
+async def _save_plan(data: Dict[str, Any], state: Dict[str, Any], result: Dict[str, Any]) -> None:
+    """
+    Keep the plan in plan_store under its request's content address (the ID goes
+    in meta["plan_id"]) so it can be fetched or revised later; a newer plan for
+    the same request replaces the older one. A store that fails costs the plan
+    its ID, not the response.
+    """
+    plan_id = plan_id_for(data)
+    result["meta"]["plan_id"] = plan_id
+    try:
+        await plan_store.put_async(plan_id, {"request": data, "inputs": _agent_inputs(state), "plan": result})
+    except Exception:
+        logger.exception("planner: could not store plan %s", plan_id)
+        result["meta"]["plan_id"] = None
+
+
+async def _stored_plan(data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    A stored plan for the same request that is recent enough to serve again and
+    has no fallback or degraded sections, or None.
+    """
+    if data.get("bypass_cache") or PLAN_REUSE_SECONDS <= 0:
+        return None
+    try:
+        record = await plan_store.get_async(plan_id_for(data))
+    except Exception:
+        logger.warning("planner: plan store lookup failed", exc_info=True)
+        return None
+    if record is None or time.time() - record["created_at"] > PLAN_REUSE_SECONDS:
+        return None
+    plan = record["plan"]
+    if plan["meta"].get("fallbacks") or plan["meta"].get("degraded"):
+        return None
+    return plan
+
+
+async def generate_plan_async(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Async planner used by the API: same graph as generate_plan, driven by
+    AsyncOpenAI/httpx so the event loop stays free while agents wait on the network.
+    With PLAN_REUSE_SECONDS set, an identical request made within that window
+    gets the stored plan back (bypass_cache skips this).
+    """
+    stored = await _stored_plan(data)
+    if stored is not None:
+        stored["meta"]["cache"]["plan"] = "store"
+        return stored
+
+    state = _build_state(data)
+    _apply_budgets(state, await exhausted_budgets_async())
+    await _run_graph_async(state, _graph_for(state))
+    result = _build_result(state, "async")
+    await _save_plan(data, state, result)
+    return result
+
+
+def _revision_graph(
+    state: Dict[str, Any], previous: Dict[str, Any], changed: set
+) -> Tuple[Dict[str, AgentSpec], List[str]]:
+    """
+    Split the planner graph for a revision into the agents that must run again
+    and the ones whose stored sections can be reused: an agent reruns if one of
+    its inputs changed, if its stored section was a fallback or was degraded,
+    or if an agent it depends on reruns.
+    """
+    plan = previous.get("plan") or {}
+    meta = plan.get("meta") or {}
+    stale = set(meta.get("fallbacks") or []) | set(meta.get("degraded") or [])
+
+    graph = _graph_for(state)
+    sections = {name: tuple(spec.fallback(state)) for name, spec in graph.items()}
+    rerun = set()
+    for name in graph:
+        inputs = {field for section in sections[name] for field in AGENT_INPUTS.get(section, ())}
+        if (name in stale or inputs & changed
+                or any(section in stale or section not in plan for section in sections[name])):
+            rerun.add(name)
+    while True:
+        dependents = {name for name, spec in graph.items() if name not in rerun and set(spec.deps) & rerun}
+        if not dependents:
+            break
+        rerun |= dependents
+
+    reused = [name for name in graph if name not in rerun]
+    for name in reused:
+        state.update({section: plan[section] for section in sections[name]})
+    # reused agents are already finished, so they can't hold up the ones that rerun
+    return {
+        name: spec._replace(deps=tuple(d for d in spec.deps if d in rerun))
+        for name, spec in graph.items() if name in rerun
+    }, reused
+
+
+async def revise_plan_async(previous_id: str, previous: Dict[str, Any], data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Incremental planner: re-plan the stored plan `previous` (a plan_store record)
+    for the updated request `data`. Only the agents that depend on a changed field
+    run again (e.g. a new theme reruns hotels, attractions and the itinerary but
+    not flights or transport); every other section is copied from the stored plan.
+    The revision is stored under a new plan ID.
+    """
+    state = _build_state(data)
+    _apply_budgets(state, await exhausted_budgets_async())
+
+    inputs = _agent_inputs(state)
+    old_inputs = previous.get("inputs") or {}
+    changed = {field for field, value in inputs.items() if old_inputs.get(field) != value}
+    graph, reused = _revision_graph(state, previous, changed)
+    state["meta"].update({"revised_from": previous_id, "changed": sorted(changed), "reused": reused})
+
+    await _run_graph_async(state, graph)
+    result = _build_result(state, "revision")
+    await _save_plan(data, state, result)
+    return result
+
+
+async def generate_plans_async(
+    batch: List[Dict[str, Any]], concurrency: int = BATCH_CONCURRENCY
+) -> AsyncIterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """
+    Batch planner: runs up to `concurrency` plans at once and yields
+    (index, plan, error) in completion order. Sections with the same agent cache
+    key (hotels per destination and theme, restaurants per destination, ...)
+    are produced once for the whole batch; flight searches for the same
+    route/dates already share one SerpAPI call through fetch_flights.
+    """
+    work: Dict[str, "asyncio.Future"] = {}
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(index: int, data: Dict[str, Any]):
+        # each task has its own context copy, so this stays out of the caller's
+        _batch_work.set(work)
+        async with semaphore:
+            try:
+                return index, await generate_plan_async(data), None
+            except Exception as e:
+                logger.exception("planner: plan %d of batch failed", index)
+                return index, None, str(e)
+
+    tasks = [asyncio.ensure_future(run(i, data)) for i, data in enumerate(batch)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+        for task in work.values():
+            task.cancel()
+
+
+def _validated_section(name: str, state: Dict[str, Any]) -> Any:
+    """Validate one section against its schema, substituting the agent's fallback if it doesn't fit."""
+    adapter = SECTION_ADAPTERS[name]
+    try:
+        return adapter.dump_python(adapter.validate_python(state.get(name)))
+    except Exception:
+        logger.warning("planner: %s section failed validation; sending fallback", name, exc_info=True)
+        owner = next(spec for spec in agent_graph().values() if name in spec.fallback(state))
+        return adapter.dump_python(adapter.validate_python(owner.fallback(state)[name]))
+
+
+async def stream_plan_async(data: Dict[str, Any]) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Streaming planner: yields (event, payload) pairs.
+    "request" comes first, then each section the moment its agent finishes,
+    the itinerary last (it is the part users read top to bottom), then "done" with meta.
+    A reusable stored plan (see generate_plan_async) is replayed in the same order.
+    """
+    stored = await _stored_plan(data)
+    if stored is not None:
+        stored["meta"]["cache"]["plan"] = "store"
+        yield "request", {k: stored[k] for k in ("source", "destination", "depart_date", "return_date", "num_days", "theme")}
+        for section in SECTION_ADAPTERS:
+            if stored.get(section) is not None:
+                yield section, stored[section]
+        yield "done", stored["meta"]
+        return
+
+    state = _build_state(data)
+    _apply_budgets(state, await exhausted_budgets_async())
+    yield "request", {k: state[k] for k in ("source", "destination", "depart_date", "return_date", "num_days", "theme")}
+
+    itinerary_ready = False
+    async for _, update in _iter_graph_async(state, _graph_for(state)):
+        for section in update:
+            if section == "itinerary":
+                itinerary_ready = True
+            elif section in SECTION_ADAPTERS:
+                yield section, _validated_section(section, state)
+
+    if itinerary_ready:
+        yield "itinerary", _validated_section("itinerary", state)
+
+    result = _build_result(state, "stream")
+    await _save_plan(data, state, result)
+    yield "done", result["meta"]
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 from typing import List, Dict, Optional
 
 
@@ -10,6 +10,24 @@ class Flight(BaseModel):
     airline_logo: Optional[str] = None
 
 
+class FareOption(BaseModel):
+    depart_date: str
+    return_date: Optional[str] = None
+    price: int
+
+
+class FareCalendar(BaseModel):
+    currency: str = "INR"
+    depart_dates: List[str]
+    return_dates: List[Optional[str]]
+    # fares[i][j]: cheapest fare leaving depart_dates[i] and returning return_dates[j];
+    # None where the pair wasn't searched (returns before departure) or had no flights
+    fares: List[List[Optional[int]]]
+    cheapest: Optional[FareOption] = None
+    # True when some nearby pairs weren't searched in time (see FLEX_BUDGET_SECONDS)
+    partial: bool = False
+
+
 class Hotel(BaseModel):
     name: str
     price: str
@@ -30,6 +48,51 @@ class ItineraryDay(BaseModel):
     evening: str
 
 
+class Attraction(BaseModel):
+    name: str
+    why: str
+    best_time: str
+
+
+class Restaurant(BaseModel):
+    name: str
+    cuisine: str
+    must_try: List[str]
+
+
+class Transport(BaseModel):
+    best_way: str
+    avg_cost: str
+    tips: str
+
+
+class Weather(BaseModel):
+    summary: str
+    temperature: str
+    recommendation: str
+
+
+# LLM answer shapes. ask_llm sends these as JSON-schema structured outputs,
+# which need an object at the root, so list answers are wrapped in one.
+class AttractionsResponse(BaseModel):
+    attractions: List[Attraction]
+
+
+class RestaurantsResponse(BaseModel):
+    restaurants: List[Restaurant]
+
+
+class ItineraryResponse(BaseModel):
+    itinerary: List[ItineraryDay]
+
+
+class CombinedResponse(BaseModel):
+    hotels: Hotels
+    restaurants: List[Restaurant]
+    transport: Transport
+    weather: Weather
+
+
 class TravelPlan(BaseModel):
     source: str
     destination: str
@@ -39,9 +102,24 @@ class TravelPlan(BaseModel):
     theme: str
 
     flights: List[Flight]
+    fare_calendar: Optional[FareCalendar] = None
     hotels: Hotels
     attractions: List[Dict]
     restaurants: List[Dict]
     transport: Dict
     weather: Dict
     itinerary: List[ItineraryDay]
+    meta: Dict = {}
+
+
+# Per-section validators used when plan sections are sent one at a time.
+SECTION_ADAPTERS = {
+    "flights": TypeAdapter(List[Flight]),
+    "fare_calendar": TypeAdapter(Optional[FareCalendar]),
+    "hotels": TypeAdapter(Hotels),
+    "attractions": TypeAdapter(List[Dict]),
+    "restaurants": TypeAdapter(List[Dict]),
+    "transport": TypeAdapter(Dict),
+    "weather": TypeAdapter(Dict),
+    "itinerary": TypeAdapter(List[ItineraryDay]),
+}
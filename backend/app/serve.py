@@ -0,0 +1,61 @@
+"""
+Production serving profile: gunicorn managing uvicorn workers (uvloop event
+loop, httptools parser), one per core by default. Settings are in
+gunicorn.conf.py, next to this package:
+
+    cd backend && gunicorn -c gunicorn.conf.py app.main:app
+
+The app is imported once in the gunicorn master and the read-only data
+(airport index, agent modules) loaded there before the workers fork, so every
+worker shares those pages copy-on-write instead of building its own. On
+SIGTERM a worker stops accepting connections, lets the open ones (plans being
+generated, plan streams) finish for up to WEB_DRAIN_SECONDS, then runs the
+app's shutdown, which drains in-app plan jobs (JOB_DRAIN_SECONDS).
+
+For development, `uvicorn app.main:app --reload` still works as before.
+"""
+import gc
+import os
+import logging
+from typing import Dict
+
+from uvicorn.workers import UvicornWorker
+
+logger = logging.getLogger(__name__)
+
+# Worker processes; default one per core (the workers are async, so more than
+# that only adds memory).
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "0")) or os.cpu_count() or 1
+# Open connections one worker accepts before answering 503 (0 = no limit).
+WEB_LIMIT_CONCURRENCY = int(os.getenv("WEB_LIMIT_CONCURRENCY", "0"))
+WEB_KEEPALIVE = int(os.getenv("WEB_KEEPALIVE", "5"))
+# Recycle a worker after this many requests, +/- jitter (0 = never).
+WEB_MAX_REQUESTS = int(os.getenv("WEB_MAX_REQUESTS", "0"))
+WEB_MAX_REQUESTS_JITTER = int(os.getenv("WEB_MAX_REQUESTS_JITTER", "0"))
+# How long a stopping worker waits for open connections; a plan is bounded by
+# PLAN_DEADLINE_SECONDS, so the default leaves room for one to finish.
+WEB_DRAIN_SECONDS = int(os.getenv("WEB_DRAIN_SECONDS", "35"))
+
+
+class Worker(UvicornWorker):
+    CONFIG_KWARGS = {
+        "loop": "uvloop",
+        "http": "httptools",
+        "limit_concurrency": WEB_LIMIT_CONCURRENCY or None,
+        "timeout_graceful_shutdown": WEB_DRAIN_SECONDS,
+    }
+
+
+def preload() -> Dict[str, float]:
+    """
+    Load the shared read-only data in the master. Nothing that holds a
+    connection or a thread is created here; workers build those themselves at
+    startup. The loaded objects are moved out of the garbage collector's
+    reach so that collections in the workers don't write to (and so copy)
+    the shared pages.
+    """
+    from app.planner import warm_up
+    timings = warm_up(clients=False)
+    gc.freeze()
+    logger.info("serve: preloaded in the master: %s", timings)
+    return timings
@@ -0,0 +1,190 @@
+import os
+import json
+import logging
+import functools
+import unicodedata
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# How long a prefix is indexed; longer queries fall through to the trigram index.
+MAX_PREFIX = 12
+# Minimum trigram similarity for a fuzzy search result, and to resolve free text;
+# resolving also needs the best match to beat the runner-up by FUZZY_RESOLVE_MARGIN.
+FUZZY_SEARCH_MIN = 0.3
+FUZZY_RESOLVE_MIN = 0.4
+FUZZY_RESOLVE_MARGIN = 0.15
+
+
+class Airport(NamedTuple):
+    code: str
+    city: str
+    aliases: Tuple[str, ...] = ()
+
+
+def _load_iata_map() -> List[Airport]:
+    """
+    Load the small IATA->City mapping JSON shipped with the repo. A city with
+    other names people type is {"city": ..., "aliases": [...]} instead of a string.
+    """
+    path = os.path.join(os.path.dirname(__file__), "iata_city_map.json")
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            data = json.load(fh)
+            airports = []
+            for code, entry in data.items():
+                if isinstance(entry, str):
+                    entry = {"city": entry}
+                airports.append(Airport(code.upper(), entry["city"], tuple(entry.get("aliases", ()))))
+            return airports
+    except FileNotFoundError:
+        logger.warning("iata_city_map.json not found at %s — falling back to empty map", path)
+        return []
+    except Exception:
+        logger.exception("Failed to load iata_city_map.json")
+        return []
+
+
+def normalize(text: str) -> str:
+    """Lower-case, accents and punctuation stripped, single spaces."""
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode("ascii").lower()
+    return " ".join("".join(ch if ch.isalnum() else " " for ch in text).split())
+
+
+def _trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class AirportIndex:
+    """
+    Lookup structures over codes, city names and aliases, all built up front so
+    a query is a few dict lookups:
+      - exact: normalized code/name/alias -> code
+      - prefix: every prefix (up to MAX_PREFIX chars) of every name and of each
+        word in it -> codes, best match first
+      - trigram: trigram -> codes, for typos ("banglore", "jaipr")
+    """
+
+    def __init__(self, airports: List[Airport]):
+        self.airports: Dict[str, Airport] = {a.code: a for a in airports}
+        self.exact: Dict[str, str] = {}
+        self.prefix: Dict[str, List[str]] = {}
+        self.trigram: Dict[str, List[str]] = {}
+        self._grams: Dict[str, List[Tuple[str, set]]] = {}
+
+        # codes first, then city names, then aliases: an earlier entry wins a clash
+        terms = [(a.code, normalize(a.code)) for a in airports]
+        terms += [(a.code, normalize(a.city)) for a in airports]
+        terms += [(a.code, normalize(alias)) for a in airports for alias in a.aliases]
+        for code, term in terms:
+            if not term:
+                continue
+            self.exact.setdefault(term, code)
+            words = term.split()
+            for start in [term] + (words[1:] if len(words) > 1 else []):
+                for n in range(1, min(len(start), MAX_PREFIX) + 1):
+                    codes = self.prefix.setdefault(start[:n], [])
+                    if code not in codes:
+                        codes.append(code)
+            grams = _trigrams(term)
+            self._grams.setdefault(code, []).append((term, grams))
+            for gram in grams:
+                codes = self.trigram.setdefault(gram, [])
+                if code not in codes:
+                    codes.append(code)
+
+    def get(self, code: str) -> Optional[Airport]:
+        return self.airports.get((code or "").upper())
+
+    def _fuzzy(self, query: str) -> List[Tuple[float, str]]:
+        """(similarity, code) for codes sharing a trigram with `query`, best first."""
+        grams = _trigrams(query)
+        candidates = {code for gram in grams for code in self.trigram.get(gram, ())}
+        scored = []
+        for code in candidates:
+            best = max(len(grams & g) / len(grams | g) for _, g in self._grams[code])
+            scored.append((best, code))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return scored
+
+    def search(self, query: str, limit: int = 8) -> List[Dict[str, str]]:
+        """Autocomplete: exact match first, then prefix matches, then fuzzy ones."""
+        q = normalize(query)
+        if not q or limit <= 0:
+            return []
+        results: Dict[str, str] = {}
+        if q in self.exact:
+            results[self.exact[q]] = "exact"
+        for code in self.prefix.get(q[:MAX_PREFIX], ()):
+            if len(results) >= limit:
+                break
+            if code in results:
+                continue
+            # a query longer than the indexed prefix must still match in full
+            if len(q) > MAX_PREFIX and not any(term.startswith(q) or f" {q}" in term for term, _ in self._grams[code]):
+                continue
+            results[code] = "prefix"
+        if len(results) < limit and len(q) >= 3:
+            for score, code in self._fuzzy(q):
+                if len(results) >= limit or score < FUZZY_SEARCH_MIN:
+                    break
+                results.setdefault(code, "fuzzy")
+        return [
+            {"code": code, "city": self.airports[code].city, "match": match}
+            for code, match in list(results.items())[:limit]
+        ]
+
+    def resolve(self, text: str) -> Optional[Airport]:
+        """
+        The airport a free-text code or place name refers to: exact code, name
+        or alias first, then a close enough fuzzy match. None if nothing fits.
+        """
+        q = normalize(text)
+        if not q:
+            return None
+        if q in self.exact:
+            return self.airports[self.exact[q]]
+        scored = self._fuzzy(q) + [(0.0, ""), (0.0, "")]
+        (best, code), (runner_up, _) = scored[0], scored[1]
+        if best >= FUZZY_RESOLVE_MIN and best - runner_up >= FUZZY_RESOLVE_MARGIN:
+            return self.airports[code]
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def airport_index() -> AirportIndex:
+    """The index over iata_city_map.json, built on first use (or at startup by warm_up)."""
+    return AirportIndex(_load_iata_map())
+
+
+def iata_to_city() -> Dict[str, str]:
+    return {code: airport.city for code, airport in airport_index().airports.items()}
+
+
+def resolve_code(text: str) -> str:
+    """
+    IATA code for a code or place name ("goa", "Bengaluru", "bom"). Unknown
+    three-letter codes pass through upper-cased (the map only covers India);
+    anything else that doesn't resolve comes back as "".
+    """
+    index = airport_index()
+    q = normalize(text)
+    if q in index.exact:
+        return index.exact[q]
+    code = (text or "").strip().upper()
+    if len(code) == 3 and code.isalpha():
+        return code
+    airport = index.resolve(text)
+    return airport.code if airport else ""
+
+
+def city_for_code(code: str) -> str:
+    """
+    Return a human-readable city name for a given IATA code.
+    If unknown, return the code itself so the LLM receives something (but we prefer explicit names).
+    """
+    if not code:
+        return ""
+    airport = airport_index().get(code)
+    return airport.city if airport else code.upper()
@@ -0,0 +1,242 @@
+import os
+import json
+import asyncio
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.utils.redis_helper import get_redis, redis_enabled
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Small thread-safe LRU with a per-entry TTL.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key: the first caller runs the work,
+    everyone else arriving before it finishes waits for that same result.
+    Works for threads (do) and for coroutines on one event loop (do_async).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self._tasks: Dict[Tuple[int, str], "asyncio.Future"] = {}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Return (result, shared) where shared is True if another caller did the work."""
+        with self._lock:
+            fut = self._calls.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._calls[key] = Future()
+
+        if not leader:
+            return fut.result(), True
+
+        try:
+            fut.set_result(fn())
+        except BaseException as e:
+            fut.set_exception(e)
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+        return fut.result(), False
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        loop = asyncio.get_running_loop()
+        task_key = (id(loop), key)
+        task = self._tasks.get(task_key)
+        if task is not None:
+            return await asyncio.shield(task), True
+
+        task = self._tasks[task_key] = asyncio.ensure_future(fn())
+        try:
+            return await asyncio.shield(task), False
+        finally:
+            if task.done():
+                self._tasks.pop(task_key, None)
+            else:
+                task.add_done_callback(lambda _: self._tasks.pop(task_key, None))
+
+
+# Request fields each cached agent actually depends on. Anything else (dates,
+# source airport) is deliberately left out of the key so popular destinations share entries.
+AGENT_CACHE_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "hotels": ("destination", "theme"),
+    "attractions": ("destination", "theme"),
+    "restaurants": ("destination",),
+    "transport": ("destination",),
+    "weather": ("destination", "num_days", "month"),
+}
+
+AGENT_CACHE_TTLS: Dict[str, int] = {
+    "hotels": int(os.getenv("CACHE_TTL_HOTELS", str(24 * 3600))),
+    "attractions": int(os.getenv("CACHE_TTL_ATTRACTIONS", str(7 * 24 * 3600))),
+    "restaurants": int(os.getenv("CACHE_TTL_RESTAURANTS", str(3 * 24 * 3600))),
+    "transport": int(os.getenv("CACHE_TTL_TRANSPORT", str(7 * 24 * 3600))),
+    "weather": int(os.getenv("CACHE_TTL_WEATHER", str(6 * 3600))),
+}
+
+CACHE_KEY_VERSION = "v1"
+
+
+def _normalize(value: Any) -> str:
+    return " ".join(str(value if value is not None else "").lower().split())
+
+
+def state_field(state: Dict[str, Any], field: str) -> str:
+    """Normalized value of a planner state field; "month" is the month of depart_date."""
+    if field == "month":
+        depart = state.get("depart_date") or ""
+        return depart[5:7] if len(depart) >= 7 else ""
+    return _normalize(state.get(field))
+
+
+def agent_cache_key(agent: str, state: Dict[str, Any]) -> Optional[str]:
+    """
+    Build a normalized cache key for `agent` from the planner state, or None if
+    the agent is not cacheable.
+    """
+    fields = AGENT_CACHE_FIELDS.get(agent)
+    if fields is None:
+        return None
+    return f"{agent}:{CACHE_KEY_VERSION}:" + "|".join(state_field(state, field) for field in fields)
+
+
+class AgentCache:
+    """
+    Two-tier cache for agent sections: an in-process LRU in front of Redis.
+    Redis is optional — without it (or when it errors) the LRU alone is used.
+    """
+
+    def __init__(self, maxsize: int = 2048, redis_client: Any = None, prefix: str = "luxura:agent:"):
+        self.lru = LRUCache(maxsize)
+        self.prefix = prefix
+        self._redis = redis_client
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    @property
+    def redis(self):
+        return self._redis if self._redis is not None else get_redis()
+
+    def _redis_enabled(self) -> bool:
+        return self._redis is not None or redis_enabled()
+
+    def _count(self, agent: str, outcome: str) -> None:
+        with self._lock:
+            counters = self._stats.setdefault(agent, {"lru_hits": 0, "redis_hits": 0, "misses": 0, "stores": 0})
+            counters[outcome] += 1
+
+    def _get_redis(self, agent: str, key: str) -> Any:
+        client = self.redis
+        if client is None:
+            return _MISSING
+        try:
+            raw = client.get(self.prefix + key)
+        except Exception:
+            logger.warning("agent cache: redis get failed for %s", key, exc_info=True)
+            return _MISSING
+        if raw is None:
+            return _MISSING
+        value = json.loads(raw)
+        self.lru.set(key, value, AGENT_CACHE_TTLS.get(agent, 3600))
+        return value
+
+    def _set_redis(self, agent: str, key: str, value: Any) -> None:
+        client = self.redis
+        if client is None:
+            return
+        try:
+            client.set(self.prefix + key, json.dumps(value), ex=AGENT_CACHE_TTLS.get(agent, 3600))
+        except Exception:
+            logger.warning("agent cache: redis set failed for %s", key, exc_info=True)
+
+    def _lookup(self, agent: str, key: str, value: Any, tier: str) -> Tuple[Any, Optional[str]]:
+        if value is _MISSING:
+            self._count(agent, "misses")
+            return None, None
+        self._count(agent, f"{tier}_hits")
+        return value, tier
+
+    def get(self, agent: str, key: str) -> Tuple[Any, Optional[str]]:
+        """Return (value, tier) where tier is 'lru', 'redis' or None on a miss."""
+        value = self.lru.get(key, _MISSING)
+        if value is not _MISSING:
+            return self._lookup(agent, key, value, "lru")
+        return self._lookup(agent, key, self._get_redis(agent, key), "redis")
+
+    async def get_async(self, agent: str, key: str) -> Tuple[Any, Optional[str]]:
+        """Like get, but the Redis round trip runs off the event loop."""
+        value = self.lru.get(key, _MISSING)
+        if value is not _MISSING:
+            return self._lookup(agent, key, value, "lru")
+        if not self._redis_enabled():
+            return self._lookup(agent, key, _MISSING, "redis")
+        # resolving the client may connect, so it happens off the loop too
+        value = await asyncio.to_thread(self._get_redis, agent, key)
+        return self._lookup(agent, key, value, "redis")
+
+    def set(self, agent: str, key: str, value: Any) -> None:
+        self.lru.set(key, value, AGENT_CACHE_TTLS.get(agent, 3600))
+        self._count(agent, "stores")
+        self._set_redis(agent, key, value)
+
+    async def set_async(self, agent: str, key: str, value: Any) -> None:
+        self.lru.set(key, value, AGENT_CACHE_TTLS.get(agent, 3600))
+        self._count(agent, "stores")
+        if self._redis_enabled():
+            await asyncio.to_thread(self._set_redis, agent, key, value)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {agent: dict(counters) for agent, counters in self._stats.items()}
+
+
+agent_cache = AgentCache(maxsize=int(os.getenv("AGENT_CACHE_SIZE", "2048")))
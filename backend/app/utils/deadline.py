@@ -0,0 +1,40 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+# Absolute time.monotonic() by which the current request must be done.
+# Set by the planner; read by ask_llm/fetch_flights to size their own timeouts.
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(budget: Optional[float]) -> Iterator[Optional[float]]:
+    """
+    Run the block with at most `budget` seconds left. A scope can only tighten
+    an enclosing deadline, never extend it. Yields the effective deadline.
+    """
+    current = _deadline.get()
+    deadline = current
+    if budget is not None:
+        candidate = time.monotonic() + budget
+        deadline = candidate if current is None else min(current, candidate)
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+def remaining(default: Optional[float] = None) -> Optional[float]:
+    """Seconds left before the current deadline (never negative), or `default` if none is set."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return default
+    return max(0.0, deadline - time.monotonic())
+
+
+def timeout_for(limit: float) -> float:
+    """Per-call timeout: `limit`, shortened to whatever the current deadline leaves."""
+    left = remaining()
+    return limit if left is None else min(limit, left)
@@ -0,0 +1,361 @@
+import os
+import json
+import time
+import uuid
+import heapq
+import asyncio
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.utils.metrics import JOB_WAIT, JOBS
+from app.utils.redis_helper import get_redis
+from app.utils.resilience import PRIORITY_DEFAULT
+
+logger = logging.getLogger(__name__)
+
+# "redis", "local", or "auto" (Redis when REDIS_URL is set, else local).
+JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE", "auto")
+# Jobs (status, events, result) are kept this long after their last update.
+JOB_TTL = int(os.getenv("JOB_TTL", "3600"))
+# Submissions are refused with 503 beyond this many queued jobs.
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "1000"))
+# How often idle workers and subscribers look for new work / events.
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "0.1"))
+# A claimed job is leased to its worker for this long, and the worker renews the
+# lease while it runs; a job whose lease ran out (its worker died) is queued
+# again, up to JOB_MAX_ATTEMPTS runs in all.
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+TERMINAL = ("done", "failed")
+
+
+class QueueFullError(Exception):
+    """Raised by submit when JOB_QUEUE_MAX jobs are already waiting."""
+
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex
+
+
+class JobQueue(ABC):
+    """
+    Plan jobs: a priority queue of job IDs (higher priority first, FIFO within a
+    priority), a record per job and an append-only event log per job that
+    pollers and subscribers read from a cursor.
+    Backends implement the blocking methods; the async versions run them off
+    the event loop when they do I/O.
+    """
+
+    blocking = False
+
+    @abstractmethod
+    def submit(self, request: Dict[str, Any], priority: int = PRIORITY_DEFAULT) -> str:
+        ...
+
+    @abstractmethod
+    def claim(self) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Take the next job off the queue and mark it running; None if the queue is empty."""
+
+    def renew(self, job_id: str) -> None:
+        """Extend the claimed job's lease (backends that lease jobs to workers)."""
+
+    def release(self, job_id: str) -> None:
+        """The claimed job is finished (done or failed): drop its lease."""
+
+    @abstractmethod
+    def update(self, job_id: str, **fields: Any) -> None:
+        ...
+
+    @abstractmethod
+    def append_event(self, job_id: str, event: str, data: Any) -> None:
+        ...
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def events(self, job_id: str, cursor: int = 0) -> List[Tuple[str, Any]]:
+        """Events from position `cursor` on."""
+
+    @abstractmethod
+    def depth(self) -> int:
+        ...
+
+    async def _call(self, fn, *args, **kwargs):
+        if self.blocking:
+            return await asyncio.to_thread(fn, *args, **kwargs)
+        return fn(*args, **kwargs)
+
+    async def submit_async(self, request: Dict[str, Any], priority: int = PRIORITY_DEFAULT) -> str:
+        return await self._call(self.submit, request, priority)
+
+    async def claim_async(self) -> Optional[Tuple[str, Dict[str, Any]]]:
+        return await self._call(self.claim)
+
+    async def renew_async(self, job_id: str) -> None:
+        await self._call(self.renew, job_id)
+
+    async def release_async(self, job_id: str) -> None:
+        await self._call(self.release, job_id)
+
+    async def update_async(self, job_id: str, **fields: Any) -> None:
+        await self._call(self.update, job_id, **fields)
+
+    async def append_event_async(self, job_id: str, event: str, data: Any) -> None:
+        await self._call(self.append_event, job_id, event, data)
+
+    async def get_async(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self._call(self.get, job_id)
+
+    async def events_async(self, job_id: str, cursor: int = 0) -> List[Tuple[str, Any]]:
+        return await self._call(self.events, job_id, cursor)
+
+
+class LocalJobQueue(JobQueue):
+    """
+    In-process queue. Only workers inside the same process (the app's own, see
+    JOB_WORKERS_IN_APP) can take jobs from it.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[int, int, str]] = []
+        self._seq = 0
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._events: Dict[str, List[Tuple[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float) -> None:
+        for job_id in [j for j, job in self._jobs.items() if now - job["updated_at"] > JOB_TTL]:
+            self._jobs.pop(job_id, None)
+            self._events.pop(job_id, None)
+
+    def submit(self, request: Dict[str, Any], priority: int = PRIORITY_DEFAULT) -> str:
+        job_id = new_job_id()
+        now = time.time()
+        with self._lock:
+            if len(self._heap) >= JOB_QUEUE_MAX:
+                raise QueueFullError(f"{len(self._heap)} plan jobs already queued")
+            self._prune(now)
+            self._jobs[job_id] = {
+                "id": job_id, "status": "queued", "priority": priority, "request": request,
+                "created_at": now, "updated_at": now,
+            }
+            self._events[job_id] = [("status", {"status": "queued"})]
+            self._seq += 1
+            heapq.heappush(self._heap, (-priority, self._seq, job_id))
+        JOBS.inc(state="submitted")
+        return job_id
+
+    def claim(self) -> Optional[Tuple[str, Dict[str, Any]]]:
+        with self._lock:
+            while self._heap:
+                _, _, job_id = heapq.heappop(self._heap)
+                job = self._jobs.get(job_id)
+                if job is not None:
+                    now = time.time()
+                    JOB_WAIT.observe(now - job["created_at"])
+                    job.update(status="running", started_at=now, updated_at=now)
+                    self._events[job_id].append(("status", {"status": "running"}))
+                    return job_id, job["request"]
+        return None
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields, updated_at=time.time())
+
+    def append_event(self, job_id: str, event: str, data: Any) -> None:
+        with self._lock:
+            if job_id in self._events:
+                self._events[job_id].append((event, data))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def events(self, job_id: str, cursor: int = 0) -> List[Tuple[str, Any]]:
+        with self._lock:
+            return list(self._events.get(job_id, [])[cursor:])
+
+    def depth(self) -> int:
+        with self._lock:
+            return len(self._heap)
+
+
+class RedisJobQueue(JobQueue):
+    """
+    Queue shared by every web and worker process through Redis: a sorted set
+    of job IDs, a hash per job and a list of events per job, all expiring
+    JOB_TTL after their last write. Claiming moves a job, in one transaction,
+    from the queue to a sorted set of running jobs scored by lease expiry;
+    claim first puts jobs whose lease ran out back in the queue. Unlike the
+    caches there is no local fallback (the worker processes couldn't see it):
+    without Redis, calls raise ConnectionError.
+    """
+
+    blocking = True
+
+    def __init__(self, redis_client: Any = None, prefix: str = "luxura:jobs:"):
+        self.prefix = prefix
+        self._redis = redis_client
+
+    @property
+    def redis(self):
+        client = self._redis if self._redis is not None else get_redis()
+        if client is None:
+            raise ConnectionError("Redis unavailable for the plan job queue")
+        return client
+
+    def _job_key(self, job_id: str) -> str:
+        return f"{self.prefix}job:{job_id}"
+
+    def _events_key(self, job_id: str) -> str:
+        return f"{self.prefix}events:{job_id}"
+
+    def submit(self, request: Dict[str, Any], priority: int = PRIORITY_DEFAULT) -> str:
+        client = self.redis
+        queued = client.zcard(self.prefix + "queue")
+        if queued >= JOB_QUEUE_MAX:
+            raise QueueFullError(f"{queued} plan jobs already queued")
+        job_id = new_job_id()
+        now = time.time()
+        pipe = client.pipeline()
+        pipe.hset(self._job_key(job_id), mapping={
+            "id": job_id, "status": "queued", "priority": priority, "request": json.dumps(request),
+            "created_at": repr(now), "updated_at": repr(now),
+        })
+        pipe.expire(self._job_key(job_id), JOB_TTL)
+        pipe.rpush(self._events_key(job_id), json.dumps(["status", {"status": "queued"}]))
+        pipe.expire(self._events_key(job_id), JOB_TTL)
+        pipe.zadd(self.prefix + "queue", {job_id: self._score(priority, now)})
+        pipe.execute()
+        JOBS.inc(state="submitted")
+        return job_id
+
+    def _score(self, priority: int, created_at: float) -> float:
+        # lower score pops first: priority dominates, submission time breaks ties
+        return -priority * 1e10 + created_at
+
+    def _requeue_expired(self, client) -> None:
+        running = self.prefix + "running"
+        for raw_id in client.zrangebyscore(running, 0, time.time()):
+            job_id = raw_id.decode()
+
+            def requeue(pipe):
+                expires = pipe.zscore(running, job_id)
+                if expires is None or expires > time.time():
+                    return None  # released, renewed or requeued meanwhile
+                priority, created_at, attempts = pipe.hmget(self._job_key(job_id), "priority", "created_at", "attempts")
+                pipe.multi()
+                pipe.zrem(running, job_id)
+                if created_at is None:
+                    return None  # expired
+                if int(attempts or 1) >= JOB_MAX_ATTEMPTS:
+                    return "failed"
+                pipe.zadd(self.prefix + "queue", {job_id: self._score(int(priority), float(created_at))})
+                return "requeued"
+
+            outcome = client.transaction(requeue, running, value_from_callable=True)
+            if outcome == "requeued":
+                logger.warning("job queue: lease on plan job %s expired; queued again", job_id)
+                self.update(job_id, status="queued")
+                self.append_event(job_id, "status", {"status": "queued"})
+                JOBS.inc(state="requeued")
+            elif outcome == "failed":
+                error = f"Travel plan generation failed: worker lost {JOB_MAX_ATTEMPTS} times"
+                logger.warning("job queue: lease on plan job %s expired; giving up", job_id)
+                self.update(job_id, status="failed", error=error, finished_at=time.time())
+                self.append_event(job_id, "status", {"status": "failed", "error": error})
+                JOBS.inc(state="failed")
+
+    def claim(self) -> Optional[Tuple[str, Dict[str, Any]]]:
+        client = self.redis
+        queue, running = self.prefix + "queue", self.prefix + "running"
+        self._requeue_expired(client)
+
+        def take(pipe):
+            head = pipe.zrange(queue, 0, 0)
+            if not head:
+                return None
+            pipe.multi()
+            pipe.zrem(queue, head[0])
+            pipe.zadd(running, {head[0]: time.time() + JOB_LEASE_SECONDS})
+            return head[0].decode()
+
+        while True:
+            job_id = client.transaction(take, queue, value_from_callable=True)
+            if job_id is None:
+                return None
+            raw, created_at = client.hmget(self._job_key(job_id), "request", "created_at")
+            if raw is None:
+                client.zrem(running, job_id)
+                continue  # expired while queued
+            now = time.time()
+            JOB_WAIT.observe(now - float(created_at))
+            client.hincrby(self._job_key(job_id), "attempts", 1)
+            self.update(job_id, status="running", started_at=now)
+            self.append_event(job_id, "status", {"status": "running"})
+            return job_id, json.loads(raw)
+
+    def renew(self, job_id: str) -> None:
+        # xx: a lease that was already given up stays given up
+        self.redis.zadd(self.prefix + "running", {job_id: time.time() + JOB_LEASE_SECONDS}, xx=True)
+
+    def release(self, job_id: str) -> None:
+        self.redis.zrem(self.prefix + "running", job_id)
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        mapping = {k: json.dumps(v) if k in ("plan", "request") else (repr(v) if isinstance(v, float) else str(v))
+                   for k, v in fields.items() if v is not None}
+        mapping["updated_at"] = repr(time.time())
+        pipe = self.redis.pipeline()
+        pipe.hset(self._job_key(job_id), mapping=mapping)
+        pipe.expire(self._job_key(job_id), JOB_TTL)
+        pipe.execute()
+
+    def append_event(self, job_id: str, event: str, data: Any) -> None:
+        pipe = self.redis.pipeline()
+        pipe.rpush(self._events_key(job_id), json.dumps([event, data]))
+        pipe.expire(self._events_key(job_id), JOB_TTL)
+        pipe.execute()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raw = self.redis.hgetall(self._job_key(job_id))
+        if not raw:
+            return None
+        job = {k.decode(): v.decode() for k, v in raw.items()}
+        for field in ("plan", "request"):
+            if field in job:
+                job[field] = json.loads(job[field])
+        for field in ("created_at", "updated_at", "started_at", "finished_at"):
+            if field in job:
+                job[field] = float(job[field])
+        job["priority"] = int(job.get("priority", PRIORITY_DEFAULT))
+        job["attempts"] = int(job.get("attempts", 0))
+        return job
+
+    def events(self, job_id: str, cursor: int = 0) -> List[Tuple[str, Any]]:
+        return [tuple(json.loads(raw)) for raw in self.redis.lrange(self._events_key(job_id), cursor, -1)]
+
+    def depth(self) -> int:
+        return self.redis.zcard(self.prefix + "queue")
+
+
+def _make_queue() -> JobQueue:
+    backend = JOB_QUEUE_BACKEND
+    if backend == "auto":
+        backend = "redis" if os.getenv("REDIS_URL") else "local"
+    if backend == "redis":
+        return RedisJobQueue()
+    if backend != "local":
+        logger.warning("job queue: unknown JOB_QUEUE=%r — using local", backend)
+    return LocalJobQueue()
+
+
+job_queue = _make_queue()
@@ -0,0 +1,212 @@
+"""
+Offline destination knowledge pack.
+
+Attractions, transport and weather for the cities in iata_city_map.json change
+slowly, so they can be generated ahead of time — attractions per city and theme,
+transport per city, weather per city, trip length and month — and served from a read-only,
+memory-mapped SQLite file by the "pack" planner mode. Build or refresh it with:
+
+    cd backend && python -m app.utils.knowledge_pack --workers 8
+    cd backend && python -m app.utils.knowledge_pack --cities GOI,JAI --sections weather
+"""
+import os
+import json
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.utils.cache import state_field
+
+logger = logging.getLogger(__name__)
+
+KNOWLEDGE_PACK_PATH = os.getenv("KNOWLEDGE_PACK_PATH", os.path.join("data", "knowledge_pack.sqlite3"))
+# Entries older than this are treated as missing, so the planner asks the LLM instead.
+KNOWLEDGE_PACK_MAX_AGE = float(os.getenv("KNOWLEDGE_PACK_MAX_AGE_DAYS", "30")) * 24 * 3600
+# Themes attractions are precomputed for; other themes go to the LLM.
+KNOWLEDGE_PACK_THEMES = [
+    t.strip() for t in os.getenv("KNOWLEDGE_PACK_THEMES", "Luxury,Adventure,Family,Romantic,Cultural,Budget").split(",")
+    if t.strip()
+]
+# Trip lengths (days) weather is precomputed for; the summary covers the whole
+# trip, so other lengths go to the LLM.
+KNOWLEDGE_PACK_WEATHER_DAYS = [
+    int(d) for d in os.getenv("KNOWLEDGE_PACK_WEATHER_DAYS", "2,3,4,5,6,7,10,14").split(",") if d.strip()
+]
+KNOWLEDGE_PACK_MMAP_BYTES = int(os.getenv("KNOWLEDGE_PACK_MMAP_BYTES", str(64 * 1024 * 1024)))
+
+# State fields an entry is keyed on, per section (see cache.state_field).
+PACK_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "attractions": ("destination", "theme"),
+    "transport": ("destination",),
+    "weather": ("destination", "num_days", "month"),
+}
+
+
+def pack_key(section: str, state: Dict[str, Any]) -> str:
+    return "|".join(state_field(state, field) for field in PACK_FIELDS[section])
+
+
+class KnowledgePack:
+    """
+    Read side of the pack: one (section, key) -> JSON lookup per call on a
+    read-only connection with the file memory-mapped. A missing file just means
+    every lookup misses; a rebuilt file is picked up by new workers.
+    """
+
+    def __init__(self, path: str = KNOWLEDGE_PACK_PATH, max_age: float = KNOWLEDGE_PACK_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._local = threading.local()
+        self._missing_logged = False
+
+    def _conn(self) -> Optional[sqlite3.Connection]:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if not os.path.exists(self.path):
+                if not self._missing_logged:
+                    logger.warning("knowledge pack not found at %s — pack mode will use the LLM", self.path)
+                    self._missing_logged = True
+                return None
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            conn.execute(f"PRAGMA mmap_size={KNOWLEDGE_PACK_MMAP_BYTES}")
+            self._local.conn = conn
+        return conn
+
+    def get(self, section: str, state: Dict[str, Any]) -> Optional[Any]:
+        """The packed section for this state, or None if it is unknown or stale."""
+        if section not in PACK_FIELDS:
+            return None
+        conn = self._conn()
+        if conn is None:
+            return None
+        try:
+            row = conn.execute(
+                "SELECT built_at, data FROM entries WHERE section = ? AND key = ?", (section, pack_key(section, state))
+            ).fetchone()
+        except sqlite3.Error:
+            logger.warning("knowledge pack: lookup failed for %s", section, exc_info=True)
+            return None
+        if row is None or time.time() - row[0] > self.max_age:
+            return None
+        return json.loads(row[1])
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+knowledge_pack = KnowledgePack()
+
+
+def _build_states(cities: Dict[str, str], sections: List[str]) -> List[Tuple[str, Dict[str, Any]]]:
+    """One (section, state) per pack entry, shaped like the planner's state."""
+    jobs = []
+    for code, city in cities.items():
+        base = {"destination": city, "destination_code": code, "num_days": 3, "theme": "General", "depart_date": None}
+        if "attractions" in sections:
+            jobs += [("attractions", {**base, "theme": theme}) for theme in KNOWLEDGE_PACK_THEMES]
+        if "transport" in sections:
+            jobs.append(("transport", base))
+        if "weather" in sections:
+            jobs += [
+                ("weather", {**base, "num_days": days, "depart_date": f"2000-{month:02d}-15"})
+                for days in KNOWLEDGE_PACK_WEATHER_DAYS for month in range(1, 13)
+            ]
+    return jobs
+
+
+def build_pack(
+    path: str,
+    cities: Dict[str, str],
+    sections: List[str],
+    agents: Dict[str, Tuple[Callable[[Dict[str, Any]], Dict[str, Any]], Any]],
+    workers: int = 8,
+) -> Dict[str, int]:
+    """
+    Generate entries with the regular agents and write them into the pack at
+    `path`. Existing entries for other cities/sections are kept; an answer that
+    is the agent's fallback is not stored. The file is swapped in atomically.
+    """
+    jobs = _build_states(cities, sections)
+
+    def run(job: Tuple[str, Dict[str, Any]]) -> Tuple[str, str, Any]:
+        section, state = job
+        agent, fallback = agents[section]
+        try:
+            value = agent(state).get(section)
+        except Exception:
+            logger.exception("knowledge pack: %s for %s failed", section, state["destination"])
+            value = None
+        return section, pack_key(section, state), None if value == fallback or not value else value
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="pack") as pool:
+        results = list(pool.map(run, jobs))
+
+    tmp = path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(tmp)
+    try:
+        conn.execute(
+            "CREATE TABLE entries (section TEXT NOT NULL, key TEXT NOT NULL, built_at REAL NOT NULL, data TEXT NOT NULL,"
+            " PRIMARY KEY (section, key)) WITHOUT ROWID"
+        )
+        if os.path.exists(path):
+            conn.execute("ATTACH DATABASE ? AS old", (path,))
+            conn.execute("INSERT INTO entries SELECT * FROM old.entries")
+            conn.commit()
+            conn.execute("DETACH DATABASE old")
+        now = time.time()
+        stored = [(section, key, now, json.dumps(value)) for section, key, value in results if value is not None]
+        conn.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", stored)
+        conn.commit()
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    os.replace(tmp, path)
+    return {"entries": len(results), "stored": len(stored), "failed": len(results) - len(stored)}
+
+
+def main(argv=None) -> int:
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    from app.utils.airports import iata_to_city
+    from app.agents.attractions_agent import attractions_agent, SAMPLE as ATTRACTIONS_SAMPLE
+    from app.agents.transport_agent import transport_agent, FALLBACK as TRANSPORT_FALLBACK
+    from app.agents.weather_agent import weather_agent, FALLBACK as WEATHER_FALLBACK
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default=KNOWLEDGE_PACK_PATH)
+    parser.add_argument("--cities", default="all", help="comma-separated IATA codes, or 'all'")
+    parser.add_argument("--sections", default=",".join(PACK_FIELDS), help="comma-separated sections to (re)build")
+    parser.add_argument("--workers", type=int, default=8, help="LLM calls in flight")
+    args = parser.parse_args(argv)
+
+    cities = iata_to_city()
+    if args.cities != "all":
+        codes = [c.strip().upper() for c in args.cities.split(",") if c.strip()]
+        cities = {code: cities.get(code, code) for code in codes}
+    sections = [s.strip() for s in args.sections.split(",") if s.strip() in PACK_FIELDS]
+
+    agents = {
+        "attractions": (attractions_agent, ATTRACTIONS_SAMPLE),
+        "transport": (transport_agent, TRANSPORT_FALLBACK),
+        "weather": (weather_agent, WEATHER_FALLBACK),
+    }
+    summary = build_pack(args.path, cities, sections, agents, args.workers)
+    print(json.dumps({"path": args.path, "cities": len(cities), "sections": sections, **summary}))
+    return 0 if summary["stored"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,179 @@
+import bisect
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+# Latency buckets (seconds) sized for LLM/SerpAPI calls: tens of ms up to a minute.
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+
+
+def _label_str(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, doc: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        with self._lock:
+            return self._values.get(key, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_str(self.labels, key)} {_fmt(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, doc: str, labels: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.doc = doc
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # key -> (per-bucket counts, +Inf count, sum)
+        self._values: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.setdefault(key, [[0] * len(self.buckets), 0, 0.0])
+            if idx < len(self.buckets):
+                entry[0][idx] += 1
+            entry[1] += 1
+            entry[2] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, total_sum) in sorted(self._values.items()):
+                cumulative = 0
+                for upper, count in zip(self.buckets, counts):
+                    cumulative += count
+                    le = 'le="%s"' % _fmt(upper)
+                    lines.append(f"{self.name}_bucket{_label_str(self.labels, key, le)} {cumulative}")
+                inf = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_label_str(self.labels, key, inf)} {total}")
+                lines.append(f"{self.name}_sum{_label_str(self.labels, key)} {_fmt(total_sum)}")
+                lines.append(f"{self.name}_count{_label_str(self.labels, key)} {total}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, doc: str, labels: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, doc, labels))
+
+    def histogram(self, name: str, doc: str, labels: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, doc, labels, buckets))
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+AGENT_DURATION = REGISTRY.histogram(
+    "luxura_agent_duration_seconds", "Wall time of one planner agent call, cache lookups included.", ["agent"]
+)
+AGENT_CALLS = REGISTRY.counter(
+    "luxura_agent_calls_total", "Planner agent calls by outcome (success, error, timeout, cache_hit, shared).", ["agent", "outcome"]
+)
+AGENT_FALLBACKS = REGISTRY.counter(
+    "luxura_agent_fallbacks_total", "Plan sections that ended up as the agent's fallback data.", ["section"]
+)
+PLAN_DURATION = REGISTRY.histogram(
+    "luxura_plan_duration_seconds", "End-to-end plan generation time.", ["planner", "mode"]
+)
+
+LLM_DURATION = REGISTRY.histogram(
+    "luxura_llm_request_duration_seconds", "OpenAI chat completion latency.", ["model"]
+)
+LLM_REQUESTS = REGISTRY.counter(
+    "luxura_llm_requests_total", "OpenAI chat completions by outcome (success, error, invalid_json, aborted, cancelled, deadline, budget, shed).", ["model", "outcome"]
+)
+LLM_TOKENS = REGISTRY.counter(
+    "luxura_llm_tokens_total", "Tokens reported by response.usage.", ["model", "kind"]
+)
+LLM_COST = REGISTRY.counter(
+    "luxura_llm_cost_usd_total", "Estimated OpenAI spend from token usage.", ["model"]
+)
+LLM_HEDGES = REGISTRY.counter(
+    "luxura_llm_hedges_total", "ask_llm calls by hedge trigger (none, slow, failed) and winning completion (primary, hedge, none).", ["trigger", "winner"]
+)
+
+SERPAPI_DURATION = REGISTRY.histogram(
+    "luxura_serpapi_request_duration_seconds", "SerpAPI HTTP request latency, per attempt."
+)
+SERPAPI_REQUESTS = REGISTRY.counter(
+    "luxura_serpapi_requests_total", "SerpAPI HTTP attempts by outcome (status code or error).", ["outcome"]
+)
+FLIGHT_LOOKUPS = REGISTRY.counter(
+    "luxura_flight_lookups_total", "fetch_flights calls by cache outcome (hit, miss, coalesced).", ["outcome"]
+)
+
+RATE_LIMIT_DECISIONS = REGISTRY.counter(
+    "luxura_rate_limit_decisions_total", "Token-bucket checks by budget (client, llm_tokens, serpapi_calls) and outcome.", ["budget", "outcome"]
+)
+UPSTREAM_ADMISSIONS = REGISTRY.counter(
+    "luxura_upstream_admissions_total", "Adaptive concurrency limiter decisions by upstream and outcome (admitted, queued, shed, timeout).", ["upstream", "outcome"]
+)
+UPSTREAM_QUEUE_WAIT = REGISTRY.histogram(
+    "luxura_upstream_queue_wait_seconds", "Time calls waited for a slot under the adaptive concurrency limit.", ["upstream"]
+)
+
+JOBS = REGISTRY.counter(
+    "luxura_plan_jobs_total", "Plan jobs by state change (submitted, started, done, failed, requeued).", ["state"]
+)
+JOB_WAIT = REGISTRY.histogram(
+    "luxura_plan_job_wait_seconds", "Time a plan job spent queued before a worker picked it up."
+)
+
+SEMANTIC_CACHE_LOOKUPS = REGISTRY.counter(
+    "luxura_semantic_cache_lookups_total", "ask_llm semantic cache lookups by outcome (exact, near, miss, stale).", ["outcome"]
+)
+SEMANTIC_CACHE_HIT_AGE = REGISTRY.histogram(
+    "luxura_semantic_cache_hit_age_seconds", "Age of the cached LLM answers served by the semantic cache.",
+    buckets=(60, 300, 900, 1800, 3600, 7200, 14400, 21600, 43200, 86400),
+)
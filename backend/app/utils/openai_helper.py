@@ -1,41 +1,496 @@
 import os
 import json
+import time
+import asyncio
 import logging
-from openai import OpenAI
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Optional, Type
+
+from pydantic import BaseModel, ValidationError
+
+from app.utils.deadline import timeout_for
+from app.utils.metrics import LLM_COST, LLM_DURATION, LLM_HEDGES, LLM_REQUESTS, LLM_TOKENS
+from app.utils.semantic_cache import SEMANTIC_CACHE_ENABLED, semantic_cache
+from app.utils.structured_output import (
+    IncrementalJSONValidator, StreamValidationError, response_format, schema_instructions
+)
+from app.utils.rate_limit import (
+    estimate_llm_tokens, reserve_llm_tokens, reserve_llm_tokens_async, settle_llm_tokens, settle_llm_tokens_async
+)
+from app.utils.resilience import AdaptiveLimiter, ConcurrencyLimitError, Permit, request_priority
 
 logger = logging.getLogger(__name__)
 
 MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-API_KEY = os.getenv("OPENAI_API_KEY")
+# Upper bound for one completion; the request deadline can shorten it further.
+LLM_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+# Extra attempts when an answer is rejected (bad JSON or not matching the schema).
+LLM_INVALID_RETRIES = int(os.getenv("OPENAI_INVALID_RETRIES", "1"))
+# 0 sends json_object with the schema in the prompt instead, for OpenAI-compatible
+# servers that don't support json_schema response formats.
+STRUCTURED_OUTPUTS = os.getenv("OPENAI_STRUCTURED_OUTPUTS", "1") != "0"
+
+# Hedging: a completion still running after the LLM_HEDGE_PERCENTILE latency of
+# recent ones (per schema, at least LLM_HEDGE_MIN_SECONDS) gets a duplicate sent
+# to OPENAI_HEDGE_MODEL (default: the same model); a failed one gets it right
+# away. The first valid answer wins and the other stream is closed.
+LLM_HEDGE = os.getenv("OPENAI_HEDGE", "1") != "0"
+HEDGE_MODEL = os.getenv("OPENAI_HEDGE_MODEL") or MODEL
+LLM_HEDGE_PERCENTILE = float(os.getenv("OPENAI_HEDGE_PERCENTILE", "90"))
+LLM_HEDGE_MIN_SECONDS = float(os.getenv("OPENAI_HEDGE_MIN_SECONDS", "1"))
+# Hedge delay until LLM_HEDGE_MIN_SAMPLES completions have been timed.
+LLM_HEDGE_DEFAULT_SECONDS = float(os.getenv("OPENAI_HEDGE_DEFAULT_SECONDS", "10"))
+LLM_HEDGE_MIN_SAMPLES = 20
+LLM_HEDGE_WINDOW = 200
+
+# Adaptive limit on concurrent completions per process (see AdaptiveLimiter):
+# starts at OPENAI_CONCURRENCY, moves between 1 and OPENAI_MAX_CONCURRENCY with
+# the time to first token; calls over it queue by plan priority.
+llm_limiter = AdaptiveLimiter(
+    "openai",
+    initial_limit=int(os.getenv("OPENAI_CONCURRENCY", "16")),
+    max_limit=int(os.getenv("OPENAI_MAX_CONCURRENCY", "64")),
+    max_queue=int(os.getenv("OPENAI_MAX_QUEUED", "256")),
+)
+
+# Built on first use (or by warm_up() at app startup) so that importing this
+# module needs neither the openai package loaded nor OPENAI_API_KEY set.
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+
+# USD per 1M (prompt, completion) tokens; unknown models are counted at zero cost.
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+}
+
+# Per-plan usage totals; the planner installs a fresh dict per request and it is
+# carried into agent threads/tasks by context copying.
+_request_usage: ContextVar[Optional[dict]] = ContextVar("llm_request_usage", default=None)
+_usage_lock = threading.Lock()
+
+# Recent successful completion times of MODEL, per schema, for the hedge delay.
+_latencies: Dict[str, Deque[float]] = {}
+_latency_lock = threading.Lock()
+# Runs the competing completions of a hedged sync call.
+_hedge_pool = ThreadPoolExecutor(max_workers=int(os.getenv("OPENAI_HEDGE_THREADS", "64")), thread_name_prefix="llm-hedge")
+
+
+def track_usage() -> dict:
+    """Start accumulating LLM usage for the current request and return the totals dict."""
+    usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+    _request_usage.set(usage)
+    return usage
+
+
+def _record(model: str, started: float, outcome: str, usage=None) -> None:
+    LLM_DURATION.observe(time.perf_counter() - started, model=model)
+    LLM_REQUESTS.inc(model=model, outcome=outcome)
+
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    price_in, price_out = MODEL_PRICES.get(model, (0.0, 0.0))
+    cost = (prompt_tokens * price_in + completion_tokens * price_out) / 1_000_000
+    if usage is not None:
+        LLM_TOKENS.inc(prompt_tokens, model=model, kind="prompt")
+        LLM_TOKENS.inc(completion_tokens, model=model, kind="completion")
+        LLM_COST.inc(cost, model=model)
+
+    totals = _request_usage.get()
+    if totals is not None:
+        with _usage_lock:
+            totals["calls"] += 1
+            totals["prompt_tokens"] += prompt_tokens
+            totals["completion_tokens"] += completion_tokens
+            totals["cost_usd"] = round(totals["cost_usd"] + cost, 6)
+
+
+def _api_key() -> str:
+    # read at call time so a .env loaded after import is still picked up
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY missing in .env")
+    return api_key
+
+
+def get_client():
+    """Shared OpenAI client, created on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                api_key = _api_key()
+                from openai import OpenAI
+                _client = OpenAI(api_key=api_key)
+    return _client
 
-if not API_KEY:
-    raise ValueError("OPENAI_API_KEY missing in .env")
 
-client = OpenAI(api_key=API_KEY)
+def get_async_client():
+    """Shared AsyncOpenAI client, created on first use."""
+    global _async_client
+    if _async_client is None:
+        with _client_lock:
+            if _async_client is None:
+                api_key = _api_key()
+                from openai import AsyncOpenAI
+                _async_client = AsyncOpenAI(api_key=api_key)
+    return _async_client
 
-def ask_llm(prompt: str, system: str = "You must return ONLY valid JSON.") -> dict:
+
+def warm_up() -> bool:
     """
-    Calls OpenAI with structured output using response_format.
-    Requires system message to contain the word 'json'.
+    Build both clients ahead of the first request. Returns False (and logs)
+    instead of raising when the key is missing, so the app can still start.
     """
+    try:
+        get_client()
+        get_async_client()
+    except ValueError as e:
+        logger.warning("LLM clients not ready: %s", e)
+        return False
+    return True
+
+
+class _Skipped(Exception):
+    """The call was not made (deadline passed or budget spent)."""
+
+
+class _Cancelled(Exception):
+    """The other completion of a hedged call won; this one was dropped."""
+
+
+# Answers that are worth asking for again: cut off mid-stream, unparseable or not fitting the schema.
+_INVALID = (StreamValidationError, json.JSONDecodeError, ValidationError)
+
 
+def _messages(prompt: str, system: str, schema: Optional[Type[BaseModel]] = None) -> list:
+    if schema is not None and not STRUCTURED_OUTPUTS:
+        system = f"{system}\n{schema_instructions(schema)}"
     if "json" not in system.lower():
         system += " (Return only JSON)"
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def _request(prompt: str, system: str, schema: Optional[Type[BaseModel]], timeout: float, model: str = MODEL) -> dict:
+    return {
+        "model": model,
+        "timeout": timeout,
+        "messages": _messages(prompt, system, schema),
+        "temperature": 0.2,
+        "response_format": response_format(schema) if schema is not None and STRUCTURED_OUTPUTS else {"type": "json_object"},
+        "stream": True,
+        "stream_options": {"include_usage": True},
+    }
+
+
+def _feed(validator: IncrementalJSONValidator, chunk):
+    """Push one streamed chunk through the validator; returns the chunk's usage (only the last one has it)."""
+    for choice in chunk.choices:
+        delta = choice.delta
+        if delta is None:
+            continue
+        if getattr(delta, "refusal", None):
+            raise StreamValidationError("model refused to answer")
+        if delta.content:
+            validator.feed(delta.content)
+    return chunk.usage
+
+
+def _total_tokens(usage) -> Optional[int]:
+    return getattr(usage, "total_tokens", None) if usage is not None else None
+
+
+def _schema_key(schema: Optional[Type[BaseModel]]) -> str:
+    return schema.__name__ if schema is not None else ""
 
+
+def _observe_latency(model: str, schema: Optional[Type[BaseModel]], seconds: float) -> None:
+    if model != MODEL:
+        return
+    with _latency_lock:
+        _latencies.setdefault(_schema_key(schema), deque(maxlen=LLM_HEDGE_WINDOW)).append(seconds)
+
+
+def hedge_delay(schema: Optional[Type[BaseModel]] = None) -> float:
+    """Seconds a completion may run before a duplicate is sent."""
+    with _latency_lock:
+        samples = sorted(_latencies.get(_schema_key(schema), ()))
+    if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+        return LLM_HEDGE_DEFAULT_SECONDS
+    at = samples[min(len(samples) - 1, int(len(samples) * LLM_HEDGE_PERCENTILE / 100))]
+    return max(LLM_HEDGE_MIN_SECONDS, at)
+
+
+def _call(prompt: str, system: str, schema: Optional[Type[BaseModel]], model: str = MODEL,
+          cancel: Optional[threading.Event] = None) -> Any:
+    """One streamed completion, parsed and validated; raises on any failure."""
+    timeout = timeout_for(LLM_TIMEOUT)
+    if timeout <= 0:
+        _record(model, time.perf_counter(), "deadline")
+        raise _Skipped("request deadline already passed")
+    try:
+        permit = llm_limiter.acquire(timeout=timeout)
+    except ConcurrencyLimitError as e:
+        _record(model, time.perf_counter(), "shed")
+        raise _Skipped(str(e))
+    with permit:
+        return _stream(prompt, system, schema, model, cancel, permit)
+
+
+def _stream(prompt: str, system: str, schema: Optional[Type[BaseModel]], model: str,
+            cancel: Optional[threading.Event], permit: Permit) -> Any:
+    # measured again: waiting for the permit comes off the completion's own time
+    timeout = timeout_for(LLM_TIMEOUT)
+    if timeout <= 0:
+        permit.skip = True
+        _record(model, time.perf_counter(), "deadline")
+        raise _Skipped("request deadline passed while queued")
+
+    # shared tokens/min budget: with it spent, the agent falls back instead of calling out
+    estimate = estimate_llm_tokens(prompt, system)
+    if not reserve_llm_tokens(estimate):
+        permit.skip = True
+        _record(model, time.perf_counter(), "budget")
+        raise _Skipped("shared token budget exhausted")
+
+    started = time.perf_counter()
+    validator = IncrementalJSONValidator(schema)
+    usage, streamed = None, False
+    try:
+        stream = get_client().chat.completions.create(**_request(prompt, system, schema, timeout, model))
+        try:
+            for chunk in stream:
+                if cancel is not None and cancel.is_set():
+                    raise _Cancelled("hedged call already answered")
+                # time to first chunk is the limiter's sample: unlike the whole
+                # completion it doesn't grow with the length of the answer
+                if permit.latency is None:
+                    permit.latency = time.perf_counter() - started
+                usage = _feed(validator, chunk) or usage
+            streamed = True
+        finally:
+            # on an early abort this drops the connection, which stops the generation
+            stream.close()
+        data = validator.finish()
+    except _INVALID:
+        permit.skip = True
+        _record(model, started, "invalid_json" if streamed else "aborted", usage)
+        settle_llm_tokens(estimate, _total_tokens(usage))
+        raise
+    except _Cancelled:
+        permit.skip = True
+        _record(model, started, "cancelled", usage)
+        settle_llm_tokens(estimate, _total_tokens(usage))
+        raise
+    except Exception:
+        _record(model, started, "error", usage)
+        settle_llm_tokens(estimate, 0)
+        raise
+    _record(model, started, "success", usage)
+    _observe_latency(model, schema, time.perf_counter() - started)
+    settle_llm_tokens(estimate, _total_tokens(usage))
+    return data
+
+
+async def _call_async(prompt: str, system: str, schema: Optional[Type[BaseModel]], model: str = MODEL) -> Any:
+    timeout = timeout_for(LLM_TIMEOUT)
+    if timeout <= 0:
+        _record(model, time.perf_counter(), "deadline")
+        raise _Skipped("request deadline already passed")
+    try:
+        permit = await llm_limiter.acquire_async(timeout=timeout)
+    except ConcurrencyLimitError as e:
+        _record(model, time.perf_counter(), "shed")
+        raise _Skipped(str(e))
+    with permit:
+        return await _stream_async(prompt, system, schema, model, permit)
+
+
+async def _stream_async(prompt: str, system: str, schema: Optional[Type[BaseModel]], model: str, permit: Permit) -> Any:
+    timeout = timeout_for(LLM_TIMEOUT)
+    if timeout <= 0:
+        permit.skip = True
+        _record(model, time.perf_counter(), "deadline")
+        raise _Skipped("request deadline passed while queued")
+
+    estimate = estimate_llm_tokens(prompt, system)
+    if not await reserve_llm_tokens_async(estimate):
+        permit.skip = True
+        _record(model, time.perf_counter(), "budget")
+        raise _Skipped("shared token budget exhausted")
+
+    started = time.perf_counter()
+    validator = IncrementalJSONValidator(schema)
+    usage, streamed = None, False
     try:
-        response = client.chat.completions.create(
-            model=MODEL,
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.2,
-            response_format={"type": "json_object"}  
-        )
-
-        content = response.choices[0].message.content
-        return json.loads(content)
-
-    except Exception as e:
-        logger.error(f"Structured LLM error: {e}")
-        return {}
+        stream = await get_async_client().chat.completions.create(**_request(prompt, system, schema, timeout, model))
+        try:
+            async for chunk in stream:
+                if permit.latency is None:
+                    permit.latency = time.perf_counter() - started
+                usage = _feed(validator, chunk) or usage
+            streamed = True
+        finally:
+            await stream.close()
+        data = validator.finish()
+    except _INVALID:
+        permit.skip = True
+        _record(model, started, "invalid_json" if streamed else "aborted", usage)
+        await settle_llm_tokens_async(estimate, _total_tokens(usage))
+        raise
+    except asyncio.CancelledError:
+        # the other completion of a hedged call won (or the plan was cancelled)
+        permit.skip = True
+        _record(model, started, "cancelled", usage)
+        await settle_llm_tokens_async(estimate, _total_tokens(usage))
+        raise
+    except Exception:
+        _record(model, started, "error", usage)
+        await settle_llm_tokens_async(estimate, 0)
+        raise
+    _record(model, started, "success", usage)
+    _observe_latency(model, schema, time.perf_counter() - started)
+    await settle_llm_tokens_async(estimate, _total_tokens(usage))
+    return data
+
+
+def _hedged(prompt: str, system: str, schema: Optional[Type[BaseModel]]) -> Any:
+    """_call, hedged: both completions run on _hedge_pool and the first valid answer is returned."""
+    if not LLM_HEDGE:
+        return _call(prompt, system, schema)
+    cancel = threading.Event()
+
+    def submit(model: str, hedge: bool = False):
+        context = contextvars.copy_context()
+        if hedge:
+            # the duplicate is the first call to shed when the limiter is full
+            context.run(request_priority.set, request_priority.get() - 1)
+        return _hedge_pool.submit(context.run, _call, prompt, system, schema, model, cancel)
+
+    primary = submit(MODEL)
+    running = {primary: "primary"}
+    done, _ = wait(running, timeout=hedge_delay(schema))
+    # an answer, or a call that wasn't made (deadline, budget), needs no hedge
+    if done and (primary.exception() is None or isinstance(primary.exception(), _Skipped)):
+        LLM_HEDGES.inc(trigger="none", winner="primary")
+        return primary.result()
+    if done:
+        running.pop(primary)
+    trigger = "failed" if done else "slow"
+    running[submit(HEDGE_MODEL, hedge=True)] = "hedge"
+    error = None
+    while running:
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            name = running.pop(future)
+            if future.exception() is None:
+                cancel.set()
+                LLM_HEDGES.inc(trigger=trigger, winner=name)
+                return future.result()
+            error = future.exception()
+    LLM_HEDGES.inc(trigger=trigger, winner="none")
+    raise error
+
+
+async def _hedge_async(prompt: str, system: str, schema: Optional[Type[BaseModel]]) -> Any:
+    # runs in its own task (and context): the lower priority stays with the duplicate
+    request_priority.set(request_priority.get() - 1)
+    return await _call_async(prompt, system, schema, HEDGE_MODEL)
+
+
+async def _hedged_async(prompt: str, system: str, schema: Optional[Type[BaseModel]]) -> Any:
+    if not LLM_HEDGE:
+        return await _call_async(prompt, system, schema)
+    primary = asyncio.ensure_future(_call_async(prompt, system, schema))
+    running = {primary: "primary"}
+    try:
+        done, _ = await asyncio.wait(running, timeout=hedge_delay(schema))
+        if done and (primary.exception() is None or isinstance(primary.exception(), _Skipped)):
+            LLM_HEDGES.inc(trigger="none", winner="primary")
+            return primary.result()
+        if done:
+            running.pop(primary)
+        trigger = "failed" if done else "slow"
+        running[asyncio.ensure_future(_hedge_async(prompt, system, schema))] = "hedge"
+        error = None
+        while running:
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name = running.pop(task)
+                if task.exception() is None:
+                    LLM_HEDGES.inc(trigger=trigger, winner=name)
+                    return task.result()
+                error = task.exception()
+        LLM_HEDGES.inc(trigger=trigger, winner="none")
+        raise error
+    finally:
+        # the losing completion, or both if the caller itself was cancelled
+        for task in running:
+            task.cancel()
+
+
+def ask_llm(prompt: str, system: str = "You must return ONLY valid JSON.", schema: Optional[Type[BaseModel]] = None) -> dict:
+    """
+    Streams a JSON completion and returns it parsed, or {} on failure.
+    With `schema` (a pydantic model from app.schemas) the answer is constrained by
+    JSON-schema structured outputs and validated against the model. Answers are
+    checked chunk by chunk, so a bad one is dropped at the first wrong character
+    and asked for again (up to LLM_INVALID_RETRIES more times). A slow or failed
+    completion is hedged with a second one (see LLM_HEDGE).
+    Answers are kept in the semantic cache, which also answers near-duplicate
+    prompts (see app.utils.semantic_cache).
+    """
+    if SEMANTIC_CACHE_ENABLED:
+        cached = semantic_cache.get(prompt, system, schema)
+        if cached is not None:
+            return cached
+    for attempt in range(LLM_INVALID_RETRIES + 1):
+        try:
+            data = _hedged(prompt, system, schema)
+            if SEMANTIC_CACHE_ENABLED:
+                semantic_cache.set(prompt, system, schema, data)
+            return data
+        except _INVALID as e:
+            logger.warning("LLM answer rejected (attempt %d): %s", attempt + 1, e)
+        except _Skipped as e:
+            logger.warning("LLM call skipped: %s", e)
+            return {}
+        except Exception as e:
+            logger.error(f"Structured LLM error: {e}")
+            return {}
+    return {}
+
+
+async def ask_llm_async(prompt: str, system: str = "You must return ONLY valid JSON.", schema: Optional[Type[BaseModel]] = None) -> dict:
+    """
+    Async twin of ask_llm using AsyncOpenAI, so callers on the event loop never block it.
+    """
+    if SEMANTIC_CACHE_ENABLED:
+        cached = semantic_cache.get(prompt, system, schema)
+        if cached is not None:
+            return cached
+    for attempt in range(LLM_INVALID_RETRIES + 1):
+        try:
+            data = await _hedged_async(prompt, system, schema)
+            if SEMANTIC_CACHE_ENABLED:
+                semantic_cache.set(prompt, system, schema, data)
+            return data
+        except _INVALID as e:
+            logger.warning("LLM answer rejected (attempt %d): %s", attempt + 1, e)
+        except _Skipped as e:
+            logger.warning("LLM call skipped: %s", e)
+            return {}
+        except Exception as e:
+            logger.error(f"Structured LLM error: {e}")
+            return {}
+    return {}
@@ -0,0 +1,200 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import asyncio
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+
+from app.utils.redis_helper import get_redis
+
+logger = logging.getLogger(__name__)
+
+# "sqlite", "redis", or "auto" (Redis when REDIS_URL is set, else SQLite).
+PLAN_STORE_BACKEND = os.getenv("PLAN_STORE", "auto")
+PLAN_STORE_PATH = os.getenv("PLAN_STORE_PATH", os.path.join("data", "plans.sqlite3"))
+# How long a stored plan can be fetched by ID.
+PLAN_STORE_TTL = int(os.getenv("PLAN_STORE_TTL", str(30 * 24 * 3600)))
+
+# Request fields that identify a plan; per-call knobs (bypass_cache, deadline)
+# and derived values (destination_city) don't change what is asked for.
+PLAN_KEY_FIELDS = ("source", "destination", "depart_date", "return_date", "num_days", "theme", "mode", "flex_days")
+PLAN_KEY_VERSION = "v1"
+
+
+def _normalize(value: Any) -> str:
+    return " ".join(str(value if value is not None else "").lower().split())
+
+
+def plan_id_for(request: Dict[str, Any]) -> str:
+    """Content address of a request: identical requests get the same plan ID."""
+    key = PLAN_KEY_VERSION + "|" + "|".join(_normalize(request.get(field)) for field in PLAN_KEY_FIELDS)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+def plan_etag(plan: Dict[str, Any]) -> str:
+    body = json.dumps(plan, sort_keys=True, separators=(",", ":"))
+    return '"' + hashlib.sha256(body.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+class PlanStore(ABC):
+    """
+    Stored plans keyed by plan ID. A record holds the request, the agent inputs it
+    resolved to and the plan; the store adds "etag" and "created_at" to it.
+    Backends implement the blocking put/get/etag; the async versions run them
+    off the event loop.
+    """
+
+    ttl = PLAN_STORE_TTL
+
+    @abstractmethod
+    def put(self, plan_id: str, record: Dict[str, Any]) -> str:
+        ...
+
+    @abstractmethod
+    def get(self, plan_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def etag(self, plan_id: str) -> Optional[str]:
+        """ETag of the stored plan, without loading the plan itself."""
+
+    async def put_async(self, plan_id: str, record: Dict[str, Any]) -> str:
+        return await asyncio.to_thread(self.put, plan_id, record)
+
+    async def get_async(self, plan_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.get, plan_id)
+
+    async def etag_async(self, plan_id: str) -> Optional[str]:
+        return await asyncio.to_thread(self.etag, plan_id)
+
+
+class SQLitePlanStore(PlanStore):
+    """
+    Plans in a local SQLite file. The database is opened on first use; each
+    thread gets its own connection.
+    """
+
+    def __init__(self, path: str = PLAN_STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            with self._init_lock:
+                if not self._initialized:
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS plans ("
+                        "id TEXT PRIMARY KEY, created_at REAL NOT NULL, etag TEXT NOT NULL, record TEXT NOT NULL)"
+                    )
+                    conn.execute("CREATE INDEX IF NOT EXISTS plans_created_at ON plans (created_at)")
+                    conn.commit()
+                    self._initialized = True
+        return conn
+
+    def put(self, plan_id: str, record: Dict[str, Any]) -> str:
+        now = time.time()
+        etag = plan_etag(record["plan"])
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO plans (id, created_at, etag, record) VALUES (?, ?, ?, ?)",
+            (plan_id, now, etag, json.dumps(record)),
+        )
+        conn.execute("DELETE FROM plans WHERE created_at < ?", (now - self.ttl,))
+        conn.commit()
+        return etag
+
+    def get(self, plan_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            "SELECT created_at, etag, record FROM plans WHERE id = ? AND created_at >= ?",
+            (plan_id, time.time() - self.ttl),
+        ).fetchone()
+        if row is None:
+            return None
+        return {**json.loads(row[2]), "created_at": row[0], "etag": row[1]}
+
+    def etag(self, plan_id: str) -> Optional[str]:
+        row = self._conn().execute(
+            "SELECT etag FROM plans WHERE id = ? AND created_at >= ?", (plan_id, time.time() - self.ttl)
+        ).fetchone()
+        return row[0] if row else None
+
+
+class RedisPlanStore(PlanStore):
+    """
+    Plans in Redis (one hash per plan, expiring after PLAN_STORE_TTL), shared by
+    every worker. Redis is optional — without it (or when it errors) plans go to
+    the local SQLite store instead.
+    """
+
+    def __init__(self, redis_client: Any = None, prefix: str = "luxura:plan:", local: Optional[PlanStore] = None):
+        self.prefix = prefix
+        self._redis = redis_client
+        self.local = local or SQLitePlanStore()
+
+    @property
+    def redis(self):
+        return self._redis if self._redis is not None else get_redis()
+
+    def put(self, plan_id: str, record: Dict[str, Any]) -> str:
+        client = self.redis
+        if client is not None:
+            etag = plan_etag(record["plan"])
+            try:
+                key = self.prefix + plan_id
+                pipe = client.pipeline()
+                pipe.hset(key, mapping={"created_at": repr(time.time()), "etag": etag, "record": json.dumps(record)})
+                pipe.expire(key, self.ttl)
+                pipe.execute()
+                return etag
+            except Exception:
+                logger.warning("plan store: redis put failed for %s — storing locally", plan_id, exc_info=True)
+        return self.local.put(plan_id, record)
+
+    def get(self, plan_id: str) -> Optional[Dict[str, Any]]:
+        client = self.redis
+        if client is not None:
+            try:
+                created_at, etag, raw = client.hmget(self.prefix + plan_id, "created_at", "etag", "record")
+                if raw is not None:
+                    return {**json.loads(raw), "created_at": float(created_at), "etag": etag.decode()}
+            except Exception:
+                logger.warning("plan store: redis get failed for %s", plan_id, exc_info=True)
+        return self.local.get(plan_id)
+
+    def etag(self, plan_id: str) -> Optional[str]:
+        client = self.redis
+        if client is not None:
+            try:
+                etag = client.hget(self.prefix + plan_id, "etag")
+                if etag is not None:
+                    return etag.decode()
+            except Exception:
+                logger.warning("plan store: redis get failed for %s", plan_id, exc_info=True)
+        return self.local.etag(plan_id)
+
+
+def _make_store() -> PlanStore:
+    backend = PLAN_STORE_BACKEND
+    if backend == "auto":
+        backend = "redis" if os.getenv("REDIS_URL") else "sqlite"
+    if backend == "redis":
+        return RedisPlanStore()
+    if backend != "sqlite":
+        logger.warning("plan store: unknown PLAN_STORE=%r — using sqlite", backend)
+    return SQLitePlanStore()
+
+
+plan_store = _make_store()
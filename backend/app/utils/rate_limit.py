@@ -0,0 +1,233 @@
+import os
+import math
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from app.utils.metrics import RATE_LIMIT_DECISIONS
+from app.utils.redis_helper import get_redis, redis_enabled
+
+logger = logging.getLogger(__name__)
+
+
+class Budget(NamedTuple):
+    """A token bucket: holds up to `capacity` tokens, refilled at `capacity / period` per second."""
+    name: str
+    capacity: float
+    period: float
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0 and self.period > 0
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+
+class Decision(NamedTuple):
+    allowed: bool
+    remaining: float
+    retry_after: float
+
+
+class BudgetExhaustedError(Exception):
+    """Raised instead of calling an upstream whose shared budget is used up."""
+
+
+# Per-client request limit on the plan endpoints (replaces slowapi's per-process "5/minute").
+CLIENT_LIMIT = Budget("client", float(os.getenv("RATE_LIMIT_PER_MINUTE", "5")), 60.0)
+# Shared upstream quotas, enforced across every worker that talks to the same Redis.
+# 0 disables a budget.
+LLM_TOKEN_BUDGET = Budget("llm_tokens", float(os.getenv("LLM_TOKENS_PER_MINUTE", "200000")), 60.0)
+SERPAPI_BUDGET = Budget("serpapi_calls", float(os.getenv("SERPAPI_CALLS_PER_HOUR", "1000")), 3600.0)
+
+# Most per-key buckets one worker keeps while it falls back to LocalBuckets; the
+# least recently used are dropped beyond this (coming back refilled).
+RATE_LIMIT_LOCAL_BUCKETS = int(os.getenv("RATE_LIMIT_LOCAL_BUCKETS", "10000"))
+
+# Completion tokens reserved per LLM call before the real usage is known.
+LLM_COMPLETION_ESTIMATE = int(os.getenv("LLM_COMPLETION_ESTIMATE", "800"))
+
+# Refill and take in one atomic step, on Redis' clock so workers don't need synced clocks.
+# KEYS[1] bucket; ARGV capacity, rate/s, cost, force (1 = take even if it goes negative), ttl.
+# A negative cost is a refund. Returns {allowed, tokens, retry_after}.
+_TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= cost or ARGV[4] == '1' then
+  tokens = math.min(capacity, tokens - cost)
+  allowed = 1
+else
+  wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return {allowed, tostring(tokens), tostring(wait)}
+"""
+
+
+def _take(tokens: float, ts: float, now: float, capacity: float, rate: float,
+          cost: float, force: bool) -> Tuple[Decision, float]:
+    """Same arithmetic as _TAKE_SCRIPT; returns (decision, tokens left in the bucket)."""
+    tokens = min(capacity, tokens + max(0.0, now - ts) * rate)
+    if tokens >= cost or force:
+        tokens = min(capacity, tokens - cost)
+        return Decision(True, tokens, 0.0), tokens
+    return Decision(False, tokens, (cost - tokens) / rate), tokens
+
+
+class LocalBuckets:
+    """
+    In-process token buckets with the same semantics as the Redis script.
+    Used when Redis is not configured or is failing, so limits then hold per worker.
+    Bounded like LRUCache: past `maxsize` keys the least recently used bucket goes.
+    """
+
+    def __init__(self, maxsize: int = RATE_LIMIT_LOCAL_BUCKETS):
+        self.maxsize = maxsize
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, capacity: float, rate: float, cost: float, force: bool = False) -> Decision:
+        now = time.monotonic()
+        with self._lock:
+            tokens, ts = self._buckets.get(key, (capacity, now))
+            decision, tokens = _take(tokens, ts, now, capacity, rate, cost, force)
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return decision
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class TokenBucketLimiter:
+    """
+    Token buckets shared through Redis, so every worker draws from the same
+    budget. Redis is optional — without it (or when it errors) LocalBuckets is used.
+    """
+
+    def __init__(self, redis_client: Any = None, prefix: str = "luxura:rl:"):
+        self.prefix = prefix
+        self.local = LocalBuckets()
+        self._redis = redis_client
+
+    @property
+    def redis(self):
+        return self._redis if self._redis is not None else get_redis()
+
+    def _redis_enabled(self) -> bool:
+        return self._redis is not None or redis_enabled()
+
+    def take(self, budget: Budget, key: str = "global", cost: float = 1.0, force: bool = False) -> Decision:
+        """Take `cost` tokens from `budget`'s bucket for `key`; disabled budgets always allow."""
+        if not budget.enabled:
+            return Decision(True, math.inf, 0.0)
+        bucket = f"{budget.name}:{key}"
+        decision = None
+        client = self.redis
+        if client is not None:
+            try:
+                allowed, tokens, wait = client.eval(
+                    _TAKE_SCRIPT, 1, self.prefix + bucket,
+                    budget.capacity, budget.rate, cost, 1 if force else 0, max(1, math.ceil(budget.period * 2)),
+                )
+                decision = Decision(bool(int(allowed)), float(tokens), float(wait))
+            except Exception:
+                logger.warning("rate limit: redis eval failed for %s — using local bucket", bucket, exc_info=True)
+        if decision is None:
+            decision = self.local.take(bucket, budget.capacity, budget.rate, cost, force)
+        if cost > 0 and not force:
+            RATE_LIMIT_DECISIONS.inc(budget=budget.name, outcome="allowed" if decision.allowed else "denied")
+        return decision
+
+    async def take_async(self, budget: Budget, key: str = "global", cost: float = 1.0, force: bool = False) -> Decision:
+        """Like take, but the Redis round trip runs off the event loop."""
+        # resolving the client may connect, so that happens in the thread too
+        if budget.enabled and self._redis_enabled():
+            return await asyncio.to_thread(self.take, budget, key, cost, force)
+        return self.take(budget, key, cost, force)
+
+    def remaining(self, budget: Budget, key: str = "global") -> float:
+        return self.take(budget, key, cost=0).remaining
+
+
+rate_limiter = TokenBucketLimiter()
+
+
+def check_client(client_id: str, cost: float = 1.0) -> Decision:
+    """Charge `cost` plan requests to the client's bucket (a batch costs one per plan)."""
+    return rate_limiter.take(CLIENT_LIMIT, client_id, cost)
+
+
+async def check_client_async(client_id: str, cost: float = 1.0) -> Decision:
+    return await rate_limiter.take_async(CLIENT_LIMIT, client_id, cost)
+
+
+def estimate_llm_tokens(*texts: str) -> int:
+    """Rough prompt size (~4 chars per token) plus the completion allowance."""
+    return sum(len(t) for t in texts) // 4 + LLM_COMPLETION_ESTIMATE
+
+
+def reserve_llm_tokens(estimate: int) -> bool:
+    return rate_limiter.take(LLM_TOKEN_BUDGET, cost=estimate).allowed
+
+
+async def reserve_llm_tokens_async(estimate: int) -> bool:
+    return (await rate_limiter.take_async(LLM_TOKEN_BUDGET, cost=estimate)).allowed
+
+
+def settle_llm_tokens(estimate: int, actual: Optional[int]) -> None:
+    """Correct a reservation once the real usage is known (refunds when it came in under)."""
+    if actual is None or actual == estimate:
+        return
+    rate_limiter.take(LLM_TOKEN_BUDGET, cost=actual - estimate, force=True)
+
+
+async def settle_llm_tokens_async(estimate: int, actual: Optional[int]) -> None:
+    if actual is None or actual == estimate:
+        return
+    await rate_limiter.take_async(LLM_TOKEN_BUDGET, cost=actual - estimate, force=True)
+
+
+def take_serpapi_call() -> bool:
+    return rate_limiter.take(SERPAPI_BUDGET).allowed
+
+
+async def take_serpapi_call_async() -> bool:
+    return (await rate_limiter.take_async(SERPAPI_BUDGET)).allowed
+
+
+def exhausted_budgets() -> List[str]:
+    """Upstream budgets that can't cover another call right now."""
+    exhausted = []
+    if rate_limiter.remaining(LLM_TOKEN_BUDGET) < LLM_COMPLETION_ESTIMATE:
+        exhausted.append(LLM_TOKEN_BUDGET.name)
+    if rate_limiter.remaining(SERPAPI_BUDGET) < 1:
+        exhausted.append(SERPAPI_BUDGET.name)
+    return exhausted
+
+
+async def exhausted_budgets_async() -> List[str]:
+    if rate_limiter._redis_enabled():
+        return await asyncio.to_thread(exhausted_budgets)
+    return exhausted_budgets()
@@ -0,0 +1,58 @@
+import os
+import time
+import logging
+import threading
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL")
+REDIS_RETRY_SECONDS = 30
+
+_client = None
+_failed_at = None
+_lock = threading.Lock()
+
+
+def get_redis():
+    """
+    Shared Redis client built from REDIS_URL on first use.
+    Returns None when REDIS_URL is unset or the server is unreachable, so callers
+    can fall back to in-process state.
+    """
+    global _client, _failed_at
+    if _client is not None or not REDIS_URL:
+        return _client
+    if _failed_at is not None and time.monotonic() - _failed_at < REDIS_RETRY_SECONDS:
+        return None
+    with _lock:
+        if _client is None:
+            try:
+                client = redis.Redis.from_url(REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+                client.ping()
+                _client = client
+            except Exception:
+                _failed_at = time.monotonic()
+                logger.warning("Redis unavailable at %s — using in-process state only", REDIS_URL)
+    return _client
+
+
+def redis_enabled() -> bool:
+    """
+    Whether Redis may be in use, answered without connecting: False when
+    REDIS_URL is unset or the last connect failed within REDIS_RETRY_SECONDS.
+    Async callers check this on the event loop and leave get_redis() (which
+    can block on a connect) to a worker thread.
+    """
+    if _client is not None:
+        return True
+    if not REDIS_URL:
+        return False
+    return _failed_at is None or time.monotonic() - _failed_at >= REDIS_RETRY_SECONDS
+
+
+def set_redis(client) -> None:
+    """Swap the shared client, e.g. for a local fake in tests."""
+    global _client
+    _client = client
@@ -0,0 +1,405 @@
+import math
+import time
+import heapq
+import random
+import asyncio
+import logging
+import threading
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import List, Optional
+
+from app.utils.metrics import UPSTREAM_ADMISSIONS, UPSTREAM_QUEUE_WAIT
+
+logger = logging.getLogger(__name__)
+
+# Upstream statuses worth retrying: rate limiting and transient server errors.
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit breaker is open."""
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 4.0) -> float:
+    """Exponential backoff with full jitter for retry number `attempt` (0-based)."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (delta-seconds or HTTP-date) into seconds."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+class CircuitBreaker:
+    """
+    Classic closed -> open -> half-open breaker.
+    After `failure_threshold` consecutive failures the circuit opens and calls
+    fail fast for `reset_timeout` seconds; then a single probe is let through and
+    its outcome decides whether to close again or re-open.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+                self._probing = False
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def cancel_probe(self) -> None:
+        """Give back a half-open probe that ended without an outcome (the call was never made)."""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._probing = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("circuit %s closed", self.name)
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning("circuit %s opened after %d failure(s)", self.name, self._failures)
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self._failures}
+
+
+# Priority of the work the current request does upstream, on the plan job scale
+# (0-9, higher first); set per plan by the planner and carried into agent
+# threads/tasks by context copying.
+PRIORITY_DEFAULT = 5
+request_priority: ContextVar[int] = ContextVar("request_priority", default=PRIORITY_DEFAULT)
+
+
+def set_request_priority(priority: Optional[int]) -> None:
+    request_priority.set(PRIORITY_DEFAULT if priority is None else int(priority))
+
+
+class ConcurrencyLimitError(Exception):
+    """Raised instead of calling an upstream when the call was shed by its concurrency limiter."""
+
+
+class Permit:
+    """
+    One admitted call. Released by leaving the `with` block; the call's latency
+    (time in the block unless `latency` is set, e.g. to time-to-first-byte) is
+    the limiter's sample. A call that raised, or is marked `dropped`, counts as
+    overload; one marked `skip` (cancelled, or failed for reasons unrelated to
+    load) gives no sample.
+    """
+
+    def __init__(self, limiter: "AdaptiveLimiter", started: float):
+        self.limiter = limiter
+        self.started = started
+        self.latency: Optional[float] = None
+        self.dropped = False
+        self.skip = False
+        self._released = False
+
+    def __enter__(self) -> "Permit":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.limiter.release(self, failed=exc_type is not None)
+        return False
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "state", "event", "loop", "future")
+
+    def __init__(self, priority: int, seq: int, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.priority = priority
+        self.seq = seq
+        self.state = "waiting"  # -> granted | shed | abandoned
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (-self.priority, self.seq) < (-other.priority, other.seq)
+
+    def wake(self) -> None:
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+# Fraction of its usual rate at which the long latency average follows samples
+# taken while the upstream looks overloaded.
+OVERLOAD_DAMPING = 0.1
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit for an upstream that adapts to its latency (gradient
+    algorithm after Netflix's concurrency-limits Gradient2). Every completed
+    call is a latency sample, folded into two exponential moving averages: a
+    short one (about `short_window` samples, the current latency) and a long
+    one (about `long_window` samples, the latency the upstream normally has),
+    plus the variance of samples around the long one (the first
+    2 * short_window samples only seed these). Per sample:
+      - the gradient is the expected latency over the short average, clamped
+        to [0.5, 1]; expected is `tolerance` times the long average, widened
+        by `deviations` standard deviations of the short average so that a
+        jittery but healthy upstream is not mistaken for a queueing one;
+      - the limit moves a `smoothing` fraction of the way to
+        limit * gradient + `queue_size`: it grows by up to queue_size while
+        latency is as expected and shrinks (down to about queue_size / (1 -
+        gradient)) while it isn't;
+      - it is left alone while less than half of it is in use;
+      - a failed call cuts it by `backoff`, at most once per long average so a
+        burst of failures counts once.
+    While the short average is above expected, the long one follows samples
+    at OVERLOAD_DAMPING of its rate, so queueing is slow to become the norm.
+    When the short average falls below half the long one (the upstream
+    recovered from a slow spell) the long average decays towards it quickly,
+    so the limit can grow back without waiting for the long average to forget.
+    A permanently slower upstream becomes the new normal after about
+    long_window samples.
+    Calls beyond the limit wait in a queue, highest priority first (FIFO within
+    a priority), for as long as their timeout allows. With `max_queue` waiting,
+    a newcomer displaces the lowest-priority waiter if it outranks it and is
+    refused otherwise; both get ConcurrencyLimitError. The clock is injectable
+    so the algorithm can be driven by a simulated upstream.
+    """
+
+    def __init__(self, name: str, initial_limit: int = 8, min_limit: int = 1, max_limit: int = 64,
+                 tolerance: float = 1.5, deviations: float = 2.0, queue_size: float = 4.0,
+                 smoothing: float = 0.2, short_window: int = 10, long_window: int = 600,
+                 backoff: float = 0.9, max_queue: int = 64, clock=time.monotonic):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.deviations = deviations
+        self.queue_size = queue_size
+        self.smoothing = smoothing
+        self.backoff = backoff
+        self.max_queue = max_queue
+        self.clock = clock
+        self._limit = float(max(min_limit, min(max_limit, initial_limit)))
+        self._short_alpha = 2.0 / (short_window + 1)
+        self._long_alpha = 2.0 / (long_window + 1)
+        self._short: Optional[float] = None
+        self._long: Optional[float] = None
+        self._variance = 0.0
+        self._samples = 0
+        self._warmup = 2 * short_window
+        self._last_decrease = float("-inf")
+        self._inflight = 0
+        self._waiters: List[_Waiter] = []
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def on_sample(self, latency: float, dropped: bool = False, inflight: Optional[int] = None) -> None:
+        """Feed one latency sample (the admission methods call this on release)."""
+        with self._lock:
+            self._sample(latency, dropped, self._inflight if inflight is None else inflight)
+            self._dispatch()
+
+    def _sample(self, latency: float, dropped: bool, inflight: int) -> None:
+        if dropped:
+            now = self.clock()
+            if self._long is None or now - self._last_decrease >= self._long:
+                self._limit = max(self.min_limit, self._limit * self.backoff)
+                self._last_decrease = now
+            return
+        self._samples += 1
+        if self._long is None:
+            self._short = self._long = latency
+            return
+        if self._samples <= self._warmup:
+            # plain mean and variance until there are enough samples to judge by
+            delta = latency - self._long
+            self._long += delta / self._samples
+            self._variance += (delta * (latency - self._long) - self._variance) / self._samples
+            self._short = self._long
+            return
+        self._short += self._short_alpha * (latency - self._short)
+        # the short average of a healthy upstream wanders by about this much
+        spread = math.sqrt(self._variance * self._short_alpha / (2 - self._short_alpha))
+        expected = self.tolerance * self._long + self.deviations * spread
+        alpha = self._long_alpha if self._short <= expected else self._long_alpha * OVERLOAD_DAMPING
+        delta = latency - self._long
+        self._long += alpha * delta
+        self._variance = (1 - alpha) * (self._variance + alpha * delta * delta)
+        if self._long > 2 * self._short:
+            self._long *= 0.95
+        if inflight * 2 < self._limit:
+            return
+        gradient = max(0.5, min(1.0, expected / self._short)) if self._short > 0 else 1.0
+        target = self._limit * gradient + self.queue_size
+        limit = (1 - self.smoothing) * self._limit + self.smoothing * target
+        self._limit = max(self.min_limit, min(self.max_limit, limit))
+
+    def _dispatch(self) -> None:
+        while self._waiters and self._inflight < self.limit:
+            waiter = heapq.heappop(self._waiters)
+            waiter.state = "granted"
+            self._inflight += 1
+            waiter.wake()
+
+    def _admit_or_enqueue(self, priority: Optional[int], loop=None):
+        priority = request_priority.get() if priority is None else priority
+        if not self._waiters and self._inflight < self.limit:
+            self._inflight += 1
+            return None
+        if len(self._waiters) >= self.max_queue:
+            lowest = max(self._waiters)
+            if lowest.priority >= priority:
+                raise ConcurrencyLimitError(f"{self.name}: {len(self._waiters)} calls already queued")
+            self._waiters.remove(lowest)
+            heapq.heapify(self._waiters)
+            lowest.state = "shed"
+            lowest.wake()
+        self._seq += 1
+        waiter = _Waiter(priority, self._seq, loop)
+        heapq.heappush(self._waiters, waiter)
+        return waiter
+
+    def _settle(self, waiter: _Waiter) -> None:
+        """After waking or giving up: raise unless the waiter was granted a slot."""
+        if waiter.state == "granted":
+            return
+        if waiter.state == "waiting":
+            waiter.state = "abandoned"
+            self._waiters.remove(waiter)
+            heapq.heapify(self._waiters)
+            UPSTREAM_ADMISSIONS.inc(upstream=self.name, outcome="timeout")
+            raise ConcurrencyLimitError(f"{self.name}: timed out waiting for a slot")
+        UPSTREAM_ADMISSIONS.inc(upstream=self.name, outcome="shed")
+        raise ConcurrencyLimitError(f"{self.name}: shed for higher-priority calls")
+
+    def _enqueue(self, priority: Optional[int], loop=None) -> Optional[_Waiter]:
+        with self._lock:
+            try:
+                waiter = self._admit_or_enqueue(priority, loop)
+            except ConcurrencyLimitError:
+                UPSTREAM_ADMISSIONS.inc(upstream=self.name, outcome="shed")
+                raise
+        if waiter is None:
+            UPSTREAM_ADMISSIONS.inc(upstream=self.name, outcome="admitted")
+        return waiter
+
+    def _admitted(self, waited_since: float) -> Permit:
+        now = self.clock()
+        UPSTREAM_ADMISSIONS.inc(upstream=self.name, outcome="queued")
+        UPSTREAM_QUEUE_WAIT.observe(now - waited_since, upstream=self.name)
+        return Permit(self, now)
+
+    def acquire(self, priority: Optional[int] = None, timeout: Optional[float] = None) -> Permit:
+        """A slot for one call, waiting up to `timeout` seconds; raises ConcurrencyLimitError if shed."""
+        waiter = self._enqueue(priority)
+        if waiter is None:
+            return Permit(self, self.clock())
+        waited_since = self.clock()
+        waiter.event.wait(timeout)
+        with self._lock:
+            self._settle(waiter)
+        return self._admitted(waited_since)
+
+    async def acquire_async(self, priority: Optional[int] = None, timeout: Optional[float] = None) -> Permit:
+        waiter = self._enqueue(priority, asyncio.get_running_loop())
+        if waiter is None:
+            return Permit(self, self.clock())
+        waited_since = self.clock()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.state == "granted":
+                    self._inflight -= 1
+                    self._dispatch()
+                elif waiter.state == "waiting":
+                    waiter.state = "abandoned"
+                    self._waiters.remove(waiter)
+                    heapq.heapify(self._waiters)
+            raise
+        with self._lock:
+            self._settle(waiter)
+        return self._admitted(waited_since)
+
+    def release(self, permit: Permit, failed: bool = False) -> None:
+        with self._lock:
+            if permit._released:
+                return
+            permit._released = True
+            inflight = self._inflight
+            self._inflight -= 1
+            if not permit.skip:
+                latency = permit.latency if permit.latency is not None else self.clock() - permit.started
+                self._sample(latency, failed or permit.dropped, inflight)
+            self._dispatch()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "inflight": self._inflight,
+                "queued": len(self._waiters),
+                "short_ms": round(self._short * 1000, 1) if self._short is not None else None,
+                "long_ms": round(self._long * 1000, 1) if self._long is not None else None,
+            }
@@ -0,0 +1,210 @@
+import os
+import re
+import copy
+import math
+import time
+import zlib
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+from contextvars import ContextVar
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Type
+
+from pydantic import BaseModel
+
+from app.utils.airports import airport_index, normalize
+from app.utils.metrics import SEMANTIC_CACHE_HIT_AGE, SEMANTIC_CACHE_LOOKUPS
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE", "1") != "0"
+# Minimum cosine similarity between the differing words of two prompts for a near match.
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.5"))
+# Prompts that differ in more words than this (on either side) are never near matches.
+SEMANTIC_CACHE_MAX_DIFF = int(os.getenv("SEMANTIC_CACHE_MAX_DIFF", "2"))
+SEMANTIC_CACHE_TTL = int(os.getenv("SEMANTIC_CACHE_TTL", str(6 * 3600)))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "4096"))
+EMBEDDING_DIM = 1024
+
+# Words that ask for the same answer, mapped to one spelling.
+SYNONYMS = {
+    "luxurious": "luxury", "premium": "luxury", "upscale": "luxury", "lavish": "luxury",
+    "adventurous": "adventure", "thrill": "adventure", "outdoor": "adventure", "outdoors": "adventure",
+    "romance": "romantic", "honeymoon": "romantic", "couple": "romantic", "couples": "romantic",
+    "families": "family", "kids": "family", "children": "family",
+    "cheap": "budget", "affordable": "budget", "backpacking": "budget", "backpacker": "budget",
+    "culture": "cultural", "heritage": "cultural", "historic": "cultural", "historical": "cultural",
+    "spiritual": "pilgrimage", "religious": "pilgrimage",
+}
+
+_WORD_RE = re.compile(r"[A-Za-z0-9]+")
+
+# Carried into agent threads/tasks like the usage totals; set per plan by the planner.
+_bypass: ContextVar[bool] = ContextVar("semantic_cache_bypass", default=False)
+
+
+def bypass_semantic_cache(flag: bool) -> None:
+    """Skip semantic cache lookups (not stores) for the rest of the current request."""
+    _bypass.set(flag)
+
+
+def feature_tokens(prompt: str) -> Tuple[List[str], List[str]]:
+    """
+    Normalized words of a prompt, plus the "hard" ones that must match exactly:
+    places (IATA codes and alternative names become the city name) and numbers.
+    """
+    index = airport_index()
+    words, hard = [], []
+    for raw in _WORD_RE.findall(prompt or ""):
+        word = normalize(raw)
+        # codes only when written as codes ("GOI", not "del" in a sentence); names in any case
+        if raw.isupper() and raw in index.airports:
+            code = raw
+        else:
+            code = index.exact.get(word)
+            code = code if code is not None and code.lower() != word else None
+        if code is not None:
+            word = normalize(index.airports[code].city)
+            hard.append(word)
+        elif word.isdigit():
+            hard.append(word)
+        else:
+            word = SYNONYMS.get(word, word)
+        words.append(word)
+    return words, sorted(set(hard))
+
+
+def embed(words) -> Dict[int, float]:
+    """Hashed character-trigram embedding (sparse, L2-normalized)."""
+    counts: Dict[int, float] = {}
+    for word in words:
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            slot = zlib.crc32(padded[i:i + 3].encode()) % EMBEDDING_DIM
+            counts[slot] = counts.get(slot, 0.0) + 1.0
+    norm = math.sqrt(sum(v * v for v in counts.values()))
+    return {k: v / norm for k, v in counts.items()} if norm else {}
+
+
+def cosine(a: Dict[int, float], b: Dict[int, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+class _Entry(NamedTuple):
+    words: Counter
+    size: int
+    value: Any
+    created: float
+
+
+class SemanticCache:
+    """
+    Answer cache for ask_llm that also serves near-duplicate prompts.
+
+    Prompts are reduced to a feature key: lower-cased words, synonyms folded
+    ("luxurious" -> "luxury"), IATA codes and alternative names replaced by the
+    city name ("GOI" -> "goa"). Entries are grouped by system prompt, schema
+    and the hard features (places, numbers), which must match exactly. Within
+    a group, the same feature key is an exact hit; otherwise the prompt is
+    compared with each entry on the words where they differ: if at most
+    SEMANTIC_CACHE_MAX_DIFF words differ on each side and the hashed-trigram
+    embeddings of those words are at least SEMANTIC_CACHE_THRESHOLD cosine
+    similar (a typo, a plural), the entry is served. Shared template words
+    therefore never make two different requests look alike.
+    In-process, LRU-bounded, entries expire after SEMANTIC_CACHE_TTL.
+    """
+
+    def __init__(self, maxsize: int = SEMANTIC_CACHE_SIZE, ttl: float = SEMANTIC_CACHE_TTL,
+                 threshold: float = SEMANTIC_CACHE_THRESHOLD, max_diff: int = SEMANTIC_CACHE_MAX_DIFF):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self.max_diff = max_diff
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self._groups: Dict[str, Dict[str, None]] = {}
+        self._lock = threading.Lock()
+        self._stats = {"exact": 0, "near": 0, "miss": 0, "stale": 0, "stores": 0}
+
+    @staticmethod
+    def _keys(prompt: str, system: str, schema: Optional[Type[BaseModel]]) -> Tuple[str, List[str]]:
+        words, hard = feature_tokens(prompt)
+        group = "|".join([schema.__name__ if schema is not None else "", " ".join(normalize(system).split()), *hard])
+        return hashlib.sha1(group.encode()).hexdigest(), words
+
+    def _drop(self, key: Tuple[str, str]) -> None:
+        self._entries.pop(key, None)
+        group = self._groups.get(key[0])
+        if group is not None:
+            group.pop(key[1], None)
+            if not group:
+                self._groups.pop(key[0], None)
+
+    def _count(self, outcome: str) -> None:
+        self._stats[outcome] += 1
+        if outcome != "stores":
+            SEMANTIC_CACHE_LOOKUPS.inc(outcome=outcome)
+
+    def _nearest(self, group: str, words: List[str]) -> Tuple[Optional[Tuple[str, str]], float]:
+        best, best_score = None, 0.0
+        counts = Counter(words)
+        for text in self._groups.get(group, ()):
+            entry = self._entries[(group, text)]
+            if abs(entry.size - len(words)) > self.max_diff:
+                continue
+            ours, theirs = counts - entry.words, entry.words - counts
+            if not ours or not theirs or sum(ours.values()) > self.max_diff or sum(theirs.values()) > self.max_diff:
+                continue
+            score = cosine(embed(ours.elements()), embed(theirs.elements()))
+            if score > best_score:
+                best, best_score = (group, text), score
+        return best, best_score
+
+    def get(self, prompt: str, system: str, schema: Optional[Type[BaseModel]] = None) -> Optional[Any]:
+        if _bypass.get():
+            return None
+        group, words = self._keys(prompt, system, schema)
+        key = (group, " ".join(words))
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            outcome = "exact"
+            if entry is None:
+                near, score = self._nearest(group, words)
+                if near is None or score < self.threshold:
+                    self._count("miss")
+                    return None
+                key, entry, outcome = near, self._entries[near], "near"
+            age = now - entry.created
+            if age > self.ttl:
+                self._drop(key)
+                self._count("stale")
+                return None
+            self._entries.move_to_end(key)
+            self._count(outcome)
+        SEMANTIC_CACHE_HIT_AGE.observe(age)
+        return copy.deepcopy(entry.value)
+
+    def set(self, prompt: str, system: str, schema: Optional[Type[BaseModel]], value: Any) -> None:
+        if not value:
+            return
+        group, words = self._keys(prompt, system, schema)
+        key = (group, " ".join(words))
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = _Entry(Counter(words), len(words), copy.deepcopy(value), time.time())
+            self._groups.setdefault(group, {})[key[1]] = None
+            self._count("stores")
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._groups.clear()
+
+
+semantic_cache = SemanticCache()
@@ -1,10 +1,97 @@
 # serpapi_helper.py
 import os
+import time
+import asyncio
+import weakref
+import httpx
 import requests
 import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+from requests.adapters import HTTPAdapter
+
+from app.utils.cache import LRUCache, SingleFlight
+from app.utils.deadline import deadline_scope, remaining, timeout_for
+from app.utils.metrics import FLIGHT_LOOKUPS, SERPAPI_DURATION, SERPAPI_REQUESTS
+from app.utils.rate_limit import BudgetExhaustedError, take_serpapi_call, take_serpapi_call_async
+from app.utils.resilience import (
+    RETRYABLE_STATUSES, AdaptiveLimiter, CircuitBreaker, CircuitOpenError, ConcurrencyLimitError, backoff_delay,
+    retry_after_seconds
+)
 
 logger = logging.getLogger(__name__)
 SERPAPI_KEY = os.getenv("SERPAPI_KEY")
+SERPAPI_URL = os.getenv("SERPAPI_URL", "https://serpapi.com/search.json")
+SERPAPI_TIMEOUT = 20
+SERPAPI_CONNECT_TIMEOUT = float(os.getenv("SERPAPI_CONNECT_TIMEOUT", "3"))
+SERPAPI_POOL_SIZE = int(os.getenv("SERPAPI_POOL_SIZE", "20"))
+SERPAPI_KEEPALIVE_EXPIRY = float(os.getenv("SERPAPI_KEEPALIVE_EXPIRY", "60"))
+SERPAPI_MAX_RETRIES = int(os.getenv("SERPAPI_MAX_RETRIES", "2"))
+SERPAPI_BACKOFF_BASE = float(os.getenv("SERPAPI_BACKOFF_BASE", "0.5"))
+SERPAPI_BACKOFF_CAP = float(os.getenv("SERPAPI_BACKOFF_CAP", "4"))
+FLIGHT_CACHE_TTL = int(os.getenv("FLIGHT_CACHE_TTL", "900"))
+# Flexible dates: widest +/- window a plan may ask for, searches in flight per plan,
+# most alternative date pairs searched per plan, and seconds the calendar may take.
+FLEX_MAX_DAYS = int(os.getenv("FLEX_MAX_DAYS", "3"))
+FLEX_CONCURRENCY = int(os.getenv("FLEX_CONCURRENCY", "4"))
+FLEX_MAX_SEARCHES = int(os.getenv("FLEX_MAX_SEARCHES", "8"))
+FLEX_BUDGET_SECONDS = float(os.getenv("FLEX_BUDGET_SECONDS", "6"))
+
+_flight_cache = LRUCache(maxsize=int(os.getenv("FLIGHT_CACHE_SIZE", "1024")))
+_inflight = SingleFlight()
+_stats_lock = threading.Lock()
+
+# hits: served from cache; misses: went upstream; coalesced: waited on another caller's upstream call
+FLIGHT_CACHE_STATS = {"hits": 0, "misses": 0, "coalesced": 0}
+
+serpapi_breaker = CircuitBreaker(
+    "serpapi",
+    failure_threshold=int(os.getenv("SERPAPI_BREAKER_THRESHOLD", "5")),
+    reset_timeout=float(os.getenv("SERPAPI_BREAKER_RESET", "30")),
+)
+
+# Adaptive limit on concurrent SerpAPI requests per process; 429/5xx count as overload.
+serpapi_limiter = AdaptiveLimiter(
+    "serpapi",
+    initial_limit=int(os.getenv("SERPAPI_CONCURRENCY", "8")),
+    max_limit=int(os.getenv("SERPAPI_MAX_CONCURRENCY", str(SERPAPI_POOL_SIZE))),
+    max_queue=int(os.getenv("SERPAPI_MAX_QUEUED", "64")),
+)
+
+# One keep-alive pool per process for the sync path...
+_session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=1, pool_maxsize=SERPAPI_POOL_SIZE, max_retries=0)
+_session.mount("https://", _adapter)
+_session.mount("http://", _adapter)
+
+# ...and one per event loop for the async path (an AsyncClient is bound to its loop).
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def _get_async_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(SERPAPI_TIMEOUT, connect=SERPAPI_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=SERPAPI_POOL_SIZE,
+                max_keepalive_connections=SERPAPI_POOL_SIZE,
+                keepalive_expiry=SERPAPI_KEEPALIVE_EXPIRY,
+            ),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+async def close_async_client() -> None:
+    """Close this loop's pooled AsyncClient (called on app shutdown)."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
 
 def _as_rupee_string(value):
     try:
@@ -54,12 +141,7 @@ def _extract_duration(flight_info):
     # If still nothing:
     return ""
 
-def fetch_flights(source: str, dest: str, depart: str = None, ret: str = None):
-    if not SERPAPI_KEY:
-        logger.error("SERPAPI_KEY missing — cannot fetch flights")
-        return []
-
-    url = "https://serpapi.com/search.json"
+def _build_params(source: str, dest: str, depart: str = None, ret: str = None) -> dict:
     params = {
         "engine": "google_flights",
         "departure_id": source,
@@ -73,45 +155,359 @@ def fetch_flights(source: str, dest: str, depart: str = None, ret: str = None):
         params["outbound_date"] = depart
     if ret:
         params["return_date"] = ret
+    return params
+
+def _normalize_flights(data: dict) -> list:
+    results = data.get("best_flights") or data.get("other_flights") or []
+    flights = []
+
+    for f in results[:6]:
+        # Extract base structure
+        first_leg = (f.get("flights") or [{}])[0]
+
+        price = f.get("price")
+        if isinstance(price, dict):
+            price = price.get("price_display") or price.get("amount")
+
+        price = _as_rupee_string(price)
+        duration = _extract_duration(f)
+        airline = first_leg.get("airline_name") or first_leg.get("airline", "Unknown")
+
+        stops = "Non-stop" if f.get("total_layovers", 0) == 0 else f"{f.get('total_layovers')} stop(s)"
+
+        logo = (
+            first_leg.get("airline_logo")
+            or f.get("airline_logo")
+            or None
+        )
+        
+        flights.append({
+            "airline": airline,
+            "price": price,
+            "duration": duration,
+            "stops": stops,
+            "airline_logo": logo
+        })
+
+    return flights
 
+def _flight_key(source: str, dest: str, depart: str = None, ret: str = None) -> str:
+    return "|".join([
+        (source or "").strip().upper(),
+        (dest or "").strip().upper(),
+        (depart or "").strip(),
+        (ret or "").strip(),
+    ])
+
+def _count(outcome: str) -> None:
+    FLIGHT_LOOKUPS.inc(outcome=outcome)
+    with _stats_lock:
+        FLIGHT_CACHE_STATS[outcome] += 1
+
+def flight_cache_stats() -> dict:
+    with _stats_lock:
+        return dict(FLIGHT_CACHE_STATS, entries=len(_flight_cache), circuit=serpapi_breaker.snapshot(),
+                    concurrency=serpapi_limiter.snapshot())
+
+def _observe(started: float, outcome: str) -> None:
+    SERPAPI_DURATION.observe(time.perf_counter() - started)
+    SERPAPI_REQUESTS.inc(outcome=outcome)
+
+def _retry_delay(attempt: int, status: int = None, headers=None):
+    """
+    Seconds to wait before retry `attempt`, or None if we should give up.
+    A Retry-After longer than the backoff cap means the upstream wants us gone
+    for a while, so we stop rather than pin the request.
+    """
+    if attempt >= SERPAPI_MAX_RETRIES:
+        return None
+    if status is not None and status not in RETRYABLE_STATUSES:
+        return None
+    retry_after = retry_after_seconds((headers or {}).get("Retry-After"))
+    if retry_after is not None:
+        delay = retry_after if retry_after <= SERPAPI_BACKOFF_CAP else None
+    else:
+        delay = backoff_delay(attempt, SERPAPI_BACKOFF_BASE, SERPAPI_BACKOFF_CAP)
+    # no point sleeping past the request deadline
+    if delay is not None and delay >= remaining(float("inf")):
+        return None
+    return delay
+
+def _get_json(params: dict) -> dict:
+    """GET SerpAPI over the pooled session with jittered retries behind the circuit breaker."""
+    if not serpapi_breaker.allow():
+        raise CircuitOpenError("SerpAPI circuit open")
+    # a half-open breaker admits one probe; hand it back if no outcome is recorded
+    try:
+        if not take_serpapi_call():
+            SERPAPI_REQUESTS.inc(outcome="budget")
+            raise BudgetExhaustedError("SerpAPI calls/hour budget exhausted")
+
+        attempt = 0
+        while True:
+            try:
+                with serpapi_limiter.acquire(timeout=timeout_for(SERPAPI_TIMEOUT)) as permit:
+                    started = time.perf_counter()
+                    read_timeout = timeout_for(SERPAPI_TIMEOUT)
+                    resp = _session.get(SERPAPI_URL, params=params, timeout=(min(SERPAPI_CONNECT_TIMEOUT, read_timeout), read_timeout))
+                    permit.dropped = resp.status_code in RETRYABLE_STATUSES
+            except (requests.ConnectionError, requests.Timeout):
+                _observe(started, "error")
+                delay = _retry_delay(attempt)
+                if delay is None:
+                    serpapi_breaker.record_failure()
+                    raise
+            else:
+                _observe(started, str(resp.status_code))
+                if resp.status_code < 400:
+                    serpapi_breaker.record_success()
+                    return resp.json()
+                delay = _retry_delay(attempt, resp.status_code, resp.headers)
+                if delay is None:
+                    if resp.status_code in RETRYABLE_STATUSES:
+                        serpapi_breaker.record_failure()
+                    else:
+                        # a plain 4xx means SerpAPI is up and answering
+                        serpapi_breaker.record_success()
+                    resp.raise_for_status()
+            logger.warning("SerpAPI retry %d in %.2fs", attempt + 1, delay)
+            time.sleep(delay)
+            attempt += 1
+    except BaseException:
+        serpapi_breaker.cancel_probe()
+        raise
+
+async def _get_json_async(params: dict) -> dict:
+    if not serpapi_breaker.allow():
+        raise CircuitOpenError("SerpAPI circuit open")
+    # a half-open breaker admits one probe; hand it back if no outcome is recorded
     try:
-        resp = requests.get(url, params=params, timeout=20)
-        resp.raise_for_status()
-        data = resp.json()
-
-        results = data.get("best_flights") or data.get("other_flights") or []
-        flights = []
-
-        for f in results[:6]:
-            # Extract base structure
-            first_leg = (f.get("flights") or [{}])[0]
-
-            price = f.get("price")
-            if isinstance(price, dict):
-                price = price.get("price_display") or price.get("amount")
-
-            price = _as_rupee_string(price)
-            duration = _extract_duration(f)
-            airline = first_leg.get("airline_name") or first_leg.get("airline", "Unknown")
-
-            stops = "Non-stop" if f.get("total_layovers", 0) == 0 else f"{f.get('total_layovers')} stop(s)"
-
-            logo = (
-                first_leg.get("airline_logo")
-                or f.get("airline_logo")
-                or None
-            )
-            
-            flights.append({
-                "airline": airline,
-                "price": price,
-                "duration": duration,
-                "stops": stops,
-                "airline_logo": logo
-            })
-
-        return flights
+        if not await take_serpapi_call_async():
+            SERPAPI_REQUESTS.inc(outcome="budget")
+            raise BudgetExhaustedError("SerpAPI calls/hour budget exhausted")
+
+        client = _get_async_client()
+        attempt = 0
+        while True:
+            try:
+                with await serpapi_limiter.acquire_async(timeout=timeout_for(SERPAPI_TIMEOUT)) as permit:
+                    started = time.perf_counter()
+                    read_timeout = timeout_for(SERPAPI_TIMEOUT)
+                    resp = await client.get(
+                        SERPAPI_URL, params=params,
+                        timeout=httpx.Timeout(read_timeout, connect=min(SERPAPI_CONNECT_TIMEOUT, read_timeout)),
+                    )
+                    permit.dropped = resp.status_code in RETRYABLE_STATUSES
+            except httpx.TransportError:
+                _observe(started, "error")
+                delay = _retry_delay(attempt)
+                if delay is None:
+                    serpapi_breaker.record_failure()
+                    raise
+            else:
+                _observe(started, str(resp.status_code))
+                if resp.status_code < 400:
+                    serpapi_breaker.record_success()
+                    return resp.json()
+                delay = _retry_delay(attempt, resp.status_code, resp.headers)
+                if delay is None:
+                    if resp.status_code in RETRYABLE_STATUSES:
+                        serpapi_breaker.record_failure()
+                    else:
+                        serpapi_breaker.record_success()
+                    resp.raise_for_status()
+            logger.warning("SerpAPI retry %d in %.2fs", attempt + 1, delay)
+            await asyncio.sleep(delay)
+            attempt += 1
+    except BaseException:
+        serpapi_breaker.cancel_probe()
+        raise
 
+def _search_flights(key: str, params: dict) -> list:
+    try:
+        flights = _normalize_flights(_get_json(params))
+
+    except CircuitOpenError:
+        logger.warning("SerpAPI circuit open — skipping flight search")
+        return []
+    except BudgetExhaustedError:
+        logger.warning("SerpAPI budget exhausted — skipping flight search")
+        return []
+    except ConcurrencyLimitError as e:
+        logger.warning("SerpAPI call shed (%s) — skipping flight search", e)
+        return []
     except Exception as e:
         logger.exception("SerpAPI error")
         return []
+
+    # Empty results are usually an upstream hiccup; let the next caller retry.
+    if flights:
+        _flight_cache.set(key, flights, FLIGHT_CACHE_TTL)
+    return flights
+
+async def _search_flights_async(key: str, params: dict) -> list:
+    try:
+        flights = _normalize_flights(await _get_json_async(params))
+
+    except CircuitOpenError:
+        logger.warning("SerpAPI circuit open — skipping flight search")
+        return []
+    except BudgetExhaustedError:
+        logger.warning("SerpAPI budget exhausted — skipping flight search")
+        return []
+    except ConcurrencyLimitError as e:
+        logger.warning("SerpAPI call shed (%s) — skipping flight search", e)
+        return []
+    except Exception as e:
+        logger.exception("SerpAPI error")
+        return []
+
+    if flights:
+        _flight_cache.set(key, flights, FLIGHT_CACHE_TTL)
+    return flights
+
+def fetch_flights(source: str, dest: str, depart: str = None, ret: str = None):
+    """
+    Normalized flight list for a route/date pair.
+    Results are cached for FLIGHT_CACHE_TTL seconds, and concurrent identical
+    searches share a single upstream SerpAPI call.
+    """
+    if not SERPAPI_KEY:
+        logger.error("SERPAPI_KEY missing — cannot fetch flights")
+        return []
+
+    key = _flight_key(source, dest, depart, ret)
+    cached = _flight_cache.get(key)
+    if cached is not None:
+        _count("hits")
+        return list(cached)
+
+    params = _build_params(source, dest, depart, ret)
+    flights, shared = _inflight.do(key, lambda: _search_flights(key, params))
+    _count("coalesced" if shared else "misses")
+    return list(flights)
+
+async def fetch_flights_async(source: str, dest: str, depart: str = None, ret: str = None):
+    """Non-blocking variant of fetch_flights for the async planner."""
+    if not SERPAPI_KEY:
+        logger.error("SERPAPI_KEY missing — cannot fetch flights")
+        return []
+
+    key = _flight_key(source, dest, depart, ret)
+    cached = _flight_cache.get(key)
+    if cached is not None:
+        _count("hits")
+        return list(cached)
+
+    params = _build_params(source, dest, depart, ret)
+    flights, shared = await _inflight.do_async(key, lambda: _search_flights_async(key, params))
+    _count("coalesced" if shared else "misses")
+    return list(flights)
+
+
+def _shift(day: Optional[str], offset: int) -> Optional[str]:
+    return (date.fromisoformat(day) + timedelta(days=offset)).isoformat() if day else None
+
+
+def _flex_dates(depart: str, ret: Optional[str], days: int) -> Tuple[List[str], List[Optional[str]], List[Tuple[str, Optional[str]]]]:
+    """
+    Depart and return dates within +/- `days` of the requested ones (nothing in
+    the past), and the alternative pairs worth searching (the return can't be
+    before departure), nearest first: the same trip length shifted, then one
+    end moved. At most FLEX_MAX_SEARCHES pairs; the requested one isn't included.
+    """
+    days = max(0, min(days, FLEX_MAX_DAYS))
+    today = date.today().isoformat()
+    departs = [d for d in (_shift(depart, o) for o in range(-days, days + 1)) if d >= today] or [depart]
+    returns = [_shift(ret, o) for o in range(-days, days + 1)] if ret else [None]
+    requested = date.fromisoformat(depart), date.fromisoformat(ret) if ret else None
+
+    def distance(pair: Tuple[str, Optional[str]]) -> Tuple[int, int, int]:
+        moved = (date.fromisoformat(pair[0]) - requested[0]).days
+        ret_moved = (date.fromisoformat(pair[1]) - requested[1]).days if ret else moved
+        return max(abs(moved), abs(ret_moved)), abs(moved - ret_moved), abs(moved)
+
+    pairs = [(d, r) for d in departs for r in returns if (r is None or r >= d) and (d, r) != (depart, ret)]
+    pairs.sort(key=distance)
+    return departs, returns, pairs[:max(0, FLEX_MAX_SEARCHES)]
+
+
+def _price_value(flight: dict) -> Optional[int]:
+    digits = "".join(ch for ch in str(flight.get("price") or "") if ch.isdigit())
+    return int(digits) if digits else None
+
+
+def _fare_calendar(departs: list, returns: list, results: Dict[tuple, list], partial: bool = False) -> dict:
+    """Cheapest fare per (depart, return) pair as a depart x return matrix, plus the overall cheapest."""
+    fares = []
+    cheapest = None
+    for d in departs:
+        row = []
+        for r in returns:
+            prices = [p for p in map(_price_value, results.get((d, r)) or []) if p is not None]
+            fare = min(prices) if prices else None
+            row.append(fare)
+            if fare is not None and (cheapest is None or fare < cheapest["price"]):
+                cheapest = {"depart_date": d, "return_date": r, "price": fare}
+        fares.append(row)
+    return {"currency": "INR", "depart_dates": departs, "return_dates": returns, "fares": fares, "cheapest": cheapest,
+            "partial": partial}
+
+
+def fetch_fare_calendar(source: str, dest: str, depart: str, ret: str = None, days: int = 1) -> Tuple[list, Optional[dict]]:
+    """
+    Flexible-dates search. The requested dates are searched on their own, as
+    usual; alongside, up to FLEX_MAX_SEARCHES nearby depart/return pairs within
+    +/- `days` (capped at FLEX_MAX_DAYS), FLEX_CONCURRENCY at a time over the
+    pooled session, for at most FLEX_BUDGET_SECONDS. Each pair goes through
+    fetch_flights, so it is cached and coalesced like any other search.
+    Returns (flights for the requested dates, fare calendar); pairs not
+    searched or not back in time are empty in the calendar, which is then
+    marked partial. The calendar is None if the dates can't be parsed.
+    """
+    try:
+        departs, returns, pairs = _flex_dates(depart, ret, days)
+    except (TypeError, ValueError):
+        return fetch_flights(source, dest, depart, ret), None
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(FLEX_CONCURRENCY, len(pairs))), thread_name_prefix="flex")
+    with deadline_scope(FLEX_BUDGET_SECONDS) as calendar_deadline:
+        # each search keeps the caller's context (usage tracking, the calendar's deadline)
+        futures = {pool.submit(contextvars.copy_context().run, fetch_flights, source, dest, *pair): pair for pair in pairs}
+    try:
+        flights = fetch_flights(source, dest, depart, ret)
+        done, pending = wait(futures, timeout=max(0.0, calendar_deadline - time.monotonic()))
+    finally:
+        # searches still running are abandoned; they stop at the calendar's deadline
+        pool.shutdown(wait=False, cancel_futures=True)
+    results = {futures[fut]: fut.result() for fut in done}
+    results[(depart, ret)] = flights
+    return flights, _fare_calendar(departs, returns, results, partial=bool(pending))
+
+
+async def fetch_fare_calendar_async(source: str, dest: str, depart: str, ret: str = None, days: int = 1) -> Tuple[list, Optional[dict]]:
+    """Non-blocking variant of fetch_fare_calendar for the async planner."""
+    try:
+        departs, returns, pairs = _flex_dates(depart, ret, days)
+    except (TypeError, ValueError):
+        return await fetch_flights_async(source, dest, depart, ret), None
+
+    semaphore = asyncio.Semaphore(max(1, FLEX_CONCURRENCY))
+
+    async def search(pair: tuple) -> list:
+        async with semaphore:
+            return await fetch_flights_async(source, dest, *pair)
+
+    requested = asyncio.ensure_future(fetch_flights_async(source, dest, depart, ret))
+    with deadline_scope(FLEX_BUDGET_SECONDS) as calendar_deadline:
+        # tasks copy the context, so each search runs under the calendar's deadline
+        tasks = {asyncio.ensure_future(search(pair)): pair for pair in pairs}
+    try:
+        flights = await requested
+        done, pending = (await asyncio.wait(tasks, timeout=max(0.0, calendar_deadline - time.monotonic()))) if tasks else (set(), set())
+    finally:
+        for task in tasks:
+            task.cancel()
+    results = {tasks[task]: task.result() for task in done}
+    results[(depart, ret)] = flights
+    return flights, _fare_calendar(departs, returns, results, partial=bool(pending))
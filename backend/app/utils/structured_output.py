@@ -0,0 +1,197 @@
+import os
+import json
+import copy
+import functools
+from typing import Any, Dict, List, Optional, Type
+
+from pydantic import BaseModel
+
+# A runaway answer is cut off here instead of being streamed to the end.
+LLM_MAX_RESPONSE_CHARS = int(os.getenv("LLM_MAX_RESPONSE_CHARS", "20000"))
+
+_WHITESPACE = " \t\r\n"
+_LITERAL_CHARS = set("0123456789+-.eEtrufalsn")
+
+
+class StreamValidationError(ValueError):
+    """A streamed answer went wrong before it finished (bad JSON, unknown key, too long)."""
+
+
+def _strict(node: Any) -> Any:
+    """
+    OpenAI strict mode wants every object closed (additionalProperties: false)
+    with all of its properties required, and no defaults.
+    """
+    if isinstance(node, dict):
+        node = {k: _strict(v) for k, v in node.items() if k != "default"}
+        if node.get("type") == "object" and "properties" in node:
+            node["additionalProperties"] = False
+            node["required"] = list(node["properties"])
+        return node
+    if isinstance(node, list):
+        return [_strict(v) for v in node]
+    return node
+
+
+@functools.lru_cache(maxsize=None)
+def _schema(model: Type[BaseModel]) -> Dict[str, Any]:
+    return _strict(model.model_json_schema())
+
+
+def strict_json_schema(model: Type[BaseModel]) -> Dict[str, Any]:
+    """JSON schema for `model` in the form structured outputs accept."""
+    return copy.deepcopy(_schema(model))
+
+
+def response_format(model: Type[BaseModel]) -> Dict[str, Any]:
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": model.__name__, "strict": True, "schema": strict_json_schema(model)},
+    }
+
+
+def schema_instructions(model: Type[BaseModel]) -> str:
+    """The same schema as prompt text, for endpoints that only support json_object."""
+    return "Respond with a JSON object matching this JSON schema:\n" + json.dumps(_schema(model), separators=(",", ":"))
+
+
+class IncrementalJSONValidator:
+    """
+    Checks a JSON answer as it streams in, one chunk at a time, so a bad answer
+    can be abandoned at the first wrong character rather than after the whole
+    generation: prose instead of JSON, a syntax error, a top-level key the model
+    doesn't have, or more than max_chars of output. finish() parses the full text
+    and validates it against the model.
+    """
+
+    def __init__(self, model: Optional[Type[BaseModel]] = None, max_chars: int = LLM_MAX_RESPONSE_CHARS):
+        self.model = model
+        self.max_chars = max_chars
+        self._keys = set(model.model_fields) if model is not None else None
+        self._chunks: List[str] = []
+        self._size = 0
+        self._stack: List[str] = []
+        self._expect = "value"
+        self._in_string = False
+        self._escape = False
+        self._is_key = False
+        self._key: List[str] = []
+        self._literal: List[str] = []
+
+    def _fail(self, reason: str) -> None:
+        raise StreamValidationError(f"{reason} at char {self._size}")
+
+    def _after_value(self) -> None:
+        self._expect = "comma_or_close" if self._stack else "done"
+
+    def _end_literal(self) -> None:
+        token = "".join(self._literal)
+        self._literal = []
+        try:
+            json.loads(token)
+        except ValueError:
+            self._fail(f"invalid literal {token[:20]!r}")
+        self._after_value()
+
+    def _end_string(self) -> None:
+        self._in_string = False
+        if not self._is_key:
+            self._after_value()
+            return
+        key = "".join(self._key)
+        if self._keys is not None and len(self._stack) == 1 and key not in self._keys:
+            self._fail(f"unexpected key {key[:40]!r}")
+        self._expect = "colon"
+
+    def _open(self, ch: str) -> None:
+        if self._keys is not None and not self._stack and ch != "{":
+            self._fail("expected a JSON object")
+        self._stack.append(ch)
+        self._expect = "key_or_close" if ch == "{" else "value_or_close"
+
+    def _close(self, ch: str) -> None:
+        if not self._stack or self._stack[-1] != ("{" if ch == "}" else "["):
+            self._fail(f"unbalanced {ch!r}")
+        self._stack.pop()
+        self._after_value()
+
+    def _step(self, ch: str) -> None:
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif ch == "\\":
+                self._escape = True
+                return
+            elif ch == '"':
+                self._end_string()
+                return
+            if self._is_key:
+                self._key.append(ch)
+            return
+
+        if self._literal:
+            if ch in _LITERAL_CHARS:
+                self._literal.append(ch)
+                return
+            self._end_literal()
+
+        if ch in _WHITESPACE:
+            return
+
+        expect = self._expect
+        if expect in ("value", "value_or_close"):
+            if ch == "]" and expect == "value_or_close":
+                self._close(ch)
+            elif ch in "{[":
+                self._open(ch)
+            elif self._keys is not None and not self._stack:
+                self._fail("expected a JSON object")
+            elif ch == '"':
+                self._in_string, self._is_key = True, False
+            elif ch in "-0123456789tfn":
+                self._literal = [ch]
+            else:
+                self._fail(f"unexpected {ch!r}")
+        elif expect in ("key", "key_or_close"):
+            if ch == "}" and expect == "key_or_close":
+                self._close(ch)
+            elif ch == '"':
+                self._in_string, self._is_key, self._key = True, True, []
+            else:
+                self._fail(f"expected a key, got {ch!r}")
+        elif expect == "colon":
+            if ch != ":":
+                self._fail(f"expected ':', got {ch!r}")
+            self._expect = "value"
+        elif expect == "comma_or_close":
+            if ch == ",":
+                self._expect = "key" if self._stack[-1] == "{" else "value"
+            elif ch in "}]":
+                self._close(ch)
+            else:
+                self._fail(f"expected ',' or a closing bracket, got {ch!r}")
+        else:
+            self._fail(f"unexpected {ch!r} after the JSON value")
+
+    def feed(self, chunk: str) -> None:
+        self._chunks.append(chunk)
+        for ch in chunk:
+            self._size += 1
+            self._step(ch)
+        if self._size > self.max_chars:
+            self._fail(f"answer longer than {self.max_chars} chars")
+
+    @property
+    def text(self) -> str:
+        return "".join(self._chunks)
+
+    def finish(self) -> Any:
+        """Parse the complete answer; raises ValueError if it is truncated or doesn't fit the model."""
+        if self._literal:
+            self._end_literal()
+        if self._expect != "done":
+            self._fail("answer ended early")
+        data = json.loads(self.text)
+        if self.model is not None:
+            data = self.model.model_validate(data).model_dump()
+        return data
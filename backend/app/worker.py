@@ -0,0 +1,141 @@
+"""
+Plan job worker.
+
+Takes plan jobs off the job queue (app.utils.job_queue) and runs each with the
+streaming planner, recording every section as a job event the moment it is
+ready, so clients polling or subscribing see partial plans. With the Redis
+queue, run as many worker processes as the LLM budget allows:
+
+    cd backend && python -m app.worker --concurrency 4
+
+With the local queue the web app runs these workers itself (JOB_WORKERS_IN_APP).
+"""
+import os
+import time
+import signal
+import asyncio
+import logging
+import argparse
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+# before the app modules, which read their settings from the environment at import
+load_dotenv()
+
+from app.planner import stream_plan_async
+from app.schemas import TravelPlan
+from app.utils.job_queue import JOB_LEASE_SECONDS, JOB_POLL_SECONDS, JobQueue, LocalJobQueue, job_queue
+from app.utils.metrics import JOBS
+
+logger = logging.getLogger(__name__)
+
+# Jobs one worker process (or the app, with in-app workers) runs at the same time.
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "4"))
+
+
+async def run_job(queue: JobQueue, job_id: str, request: Dict[str, Any]) -> None:
+    fields: Dict[str, Any] = {}
+    sections: Dict[str, Any] = {}
+    meta: Dict[str, Any] = {}
+    try:
+        async for event, data in stream_plan_async(request):
+            await queue.append_event_async(job_id, event, data)
+            if event == "request":
+                fields = data
+            elif event == "done":
+                meta = data
+            else:
+                sections[event] = data
+        plan = TravelPlan(**fields, **sections, meta=meta).model_dump()
+    except Exception as e:
+        logger.exception("worker: plan job %s failed", job_id)
+        error = f"Travel plan generation failed: {str(e)}"
+        await queue.update_async(job_id, status="failed", error=error, finished_at=time.time())
+        await queue.append_event_async(job_id, "status", {"status": "failed", "error": error})
+        JOBS.inc(state="failed")
+        return
+
+    # the record is complete before "done" is announced
+    await queue.update_async(job_id, status="done", plan=plan, plan_id=meta.get("plan_id"), finished_at=time.time())
+    await queue.append_event_async(job_id, "status", {"status": "done"})
+    JOBS.inc(state="done")
+
+
+async def _keep_leased(queue: JobQueue, job_id: str) -> None:
+    while True:
+        await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+        try:
+            await queue.renew_async(job_id)
+        except Exception:
+            logger.warning("worker: could not renew the lease on plan job %s", job_id, exc_info=True)
+
+
+async def run_leased(queue: JobQueue, job_id: str, request: Dict[str, Any]) -> None:
+    """run_job, renewing the job's lease while it runs and releasing it after."""
+    heartbeat = asyncio.create_task(_keep_leased(queue, job_id))
+    try:
+        await run_job(queue, job_id, request)
+    finally:
+        heartbeat.cancel()
+        try:
+            await queue.release_async(job_id)
+        except Exception:
+            logger.warning("worker: could not release plan job %s", job_id, exc_info=True)
+
+
+async def run_worker(queue: Optional[JobQueue] = None, concurrency: int = JOB_WORKER_CONCURRENCY,
+                     stopping: Optional[asyncio.Event] = None) -> None:
+    """
+    Run `concurrency` job slots until cancelled, or until `stopping` is set and
+    the jobs already taken are finished; each slot takes the next job as soon
+    as it is free.
+    """
+    queue = queue or job_queue
+    stopping = stopping or asyncio.Event()
+
+    async def slot() -> None:
+        while not stopping.is_set():
+            try:
+                claimed = await queue.claim_async()
+            except Exception:
+                logger.warning("worker: could not take a job from the queue", exc_info=True)
+                await asyncio.sleep(1)
+                continue
+            if claimed is None:
+                await asyncio.sleep(JOB_POLL_SECONDS)
+                continue
+            JOBS.inc(state="started")
+            await run_leased(queue, *claimed)
+
+    await asyncio.gather(*(slot() for _ in range(max(1, concurrency))))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=JOB_WORKER_CONCURRENCY)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if isinstance(job_queue, LocalJobQueue):
+        logger.error("worker: the job queue is local to each process; set REDIS_URL (or JOB_QUEUE=redis) to run workers")
+        return 1
+
+    from app.planner import warm_up
+    logger.info("worker: warm-up done: %s", warm_up())
+    asyncio.run(_serve(args.concurrency))
+    return 0
+
+
+async def _serve(concurrency: int) -> None:
+    # SIGTERM/SIGINT: take no new jobs, finish the running ones
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stopping.set)
+    await run_worker(job_queue, concurrency, stopping)
+    logger.info("worker: stopped")
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,197 @@
+"""
+Offline planner benchmark.
+
+Starts the local stub server (benchmarks/stub_server.py), points the OpenAI and
+SerpAPI helpers at it, and drives one of:
+
+    sync   - app.planner.generate_plan on a thread pool
+    async  - app.planner.generate_plan_async on one event loop
+    api    - POST /api/generate_plan through the ASGI app (in-process, no socket)
+
+at the requested concurrency, then reports p50/p95/p99 latency, throughput and a
+per-agent breakdown taken from each plan's meta.timings_ms.
+
+    cd backend && python -m benchmarks.bench_planner --target async -n 200 -c 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from benchmarks import stub_server
+
+DESTINATIONS = ["GOI", "DEL", "JAI", "BLR", "MAA", "CCU", "HYD", "COK", "UDR", "VNS"]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def configure(url: str) -> None:
+    """Point the app at the stub; must run before any app module is imported."""
+    os.environ["OPENAI_API_KEY"] = "stub"
+    os.environ["OPENAI_BASE_URL"] = f"{url}/v1"
+    os.environ["SERPAPI_KEY"] = "stub"
+    os.environ["SERPAPI_URL"] = f"{url}/search.json"
+    # the benchmark is one client hammering the API; don't let limits skew it
+    for budget in ("RATE_LIMIT_PER_MINUTE", "LLM_TOKENS_PER_MINUTE", "SERPAPI_CALLS_PER_HOUR"):
+        os.environ[budget] = "0"
+
+
+def upstream_counts(url: str) -> Dict:
+    import httpx
+    return httpx.get(f"{url}/_stats").json()
+
+
+def make_requests(n: int, unique: int, cache: bool, mode: str) -> List[dict]:
+    reqs = []
+    for i in range(n):
+        dest = DESTINATIONS[i % min(unique, len(DESTINATIONS))]
+        reqs.append({
+            "source": "BOM",
+            "destination": dest,
+            "depart_date": "2026-12-01",
+            "return_date": "2026-12-04",
+            "num_days": 3,
+            "theme": "Luxury",
+            "bypass_cache": not cache,
+            "mode": mode,
+        })
+    return reqs
+
+
+def run_sync(reqs: List[dict], concurrency: int):
+    from app.planner import generate_plan
+
+    def one(req):
+        started = time.perf_counter()
+        plan = generate_plan(req)
+        return time.perf_counter() - started, plan.get("meta", {})
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(one, reqs))
+
+
+async def _bounded(reqs: List[dict], concurrency: int, call):
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(req):
+        async with sem:
+            started = time.perf_counter()
+            meta = await call(req)
+            return time.perf_counter() - started, meta
+
+    return await asyncio.gather(*(one(r) for r in reqs))
+
+
+def run_async(reqs: List[dict], concurrency: int):
+    from app.planner import generate_plan_async
+
+    async def call(req):
+        return (await generate_plan_async(req)).get("meta", {})
+
+    return asyncio.run(_bounded(reqs, concurrency, call))
+
+
+def run_api(reqs: List[dict], concurrency: int):
+    import httpx
+    from app.main import app
+
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            async def call(req):
+                body = {k: req[k] for k in ("source", "destination", "depart_date", "return_date", "theme", "mode", "bypass_cache")}
+                resp = await client.post("/api/generate_plan", json=body)
+                resp.raise_for_status()
+                return resp.json().get("meta", {})
+
+            return await _bounded(reqs, concurrency, call)
+
+    return asyncio.run(main())
+
+
+RUNNERS = {"sync": run_sync, "async": run_async, "api": run_api}
+
+
+def summarize(results, wall: float) -> Dict:
+    latencies = [r[0] for r in results]
+    agents: Dict[str, List[float]] = {}
+    degraded = fallbacks = 0
+    for _, meta in results:
+        for agent, ms in (meta.get("timings_ms") or {}).items():
+            agents.setdefault(agent, []).append(ms)
+        degraded += len(meta.get("degraded") or [])
+        fallbacks += len(meta.get("fallbacks") or [])
+
+    return {
+        "requests": len(results),
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(results) / wall, 2) if wall else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "p99": round(percentile(latencies, 99) * 1000, 1),
+            "mean": round(statistics.fmean(latencies) * 1000, 1) if latencies else 0.0,
+        },
+        "agents_ms": {
+            agent: {"p50": round(percentile(v, 50), 1), "p95": round(percentile(v, 95), 1), "calls": len(v)}
+            for agent, v in sorted(agents.items())
+        },
+        "degraded_sections": degraded,
+        "fallback_sections": fallbacks,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=sorted(RUNNERS), default="async")
+    parser.add_argument("-n", "--requests", type=int, default=50)
+    parser.add_argument("-c", "--concurrency", type=int, default=10)
+    parser.add_argument("--unique", type=int, default=len(DESTINATIONS), help="distinct destinations to rotate through")
+    parser.add_argument("--cache", action="store_true", help="let plans use the agent cache (default: bypass)")
+    parser.add_argument("--mode", choices=["parallel", "combined"], default="parallel")
+    parser.add_argument("--llm-latency", type=float, default=1.0)
+    parser.add_argument("--flights-latency", type=float, default=1.5)
+    parser.add_argument("--jitter", type=float, default=0.3)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--invalid-rate", type=float, default=0.0, help="share of LLM answers that are prose instead of JSON")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON only")
+    args = parser.parse_args(argv)
+
+    url, proc = stub_server.spawn(
+        llm_latency=args.llm_latency, flights_latency=args.flights_latency,
+        jitter=args.jitter, error_rate=args.error_rate, seed=args.seed, invalid_rate=args.invalid_rate,
+    )
+    try:
+        configure(url)
+        reqs = make_requests(args.requests, args.unique, args.cache, args.mode)
+        started = time.perf_counter()
+        results = RUNNERS[args.target](reqs, args.concurrency)
+        summary = summarize(results, time.perf_counter() - started)
+        summary["target"] = args.target
+        summary["concurrency"] = args.concurrency
+        summary["upstream_calls"] = upstream_counts(url)
+    finally:
+        proc.terminate()
+
+    if args.json:
+        print(json.dumps(summary))
+    else:
+        print(json.dumps(summary, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""
+Itinerary sanitizer micro-benchmark and golden-output check.
+
+Compares itinerary_agent._sanitize_text_for_tourist with the implementation it
+replaced (legacy_sanitize, kept in tests/test_sanitizer.py with the golden
+corpus that pytest checks) on many random slots built from the substitution
+table's terms. Any difference is printed and the script exits 1. It then
+times both on a realistic mix of slots.
+
+    cd backend && python -m benchmarks.bench_sanitizer
+    cd backend && python -m benchmarks.bench_sanitizer --fuzz 200000 --slots 50000
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
+from app.agents.itinerary_agent import _CORP_RE, _sanitize_text_for_tourist
+from tests.test_sanitizer import GOLDEN, fuzz_slot, legacy_sanitize
+
+
+def check(fuzz: int, seed: int) -> int:
+    mismatches = 0
+    rng = random.Random(seed)
+    cases = GOLDEN + [fuzz_slot(rng) for _ in range(fuzz)]
+    for text in cases:
+        expected, got = legacy_sanitize(text), _sanitize_text_for_tourist(text)
+        if expected != got:
+            mismatches += 1
+            if mismatches <= 20:
+                print(json.dumps({"input": text, "legacy": expected, "new": got}), file=sys.stderr)
+    return mismatches
+
+
+def _time(fn, slots, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for text in slots:
+            fn(text)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fuzz", type=int, default=20000, help="random slots compared against the legacy output")
+    parser.add_argument("--slots", type=int, default=20000, help="slots per timing run")
+    parser.add_argument("--corporate-share", type=float, default=0.3, help="fraction of timed slots that mention a keyword")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    mismatches = check(args.fuzz, args.seed)
+
+    rng = random.Random(args.seed)
+    flagged = [t for t in GOLDEN if t and _CORP_RE.search(t)]
+    clean = [t for t in GOLDEN if t and not _CORP_RE.search(t)]
+    slots = [rng.choice(flagged if rng.random() < args.corporate_share else clean) for _ in range(args.slots)]
+
+    legacy_s = _time(legacy_sanitize, slots, args.repeat)
+    new_s = _time(_sanitize_text_for_tourist, slots, args.repeat)
+    print(json.dumps({
+        "golden_cases": len(GOLDEN),
+        "fuzz_cases": args.fuzz,
+        "mismatches": mismatches,
+        "slots": args.slots,
+        "legacy_us_per_slot": round(legacy_s / args.slots * 1e6, 2),
+        "new_us_per_slot": round(new_s / args.slots * 1e6, 2),
+        "speedup": round(legacy_s / new_s, 2) if new_s else None,
+    }, indent=2))
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""
+Serving-profile benchmark.
+
+Starts the local stub server, then runs the real app over a socket under each
+serving profile in turn:
+
+    reload    - `uvicorn app.main:app --reload` (what Dockerfile.backend ran before)
+    gunicorn  - `gunicorn -c gunicorn.conf.py app.main:app` (app/serve.py)
+
+and drives it with concurrent HTTP clients against GET /health (serving
+overhead only) and POST /api/generate_plan (plans against the stub), reporting
+throughput and p50/p95/p99 latency per profile, plus how long each took to stop
+with requests still in flight (SIGTERM to exit).
+
+    cd backend && python -m benchmarks.bench_serving -n 2000 -c 50 --plans 100
+    cd backend && python -m benchmarks.bench_serving --workers 4 --profiles gunicorn
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmarks import stub_server
+from benchmarks.bench_planner import configure, make_requests, percentile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROFILES = {
+    "reload": [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", "{port}", "--reload"],
+    "gunicorn": [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app.main:app", "--bind", "127.0.0.1:{port}"],
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start(profile: str, env: Dict[str, str]):
+    port = _free_port()
+    cmd = [arg.format(port=port) for arg in PROFILES[profile]]
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    import httpx
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{profile}: server exited with {proc.returncode}")
+        try:
+            if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                return url, proc
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"{profile}: server did not come up")
+
+
+async def _drive(url: str, calls: List, concurrency: int) -> Dict:
+    import httpx
+    sem = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client:
+        async def one(call):
+            nonlocal errors
+            async with sem:
+                started = time.perf_counter()
+                try:
+                    (await call(client)).raise_for_status()
+                    latencies.append(time.perf_counter() - started)
+                except httpx.HTTPError:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(c) for c in calls))
+        wall = time.perf_counter() - started
+    return {
+        "requests": len(calls),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall, 1) if wall else 0.0,
+        "latency_ms": {p: round(percentile(latencies, q) * 1000, 1) for p, q in (("p50", 50), ("p95", 95), ("p99", 99))},
+    }
+
+
+def health_calls(n: int) -> List:
+    return [lambda client: client.get("/health")] * n
+
+
+def plan_calls(n: int) -> List:
+    fields = ("source", "destination", "depart_date", "return_date", "theme", "mode", "bypass_cache")
+    return [
+        (lambda body: lambda client: client.post("/api/generate_plan", json=body))({k: req[k] for k in fields})
+        for req in make_requests(n, 10, cache=False, mode="parallel")
+    ]
+
+
+def stop(url: str, proc, in_flight: int) -> Dict:
+    """SIGTERM with `in_flight` plans running; how long until exit and how many still completed."""
+    import httpx
+    results: List[int] = []
+
+    async def one(client, call):
+        try:
+            results.append((await call(client)).status_code)
+        except httpx.HTTPError:
+            results.append(0)
+
+    async def run():
+        async with httpx.AsyncClient(base_url=url, timeout=120) as client:
+            tasks = [asyncio.create_task(one(client, call)) for call in plan_calls(in_flight)]
+            await asyncio.sleep(0.5)
+            started = time.perf_counter()
+            proc.send_signal(signal.SIGTERM)
+            await asyncio.gather(*tasks)
+            await asyncio.to_thread(proc.wait, 120)
+            return time.perf_counter() - started
+
+    elapsed = asyncio.run(run())
+    return {"in_flight": in_flight, "completed": results.count(200), "exit_s": round(elapsed, 2)}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", nargs="+", choices=sorted(PROFILES), default=["reload", "gunicorn"])
+    parser.add_argument("-n", "--requests", type=int, default=2000, help="GET /health requests")
+    parser.add_argument("--plans", type=int, default=100, help="POST /api/generate_plan requests")
+    parser.add_argument("-c", "--concurrency", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=0, help="gunicorn workers (default: one per core)")
+    parser.add_argument("--in-flight", type=int, default=5, help="plans running when the server is stopped")
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--flights-latency", type=float, default=0.3)
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON only")
+    args = parser.parse_args(argv)
+
+    stub_url, stub_proc = stub_server.spawn(llm_latency=args.llm_latency, flights_latency=args.flights_latency, jitter=0.0)
+    configure(stub_url)
+    results: Dict[str, Dict] = {}
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, PLAN_STORE="sqlite", PLAN_STORE_PATH=os.path.join(tmp, "plans.sqlite3"))
+            env.pop("REDIS_URL", None)
+            if args.workers:
+                env["WEB_CONCURRENCY"] = str(args.workers)
+            for profile in args.profiles:
+                url, proc = start(profile, env)
+                try:
+                    results[profile] = {
+                        "health": asyncio.run(_drive(url, health_calls(args.requests), args.concurrency)),
+                        "generate_plan": asyncio.run(_drive(url, plan_calls(args.plans), args.concurrency)),
+                        "shutdown": stop(url, proc, args.in_flight),
+                    }
+                finally:
+                    if proc.poll() is None:
+                        proc.kill()
+    finally:
+        stub_proc.terminate()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    print(f"{'profile':<10} {'endpoint':<14} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for profile, res in results.items():
+        for endpoint in ("health", "generate_plan"):
+            r = res[endpoint]
+            lat = r["latency_ms"]
+            print(f"{profile:<10} {endpoint:<14} {r['throughput_rps']:>8} {lat['p50']:>8} {lat['p95']:>8} {lat['p99']:>8} {r['errors']:>7}")
+    for profile, res in results.items():
+        s = res["shutdown"]
+        print(f"{profile:<10} SIGTERM with {s['in_flight']} plans in flight: {s['completed']} completed, exited after {s['exit_s']}s")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,130 @@
+"""
+Cold-start benchmark.
+
+Imports app.main in fresh interpreters with no credentials in the environment,
+then runs the startup warm-up, and reports import / warm-up / total time (median
+and max over the runs) plus the slowest modules from `python -X importtime`.
+
+    cd backend && python -m benchmarks.bench_startup -n 5
+    cd backend && python -m benchmarks.bench_startup --max-import-ms 1500   # exit 1 if slower
+
+The import must work without OPENAI_API_KEY/SERPAPI_KEY; a run that fails to
+import is reported as an error, which is itself a regression.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child interpreter; prints one JSON line.
+PROBE = """
+import json, time
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+from app.planner import warm_up
+steps = warm_up()
+done = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "warmup_ms": (done - imported) * 1000,
+    "steps_ms": steps,
+}))
+"""
+
+SECRETS = ("OPENAI_API_KEY", "SERPAPI_KEY", "REDIS_URL")
+
+
+def _clean_env(with_key: bool) -> Dict[str, str]:
+    env = {k: v for k, v in os.environ.items() if k not in SECRETS}
+    if with_key:
+        env["OPENAI_API_KEY"] = "bench"
+    return env
+
+
+def probe(with_key: bool) -> Dict:
+    proc = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=BACKEND_DIR, env=_clean_env(with_key),
+        capture_output=True, text=True, timeout=120,
+    )
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(top: int) -> List[Dict]:
+    """Modules imported directly by app.main, slowest first (cumulative import time)."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"], cwd=BACKEND_DIR,
+        env=_clean_env(False), capture_output=True, text=True, timeout=120,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            cumulative = int(parts[1])
+        except ValueError:
+            continue  # header line
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append({"module": name.strip(), "depth": depth, "cumulative_ms": round(cumulative / 1000, 1)})
+    # direct imports of app.main (and app.main itself) are what a change here moves
+    rows = [r for r in rows if r["depth"] <= 1]
+    rows.sort(key=lambda r: r["cumulative_ms"], reverse=True)
+    return [{"module": r["module"], "cumulative_ms": r["cumulative_ms"]} for r in rows[:top]]
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    return {"median": round(statistics.median(values), 1), "max": round(max(values), 1)} if values else {}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--runs", type=int, default=5)
+    parser.add_argument("--with-key", action="store_true", help="set a dummy OPENAI_API_KEY so warm-up builds the clients")
+    parser.add_argument("--top", type=int, default=10, help="how many of the slowest imports to list")
+    parser.add_argument("--max-import-ms", type=float, default=None, help="fail if the median import time is above this")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON only")
+    args = parser.parse_args(argv)
+
+    runs = [probe(args.with_key) for _ in range(args.runs)]
+    ok = [r for r in runs if "error" not in r]
+    errors = [r["error"] for r in runs if "error" in r]
+
+    steps: Dict[str, List[float]] = {}
+    for r in ok:
+        for step, ms in r["steps_ms"].items():
+            steps.setdefault(step, []).append(ms)
+
+    summary = {
+        "runs": len(runs),
+        "errors": errors,
+        "import_ms": _summary([r["import_ms"] for r in ok]),
+        "warmup_ms": _summary([r["warmup_ms"] for r in ok]),
+        "total_ms": _summary([r["import_ms"] + r["warmup_ms"] for r in ok]),
+        "warmup_steps_ms": {step: _summary(v) for step, v in steps.items()},
+        "slowest_imports": slowest_imports(args.top),
+    }
+
+    if args.json:
+        print(json.dumps(summary))
+    else:
+        print(json.dumps(summary, indent=2))
+
+    if errors:
+        return 1
+    if args.max_import_ms is not None and summary["import_ms"]["median"] > args.max_import_ms:
+        print(f"import time {summary['import_ms']['median']}ms exceeds {args.max_import_ms}ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
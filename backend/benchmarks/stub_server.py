@@ -0,0 +1,295 @@
+"""
+Local stand-in for the OpenAI chat-completions and SerpAPI google_flights APIs.
+
+Answers are canned but shaped like the real thing (streamed as SSE chunks when
+the request asks for stream=true), and every response is delayed by a
+configurable latency plus jitter so planner throughput can be measured offline
+and without keys.
+
+    python -m benchmarks.stub_server --port 8900 --llm-latency 1.5 --jitter 0.5
+"""
+import argparse
+import json
+import multiprocessing
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+HOTEL = {"name": "Stub Palace", "price": "₹8,000/night", "area": "City Centre", "highlights": ["Pool", "Spa"]}
+
+COMBINED = {
+    "hotels": {"budget": [HOTEL], "mid_range": [HOTEL], "luxury": [HOTEL]},
+    "restaurants": [{"name": "Stub Kitchen", "cuisine": "Local", "must_try": ["Thali"]}],
+    "transport": {"best_way": "Taxi", "avg_cost": "₹800/day", "tips": "Use prepaid counters"},
+    "weather": {"summary": "Warm and sunny", "temperature": "29°C", "recommendation": "Carry sunscreen"},
+}
+
+
+def _itinerary(prompt: str) -> dict:
+    days = 3
+    for word in prompt.replace("-", " ").split():
+        if word.isdigit():
+            days = int(word)
+            break
+    return {"itinerary": [
+        {"day": d, "morning": "Visit the old fort", "afternoon": "Lunch by the lake", "evening": "Sunset walk"}
+        for d in range(1, days + 1)
+    ]}
+
+
+def llm_answer(prompt: str) -> dict:
+    """Pick a canned answer from the same keywords the agents put in their prompts."""
+    if prompt.startswith("Answer all of the following"):
+        return COMBINED
+    if "itinerary" in prompt:
+        return _itinerary(prompt)
+    if "hotels" in prompt:
+        return COMBINED["hotels"]
+    if "attractions" in prompt:
+        return {"attractions": [{"name": "Old Fort", "why": "Views and history", "best_time": "Morning"}]}
+    if "restaurants" in prompt:
+        return {"restaurants": COMBINED["restaurants"]}
+    if "get around" in prompt:
+        return COMBINED["transport"]
+    if "weather" in prompt:
+        return COMBINED["weather"]
+    return {}
+
+
+def flights_answer(params: dict) -> dict:
+    # fares vary by date (deterministically) so flexible-date searches have something to compare
+    dates = f"{params.get('outbound_date', '')}{params.get('return_date', '')}"
+    base = 4500 + sum(map(ord, dates)) * 37 % 2000
+    return {"best_flights": [
+        {
+            "price": base + 250 * i,
+            "total_layovers": i % 2,
+            "duration": 95 + 20 * i,
+            "flights": [{"airline": f"Stub Air {i}", "airline_logo": None}],
+        }
+        for i in range(6)
+    ]}
+
+
+# What a misbehaving model sends instead of JSON (see --invalid-rate).
+INVALID_ANSWER = "Sure! Here are some wonderful options for your trip: " + "lovely places to visit " * 40
+
+STREAM_CHUNKS = 8
+STREAM_FIRST_TOKEN_SHARE = 0.3
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # the default backlog of 5 drops connections under benchmark concurrency
+    request_queue_size = 1024
+
+
+class StubServer:
+    """
+    Threaded HTTP server running in the background.
+    Routes: POST /v1/chat/completions (OpenAI) and GET /search.json (SerpAPI).
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 llm_latency: float = 1.0, flights_latency: float = 1.5,
+                 jitter: float = 0.3, error_rate: float = 0.0, seed: Optional[int] = None,
+                 invalid_rate: float = 0.0):
+        self.llm_latency = llm_latency
+        self.flights_latency = flights_latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.invalid_rate = invalid_rate
+        self.random = random.Random(seed)
+        self.counts = {"llm": 0, "flights": 0, "errors": 0, "invalid": 0, "aborted": 0}
+        self._lock = threading.Lock()
+        self.httpd = _Server((host, port), self._handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _delay(self, base: float) -> float:
+        with self._lock:
+            return max(0.0, base + self.random.uniform(-self.jitter, self.jitter))
+
+    def _fail(self) -> bool:
+        with self._lock:
+            return self.random.random() < self.error_rate
+
+    def _invalid(self) -> bool:
+        with self._lock:
+            return self.random.random() < self.invalid_rate
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.counts[key] += 1
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: dict) -> None:
+                raw = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    return self._send(404, {"error": {"message": "not found"}})
+
+                server._count("llm")
+                latency = server._delay(server.llm_latency)
+                streaming = bool(body.get("stream"))
+                # streamed answers spend part of the latency before the first token, the rest spread over chunks
+                time.sleep(latency * (STREAM_FIRST_TOKEN_SHARE if streaming else 1))
+                if server._fail():
+                    server._count("errors")
+                    return self._send(503, {"error": {"message": "stub overloaded"}})
+
+                messages = body.get("messages") or []
+                prompt = messages[-1]["content"] if messages else ""
+                if server._invalid():
+                    server._count("invalid")
+                    content = INVALID_ANSWER
+                else:
+                    content = json.dumps(llm_answer(prompt))
+                prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+                completion_tokens = len(content) // 4
+                usage = {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                }
+                model = body.get("model", "stub")
+                if streaming:
+                    return self._stream(model, content, usage, latency * (1 - STREAM_FIRST_TOKEN_SHARE))
+                self._send(200, {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": content},
+                    }],
+                    "usage": usage,
+                })
+
+            def _stream(self, model: str, content: str, usage: dict, duration: float) -> None:
+                def event(choices, usage=None) -> bytes:
+                    chunk = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                             "model": model, "choices": choices, "usage": usage}
+                    return f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+
+                step = max(1, -(-len(content) // STREAM_CHUNKS))
+                pieces = [event([{"index": 0, "delta": {"role": "assistant", "content": content[i:i + step]}, "finish_reason": None}])
+                          for i in range(0, len(content), step)]
+                pieces.append(event([{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+                pieces.append(event([], usage))
+                pieces.append(b"data: [DONE]\n\n")
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Content-Length", str(sum(len(p) for p in pieces)))
+                self.end_headers()
+                try:
+                    for piece in pieces:
+                        self.wfile.write(piece)
+                        self.wfile.flush()
+                        time.sleep(duration / len(pieces))
+                except (BrokenPipeError, ConnectionResetError):
+                    # client gave up on the answer early
+                    server._count("aborted")
+                    self.close_connection = True
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                if parsed.path == "/_stats":
+                    with server._lock:
+                        return self._send(200, dict(server.counts))
+                if parsed.path != "/search.json":
+                    return self._send(404, {"error": "not found"})
+
+                server._count("flights")
+                time.sleep(server._delay(server.flights_latency))
+                if server._fail():
+                    server._count("errors")
+                    return self._send(503, {"error": "stub overloaded"})
+
+                params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+                self._send(200, flights_answer(params))
+
+        return Handler
+
+    def start(self) -> "StubServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="stub-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def _serve(ready, kwargs) -> None:
+    server = StubServer(**kwargs)
+    ready.put(server.url)
+    server.httpd.serve_forever()
+
+
+def spawn(**kwargs):
+    """
+    Run a StubServer in a child process so it doesn't compete with the code
+    under test for the GIL. Returns (base url, process); counts are at GET /_stats.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Queue()
+    proc = ctx.Process(target=_serve, args=(ready, kwargs), daemon=True)
+    proc.start()
+    return ready.get(timeout=30), proc
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--llm-latency", type=float, default=1.0)
+    parser.add_argument("--flights-latency", type=float, default=1.5)
+    parser.add_argument("--jitter", type=float, default=0.3)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--invalid-rate", type=float, default=0.0, help="share of LLM answers that are prose instead of JSON")
+    args = parser.parse_args()
+
+    server = StubServer(args.host, args.port, args.llm_latency, args.flights_latency, args.jitter, args.error_rate,
+                        invalid_rate=args.invalid_rate)
+    print(f"stub server on {server.url}  (OPENAI_BASE_URL={server.url}/v1  SERPAPI_URL={server.url}/search.json)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
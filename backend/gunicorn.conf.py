@@ -0,0 +1,36 @@
+"""
+gunicorn settings for the production serving profile (see app/serve.py).
+
+    cd backend && gunicorn -c gunicorn.conf.py app.main:app
+"""
+import os
+
+from app.serve import (
+    WEB_CONCURRENCY,
+    WEB_DRAIN_SECONDS,
+    WEB_KEEPALIVE,
+    WEB_MAX_REQUESTS,
+    WEB_MAX_REQUESTS_JITTER,
+)
+
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+workers = WEB_CONCURRENCY
+worker_class = "app.serve.Worker"
+preload_app = True
+keepalive = WEB_KEEPALIVE
+max_requests = WEB_MAX_REQUESTS
+max_requests_jitter = WEB_MAX_REQUESTS_JITTER
+# a worker gets the connection drain plus the in-app job drain before it is killed
+graceful_timeout = WEB_DRAIN_SECONDS + int(os.getenv("JOB_DRAIN_SECONDS", "30")) + 5
+timeout = int(os.getenv("WEB_TIMEOUT", "60"))
+accesslog = os.getenv("ACCESS_LOG") or None
+errorlog = "-"
+
+
+def when_ready(server):
+    # the app is loaded (preload_app) and workers are not forked yet
+    from app.serve import preload
+    from app.utils.job_queue import LocalJobQueue, job_queue
+    preload()
+    if server.cfg.workers > 1 and isinstance(job_queue, LocalJobQueue):
+        server.log.warning("plan jobs are queued per worker process; set REDIS_URL so /api/plan_jobs works across workers")
@@ -0,0 +1,98 @@
+import asyncio
+import heapq
+import random
+
+import pytest
+
+from app.utils.resilience import AdaptiveLimiter, ConcurrencyLimitError
+
+
+class SimulatedUpstream:
+    """Closed-loop callers keeping the limiter full against an upstream with the given latency."""
+
+    def __init__(self, latency, initial_limit=16, max_limit=64):
+        self.now = 0.0
+        self.latency = latency
+        self.limiter = AdaptiveLimiter("sim", initial_limit=initial_limit, max_limit=max_limit, clock=lambda: self.now)
+        self._calls = []
+        self._inflight = 0
+
+    def run(self, samples):
+        limits = []
+        for _ in range(samples):
+            while self._inflight < self.limiter.limit:
+                self._inflight += 1
+                latency = self.latency()
+                heapq.heappush(self._calls, (self.now + latency, latency))
+            self.now, latency = heapq.heappop(self._calls)
+            self.limiter.on_sample(latency, inflight=self._inflight)
+            self._inflight -= 1
+            limits.append(self.limiter.limit)
+        return limits
+
+
+@pytest.mark.parametrize("low,high", [(0.5, 1.5), (0.3, 3.0), (0.05, 0.6)])
+def test_jitter_on_a_healthy_upstream_does_not_shrink_the_limit(low, high):
+    rng = random.Random(7)
+    upstream = SimulatedUpstream(lambda: rng.uniform(low, high))
+    limits = upstream.run(5000)
+    assert min(limits) >= 16
+    assert limits[-1] == 64
+
+
+def test_slowdown_shrinks_the_limit_and_recovery_restores_it():
+    rng = random.Random(7)
+    speed = {"factor": 1.0}
+    upstream = SimulatedUpstream(lambda: rng.uniform(0.08, 0.12) * speed["factor"])
+    assert upstream.run(2000)[-1] == 64
+
+    speed["factor"] = 10.0
+    slow = upstream.run(200)
+    assert slow[-1] <= 10
+
+    speed["factor"] = 1.0
+    fast = upstream.run(300)
+    assert fast[-1] == 64
+
+
+def test_failures_back_off_once_per_long_latency():
+    now = [0.0]
+    limiter = AdaptiveLimiter("sim", initial_limit=20, clock=lambda: now[0])
+    for _ in range(30):
+        limiter.on_sample(0.1, inflight=20)
+    limit = limiter._limit
+    limiter.on_sample(0.1, dropped=True)
+    limiter.on_sample(0.1, dropped=True)
+    assert limiter._limit == pytest.approx(limit * 0.9)
+    now[0] += 1.0
+    limiter.on_sample(0.1, dropped=True)
+    assert limiter._limit == pytest.approx(limit * 0.81)
+
+
+def test_queued_calls_are_admitted_by_priority_and_shed_when_full():
+    limiter = AdaptiveLimiter("sim", initial_limit=1, max_queue=2)
+
+    async def run():
+        held = await limiter.acquire_async()
+        order = []
+
+        async def call(priority):
+            try:
+                with await limiter.acquire_async(priority=priority, timeout=5):
+                    order.append(priority)
+            except ConcurrencyLimitError:
+                order.append(f"shed {priority}")
+
+        tasks = [asyncio.create_task(call(p)) for p in (1, 5)]
+        await asyncio.sleep(0)
+        # the queue is full: a higher priority call displaces the lowest one
+        tasks.append(asyncio.create_task(call(9)))
+        await asyncio.sleep(0)
+        with pytest.raises(ConcurrencyLimitError):
+            await limiter.acquire_async(priority=0)
+        held.skip = True
+        limiter.release(held)
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(run()) == ["shed 1", 9, 5]
@@ -0,0 +1,71 @@
+import asyncio
+import threading
+
+import fakeredis
+
+from app.utils import cache as cache_module
+from app.utils import redis_helper
+from app.utils.cache import AgentCache
+
+
+def test_redis_tier_is_shared_across_instances():
+    server = fakeredis.FakeServer()
+    writer = AgentCache(redis_client=fakeredis.FakeRedis(server=server))
+    reader = AgentCache(redis_client=fakeredis.FakeRedis(server=server))
+
+    writer.set("weather", "k1", {"summary": "sunny"})
+    assert writer.get("weather", "k1") == ({"summary": "sunny"}, "lru")
+    assert reader.get("weather", "k1") == ({"summary": "sunny"}, "redis")
+    # promoted into the reader's LRU
+    assert reader.get("weather", "k1") == ({"summary": "sunny"}, "lru")
+    assert reader.get("weather", "missing") == (None, None)
+    assert reader.stats()["weather"] == {"lru_hits": 1, "redis_hits": 1, "misses": 1, "stores": 0}
+
+
+def test_async_round_trip_through_redis():
+    server = fakeredis.FakeServer()
+    writer = AgentCache(redis_client=fakeredis.FakeRedis(server=server))
+    reader = AgentCache(redis_client=fakeredis.FakeRedis(server=server))
+
+    async def run():
+        await writer.set_async("hotels", "k2", [{"name": "Taj"}])
+        return await reader.get_async("hotels", "k2")
+
+    assert asyncio.run(run()) == ([{"name": "Taj"}], "redis")
+
+
+def test_redis_errors_fall_back_to_lru():
+    server = fakeredis.FakeServer()
+    server.connected = False
+    agent_cache = AgentCache(redis_client=fakeredis.FakeRedis(server=server))
+
+    agent_cache.set("food", "k3", ["dosa"])
+    assert agent_cache.get("food", "k3") == (["dosa"], "lru")
+    agent_cache.lru.clear()
+    assert agent_cache.get("food", "k3") == (None, None)
+
+
+def test_get_async_resolves_redis_off_the_event_loop(monkeypatch):
+    monkeypatch.setattr(redis_helper, "REDIS_URL", "redis://unreachable:6379/0")
+    monkeypatch.setattr(redis_helper, "_client", None)
+    monkeypatch.setattr(redis_helper, "_failed_at", None)
+    loop_threads = []
+
+    def get_redis():
+        loop_threads.append(threading.current_thread() is threading.main_thread())
+        redis_helper._failed_at = redis_helper.time.monotonic()
+        return None
+
+    monkeypatch.setattr(cache_module, "get_redis", get_redis)
+    agent_cache = AgentCache()
+
+    async def run():
+        first = await agent_cache.get_async("weather", "k4")
+        # Redis is now known to be down: no further connects (or thread hops)
+        second = await agent_cache.get_async("weather", "k4")
+        await agent_cache.set_async("weather", "k4", {"summary": "rain"})
+        return first, second
+
+    assert asyncio.run(run()) == ((None, None), (None, None))
+    assert loop_threads == [False]
+    assert agent_cache.get("weather", "k4") == ({"summary": "rain"}, "lru")
@@ -0,0 +1,39 @@
+import pytest
+
+from app.agents import combined_agent, transport_agent, weather_agent
+from app.planner import _is_fallback
+
+WEATHER = {"summary": "Warm and dry", "temperature": "31°C", "recommendation": "Carry water"}
+TRANSPORT = {"best_way": "taxi", "avg_cost": "₹800/day", "tips": "Agree the fare first"}
+
+
+@pytest.mark.parametrize("payload", [None, {}, [], "sunny", {"summary": "Warm"}])
+def test_empty_or_invalid_payloads_become_the_fallback(payload):
+    assert weather_agent._to_weather(payload) is weather_agent.FALLBACK
+    assert transport_agent._to_transport(payload) is transport_agent.FALLBACK
+
+
+def test_valid_payloads_pass_through():
+    assert weather_agent._to_weather(dict(WEATHER, extra="dropped")) == WEATHER
+    assert transport_agent._to_transport(TRANSPORT) == TRANSPORT
+
+
+@pytest.mark.parametrize("section,value", [
+    ("weather", weather_agent.FALLBACK),
+    ("weather", {}),
+    ("transport", transport_agent.FALLBACK),
+    ("transport", {}),
+    ("flights", []),
+])
+def test_fallback_and_empty_sections_are_detected(section, value):
+    assert _is_fallback(section, value, {"num_days": 3})
+
+
+def test_answered_sections_are_not_fallbacks():
+    assert not _is_fallback("weather", WEATHER, {"num_days": 3})
+    assert not _is_fallback("transport", TRANSPORT, {"num_days": 3})
+
+
+def test_combined_answer_leaves_out_unanswered_sections():
+    out = combined_agent._split({"weather": {}, "transport": TRANSPORT})
+    assert out == {"transport": TRANSPORT}
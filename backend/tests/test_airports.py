@@ -0,0 +1,23 @@
+import pytest
+
+from app.utils.airports import airport_index, city_for_code, resolve_code
+
+
+@pytest.mark.parametrize("text, code", [
+    ("Bombay", "BOM"),
+    ("bangalore", "BLR"),
+    ("Panjim", "GOI"),
+    ("Cochin", "COK"),
+    ("kashi", "VNS"),
+    ("Baroda", "BDQ"),
+    ("Mumbai", "BOM"),
+    ("jaipur", "JAI"),
+])
+def test_aliases_from_the_data_file_resolve(text, code):
+    assert resolve_code(text) == code
+
+
+def test_entries_with_aliases_keep_their_city():
+    assert city_for_code("BOM") == "Mumbai"
+    assert airport_index().get("GOI").aliases == ("Panaji", "Panjim")
+    assert airport_index().get("JAI").aliases == ()
@@ -0,0 +1,86 @@
+import asyncio
+import time
+from datetime import date, timedelta
+
+from app.utils import serpapi_helper
+from app.utils.deadline import remaining
+
+DEPART = (date.today() + timedelta(days=30)).isoformat()
+RETURN = (date.today() + timedelta(days=35)).isoformat()
+
+
+def _price(depart, ret):
+    # a later departure is cheaper, so the calendar has a clear cheapest pair
+    days = lambda a, b: (date.fromisoformat(a) - date.fromisoformat(b)).days
+    return 9000 - days(depart, DEPART) * 100 - days(ret, RETURN)
+
+
+def _flights(depart, ret):
+    return [{"airline": "IndiGo", "price": f"₹{_price(depart, ret)}"}]
+
+
+def test_flex_dates_are_bounded_and_nearest_first(monkeypatch):
+    monkeypatch.setattr(serpapi_helper, "FLEX_MAX_SEARCHES", 4)
+    departs, returns, pairs = serpapi_helper._flex_dates(DEPART, RETURN, 3)
+    assert len(departs) == len(returns) == 7
+    assert (DEPART, RETURN) not in pairs
+    shift = lambda day, n: (date.fromisoformat(day) + timedelta(days=n)).isoformat()
+    # the same trip length a day either way comes first
+    assert set(pairs[:2]) == {(shift(DEPART, -1), shift(RETURN, -1)), (shift(DEPART, 1), shift(RETURN, 1))}
+    assert len(pairs) == 4
+
+
+def test_requested_pair_is_kept_when_the_calendar_runs_out_of_time(monkeypatch):
+    searched = []
+
+    def fetch_flights(source, dest, depart, ret):
+        searched.append((depart, ret, remaining()))
+        if (depart, ret) != (DEPART, RETURN):
+            time.sleep(0.3)
+        return _flights(depart, ret)
+
+    monkeypatch.setattr(serpapi_helper, "fetch_flights", fetch_flights)
+    monkeypatch.setattr(serpapi_helper, "FLEX_MAX_SEARCHES", 6)
+    monkeypatch.setattr(serpapi_helper, "FLEX_CONCURRENCY", 2)
+    monkeypatch.setattr(serpapi_helper, "FLEX_BUDGET_SECONDS", 0.45)
+
+    started = time.monotonic()
+    flights, calendar = serpapi_helper.fetch_fare_calendar("DEL", "GOI", DEPART, RETURN, days=3)
+    assert time.monotonic() - started < 0.6
+    assert flights == _flights(DEPART, RETURN)
+    assert calendar["partial"] is True
+    assert sum(fare is not None for row in calendar["fares"] for fare in row) == 3
+    assert len(searched) <= 1 + 6
+    # the requested pair runs without the calendar's deadline; alternatives run under it
+    assert [left for d, r, left in searched if (d, r) == (DEPART, RETURN)] == [None]
+    assert all(left is not None and left <= 0.45 for d, r, left in searched if (d, r) != (DEPART, RETURN))
+
+
+def test_async_calendar_is_complete_when_searches_finish_in_time(monkeypatch):
+    async def fetch_flights_async(source, dest, depart, ret):
+        await asyncio.sleep(0.01)
+        return _flights(depart, ret)
+
+    monkeypatch.setattr(serpapi_helper, "fetch_flights_async", fetch_flights_async)
+    monkeypatch.setattr(serpapi_helper, "FLEX_MAX_SEARCHES", 8)
+
+    flights, calendar = asyncio.run(serpapi_helper.fetch_fare_calendar_async("DEL", "GOI", DEPART, RETURN, days=1))
+    assert flights == _flights(DEPART, RETURN)
+    assert calendar["partial"] is False
+    assert all(fare is not None for row in calendar["fares"] for fare in row)
+    assert calendar["cheapest"]["depart_date"] == calendar["depart_dates"][-1]
+
+
+def test_async_calendar_is_partial_when_searches_are_slow(monkeypatch):
+    async def fetch_flights_async(source, dest, depart, ret):
+        if (depart, ret) != (DEPART, RETURN):
+            await asyncio.sleep(1)
+        return _flights(depart, ret)
+
+    monkeypatch.setattr(serpapi_helper, "fetch_flights_async", fetch_flights_async)
+    monkeypatch.setattr(serpapi_helper, "FLEX_BUDGET_SECONDS", 0.1)
+
+    flights, calendar = asyncio.run(serpapi_helper.fetch_fare_calendar_async("DEL", "GOI", DEPART, RETURN, days=2))
+    assert flights == _flights(DEPART, RETURN)
+    assert calendar["partial"] is True
+    assert calendar["cheapest"] == {"depart_date": DEPART, "return_date": RETURN, "price": 9000}
@@ -0,0 +1,79 @@
+import fakeredis
+import pytest
+
+from app.utils import job_queue as job_queue_module
+from app.utils.job_queue import JobQueue, LocalJobQueue, RedisJobQueue
+
+
+@pytest.fixture
+def queue():
+    return RedisJobQueue(redis_client=fakeredis.FakeRedis())
+
+
+def _expire_lease(queue, job_id):
+    queue.redis.zadd(queue.prefix + "running", {job_id: 0})
+
+
+def test_job_queue_is_abstract():
+    with pytest.raises(TypeError):
+        JobQueue()
+    assert LocalJobQueue().claim() is None
+
+
+@pytest.mark.parametrize("make", [LocalJobQueue, lambda: RedisJobQueue(redis_client=fakeredis.FakeRedis())])
+def test_higher_priority_first_then_fifo(make):
+    queue = make()
+    low = queue.submit({"n": 1}, priority=1)
+    first = queue.submit({"n": 2}, priority=5)
+    second = queue.submit({"n": 3}, priority=5)
+    assert [queue.claim()[0] for _ in range(3)] == [first, second, low]
+    assert queue.claim() is None
+    assert queue.get(first)["status"] == "running"
+
+
+def test_claim_leases_the_job_until_released(queue):
+    job_id = queue.submit({"destination": "Goa"})
+    assert queue.claim() == (job_id, {"destination": "Goa"})
+    assert queue.redis.zscore(queue.prefix + "running", job_id) is not None
+    assert queue.depth() == 0
+
+    queue.release(job_id)
+    assert queue.redis.zscore(queue.prefix + "running", job_id) is None
+    queue.renew(job_id)  # a released job isn't leased again
+    assert queue.redis.zscore(queue.prefix + "running", job_id) is None
+
+
+def test_expired_lease_is_queued_again(queue):
+    job_id = queue.submit({"destination": "Goa"}, priority=7)
+    queue.submit({"destination": "Jaipur"}, priority=1)
+    assert queue.claim()[0] == job_id
+    _expire_lease(queue, job_id)
+
+    # the next claim puts it back first, and it still outranks the other job
+    assert queue.claim() == (job_id, {"destination": "Goa"})
+    job = queue.get(job_id)
+    assert job["status"] == "running" and job["attempts"] == 2
+    assert [data["status"] for event, data in queue.events(job_id) if event == "status"] == [
+        "queued", "running", "queued", "running"
+    ]
+
+
+def test_renewed_lease_is_not_requeued(queue):
+    job_id = queue.submit({"destination": "Goa"})
+    queue.claim()
+    _expire_lease(queue, job_id)
+    queue.renew(job_id)
+    assert queue.claim() is None
+    assert queue.get(job_id)["attempts"] == 1
+
+
+def test_job_fails_after_max_attempts(queue, monkeypatch):
+    monkeypatch.setattr(job_queue_module, "JOB_MAX_ATTEMPTS", 2)
+    job_id = queue.submit({"destination": "Goa"})
+    for _ in range(2):
+        assert queue.claim()[0] == job_id
+        _expire_lease(queue, job_id)
+    assert queue.claim() is None
+    job = queue.get(job_id)
+    assert job["status"] == "failed" and "worker lost" in job["error"]
+    assert queue.redis.zcard(queue.prefix + "running") == 0
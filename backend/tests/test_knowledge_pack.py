@@ -0,0 +1,32 @@
+from app.utils import knowledge_pack as kp
+
+
+def _weather(state):
+    return {"weather": {"summary": f"{state['num_days']} days", "temperature": "28°C", "recommendation": ""}}
+
+
+def _pack(tmp_path, monkeypatch):
+    monkeypatch.setattr(kp, "KNOWLEDGE_PACK_WEATHER_DAYS", [3, 5])
+    path = str(tmp_path / "pack.sqlite3")
+    summary = kp.build_pack(path, {"GOI": "Goa"}, ["weather"], {"weather": (_weather, None)}, workers=2)
+    assert summary == {"entries": 24, "stored": 24, "failed": 0}
+    return kp.KnowledgePack(path)
+
+
+def test_weather_matches_the_trip_length(tmp_path, monkeypatch):
+    pack = _pack(tmp_path, monkeypatch)
+    try:
+        for days in (3, 5):
+            state = {"destination": "Goa", "num_days": days, "depart_date": "2026-12-20"}
+            assert pack.get("weather", state)["summary"] == f"{days} days"
+    finally:
+        pack.close()
+
+
+def test_unpacked_trip_length_misses(tmp_path, monkeypatch):
+    pack = _pack(tmp_path, monkeypatch)
+    try:
+        # a 3-day summary must not be served for a 7-day trip
+        assert pack.get("weather", {"destination": "Goa", "num_days": 7, "depart_date": "2026-12-20"}) is None
+    finally:
+        pack.close()
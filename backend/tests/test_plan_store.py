@@ -0,0 +1,62 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from app.utils.plan_store import PlanStore, RedisPlanStore, SQLitePlanStore, plan_etag
+
+RECORD = {"request": {"destination": "Goa"}, "plan": {"destination": "Goa", "hotels": {"budget": []}}}
+
+
+def test_plan_store_is_abstract():
+    with pytest.raises(TypeError):
+        PlanStore()
+
+
+def test_sqlite_round_trip(tmp_path):
+    store = SQLitePlanStore(str(tmp_path / "plans.sqlite3"))
+    etag = store.put("p1", RECORD)
+    assert etag == plan_etag(RECORD["plan"])
+    assert store.etag("p1") == etag
+    stored = store.get("p1")
+    assert stored["plan"] == RECORD["plan"] and stored["etag"] == etag
+    assert store.get("missing") is None
+
+
+def test_redis_store_shares_plans_and_falls_back_locally(tmp_path):
+    server = fakeredis.FakeServer()
+    store = RedisPlanStore(redis_client=fakeredis.FakeRedis(server=server), local=SQLitePlanStore(str(tmp_path / "a.sqlite3")))
+    other = RedisPlanStore(redis_client=fakeredis.FakeRedis(server=server), local=SQLitePlanStore(str(tmp_path / "b.sqlite3")))
+    etag = store.put("p1", RECORD)
+    assert other.get("p1")["plan"] == RECORD["plan"]
+    assert other.etag("p1") == etag
+
+    server.connected = False
+    assert store.put("p2", RECORD) == etag
+    assert store.get("p2")["plan"] == RECORD["plan"]
+    assert other.get("p2") is None
+
+
+def _reuse(monkeypatch, tmp_path, seconds):
+    from app import planner
+    store = SQLitePlanStore(str(tmp_path / "plans.sqlite3"))
+    monkeypatch.setattr(planner, "plan_store", store)
+    monkeypatch.setattr(planner, "PLAN_REUSE_SECONDS", seconds)
+    request = {"source": "BOM", "destination": "GOI", "depart_date": "2026-12-20", "return_date": "2026-12-23", "theme": "Luxury"}
+    plan = {"destination": "Goa", "meta": {"cache": {}, "fallbacks": [], "degraded": []}}
+    store.put(planner.plan_id_for(request), {"request": request, "inputs": {}, "plan": plan})
+    return planner, request, plan
+
+
+def test_zero_reuse_window_always_plans_anew(monkeypatch, tmp_path):
+    planner, request, _ = _reuse(monkeypatch, tmp_path, 0)
+    assert asyncio.run(planner._stored_plan(request)) is None
+
+
+def test_bypass_cache_skips_plan_reuse(monkeypatch, tmp_path):
+    planner, request, plan = _reuse(monkeypatch, tmp_path, 3600)
+
+    served = asyncio.run(planner.generate_plan_async(request))
+    assert served["destination"] == plan["destination"]
+    assert served["meta"]["cache"]["plan"] == "store"
+    assert asyncio.run(planner._stored_plan({**request, "bypass_cache": True})) is None
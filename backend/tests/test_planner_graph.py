@@ -0,0 +1,65 @@
+import asyncio
+import threading
+import time
+
+from app.planner import AgentSpec, _run_graph, _run_graph_async, agent_graph
+from app.utils.metrics import AGENT_CALLS
+
+
+def _state(budget):
+    agent_graph()  # imports the agent modules, which is slow the first time
+    return {
+        "meta": {"cache": {}, "timings_ms": {}, "fallbacks": [], "degraded": [], "llm_usage": None},
+        "deadline": time.monotonic() + budget,
+    }
+
+
+def test_abandoned_agent_does_not_touch_the_plan_when_it_finishes_late():
+    released = threading.Event()
+
+    def slow(state):
+        released.wait(5)
+        return {"slow": "late answer"}
+
+    def fast(state):
+        return {"fast": "answer"}
+
+    graph = {
+        "slow_test": AgentSpec(slow, None, lambda s: {"slow": "fallback"}),
+        "fast_test": AgentSpec(fast, None, lambda s: {"fast": "fallback"}),
+    }
+    calls_before = AGENT_CALLS.value(agent="slow_test", outcome="success")
+    timeouts_before = AGENT_CALLS.value(agent="slow_test", outcome="timeout")
+
+    state = _run_graph(_state(0.5), graph)
+    assert state["slow"] == "fallback" and state["fast"] == "answer"
+    assert state["meta"]["degraded"] == ["slow_test"]
+    timing = state["meta"]["timings_ms"]["slow_test"]
+
+    # let the abandoned agent finish (and try to record) in the background
+    released.set()
+    time.sleep(0.2)
+    assert state["slow"] == "fallback"
+    assert state["meta"]["timings_ms"]["slow_test"] == timing
+    assert state["meta"]["degraded"] == ["slow_test"]
+    assert AGENT_CALLS.value(agent="slow_test", outcome="timeout") == timeouts_before + 1
+    assert AGENT_CALLS.value(agent="slow_test", outcome="success") == calls_before
+
+
+def test_async_agents_merge_their_meta_slots():
+    async def cached(state):
+        state["meta"]["cache"]["cached_test"] = "pack"
+        return {"cached": "answer"}
+
+    async def slow(state):
+        await asyncio.sleep(5)
+
+    graph = {
+        "cached_test": AgentSpec(None, cached, lambda s: {"cached": "fallback"}),
+        "slow_test_async": AgentSpec(None, slow, lambda s: {"slow": "fallback"}),
+    }
+    state = asyncio.run(_run_graph_async(_state(0.5), graph))
+    assert state["cached"] == "answer" and state["slow"] == "fallback"
+    assert state["meta"]["cache"] == {"cached_test": "pack"}
+    assert state["meta"]["degraded"] == ["slow_test_async"]
+    assert set(state["meta"]["timings_ms"]) == {"cached_test", "slow_test_async"}
@@ -0,0 +1,150 @@
+import time
+import asyncio
+import threading
+
+import fakeredis
+
+from app.utils import rate_limit, redis_helper
+from app.utils.rate_limit import Budget, LocalBuckets, TokenBucketLimiter
+
+
+def _workers(n: int = 2):
+    # one FakeServer stands in for the Redis every worker talks to
+    server = fakeredis.FakeServer()
+    return [TokenBucketLimiter(redis_client=fakeredis.FakeRedis(server=server)) for _ in range(n)]
+
+
+def test_workers_drain_one_shared_bucket():
+    a, b = _workers()
+    budget = Budget("client", 4, 60.0)
+
+    assert a.take(budget, "1.2.3.4").allowed
+    assert b.take(budget, "1.2.3.4").allowed
+    assert a.take(budget, "1.2.3.4").allowed
+    assert b.take(budget, "1.2.3.4").remaining < 0.1
+    denied = a.take(budget, "1.2.3.4")
+    assert not denied.allowed
+    assert 0 < denied.retry_after <= 15
+    # the script ran on Redis: neither worker fell back to its own buckets
+    assert not a.local._buckets and not b.local._buckets
+    # another key is another bucket
+    assert b.take(budget, "5.6.7.8").allowed
+
+
+def test_bucket_refills_at_rate():
+    a, b = _workers()
+    budget = Budget("fast", 2, 0.2)  # 10 tokens/s
+
+    assert a.take(budget, cost=2).allowed
+    assert not b.take(budget).allowed
+    time.sleep(0.15)
+    assert b.take(budget).allowed
+    assert 0 <= a.remaining(budget) < 1
+
+
+def test_forced_take_is_never_denied():
+    a, b = _workers()
+    budget = Budget("llm_tokens", 100, 60.0)
+
+    assert a.take(budget, cost=100).allowed
+    assert not b.take(budget, cost=10).allowed
+    # settling usage past the budget goes through and leaves the bucket in debt
+    forced = b.take(budget, cost=50, force=True)
+    assert forced.allowed
+    assert forced.remaining < 0
+    assert not a.take(budget, cost=1).allowed
+    # a refund (negative cost) pays the debt back
+    assert a.take(budget, cost=-60, force=True).remaining > 0
+
+
+class _NoRedis:
+    def eval(self, *args, **kwargs):
+        raise ConnectionError("redis is down")
+
+
+def _limiter() -> TokenBucketLimiter:
+    # a client whose eval fails falls through to the in-process buckets
+    return TokenBucketLimiter(redis_client=_NoRedis())
+
+
+def test_batch_charges_one_token_per_plan():
+    limiter = _limiter()
+    budget = Budget("client", 5, 60.0)
+
+    assert limiter.take(budget, "1.2.3.4", cost=3).allowed
+    # two left: a second batch of three is refused, as three single requests would be
+    denied = limiter.take(budget, "1.2.3.4", cost=3)
+    assert not denied.allowed
+    assert denied.retry_after > 0
+    assert limiter.take(budget, "1.2.3.4", cost=2).allowed
+    assert not limiter.take(budget, "1.2.3.4").allowed
+
+
+def test_clients_have_separate_buckets():
+    limiter = _limiter()
+    budget = Budget("client", 5, 60.0)
+
+    assert limiter.take(budget, "1.2.3.4", cost=5).allowed
+    assert limiter.take(budget, "5.6.7.8", cost=5).allowed
+    assert not limiter.take(budget, "1.2.3.4").allowed
+
+
+def test_local_buckets_drop_the_least_recently_used():
+    buckets = LocalBuckets(maxsize=3)
+    for client in ("a", "b", "c"):
+        assert buckets.take(client, 2, 1 / 60, 2).allowed
+    # "a" is used again, so "b" is the oldest when "d" arrives
+    assert not buckets.take("a", 2, 1 / 60, 1).allowed
+    assert buckets.take("d", 2, 1 / 60, 1).allowed
+    assert len(buckets) == 3
+    assert not buckets.take("a", 2, 1 / 60, 1).allowed
+    assert not buckets.take("c", 2, 1 / 60, 1).allowed
+    # "b" was dropped and starts over with a full bucket
+    assert buckets.take("b", 2, 1 / 60, 2).allowed
+    assert len(buckets) == 3
+
+
+def test_async_checks_do_not_block_the_loop_on_redis(monkeypatch):
+    monkeypatch.setattr(redis_helper, "REDIS_URL", "redis://unreachable:6379/0")
+    monkeypatch.setattr(redis_helper, "_client", None)
+    monkeypatch.setattr(redis_helper, "_failed_at", None)
+    connects = []
+
+    def get_redis():
+        if redis_helper._failed_at is not None:
+            return None
+        # a connect to an unreachable host: hangs until the socket timeout
+        connects.append(threading.current_thread() is threading.main_thread())
+        time.sleep(0.3)
+        redis_helper._failed_at = redis_helper.time.monotonic()
+        return None
+
+    monkeypatch.setattr(rate_limit, "get_redis", get_redis)
+    limiter = TokenBucketLimiter()
+    monkeypatch.setattr(rate_limit, "rate_limiter", limiter)
+    budget = Budget("client", 5, 60.0)
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        await asyncio.sleep(0)
+        decision = await limiter.take_async(budget, "1.2.3.4")
+        during = ticks
+        # Redis is now known to be down: later checks stay on the loop, without connecting
+        exhausted = await rate_limit.exhausted_budgets_async()
+        second = await limiter.take_async(budget, "1.2.3.4")
+        task.cancel()
+        return decision, during, exhausted, second
+
+    decision, during, exhausted, second = asyncio.run(run())
+    assert decision.allowed and second.allowed
+    assert exhausted == []
+    assert during >= 10
+    assert connects == [False]
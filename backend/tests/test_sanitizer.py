@@ -0,0 +1,115 @@
+"""
+Golden-output check for itinerary_agent._sanitize_text_for_tourist against the
+implementation it replaced (kept verbatim as legacy_sanitize): a corpus that
+covers every entry of the substitution table, case variants, plurals, several
+terms per slot and the overlapping-term corner cases, plus random slots built
+from the table's terms. benchmarks/bench_sanitizer.py reuses these to fuzz and
+time the two at scale.
+"""
+import random
+import re
+
+import pytest
+
+from app.agents.itinerary_agent import _CORP_RE, _SUBSTITUTIONS, _sanitize_text_for_tourist
+
+
+def legacy_sanitize(text: str) -> str:
+    """The pre-compiled-table version: 13 re.sub calls per flagged slot."""
+    if not text:
+        return ""
+    if _CORP_RE.search(text):
+        substitutions = [
+            ("headquarters", "a local museum"),
+            ("R&D", "a science/technology exhibit"),
+            ("research and development", "a technology museum"),
+            ("seminar", "a local cultural talk"),
+            ("workshop", "a handicraft workshop"),
+            ("presentation", "a guided museum tour"),
+            ("meeting", "a leisurely city walk"),
+            ("network", "a food tour or cultural meetup"),
+            ("executive", "local leaders/historians"),
+            ("employees", "locals"),
+            ("company", "local attraction"),
+            ("business", "leisure"),
+            ("product launch", "local festival or event")
+        ]
+        sanitized = text
+        for old, new in substitutions:
+            sanitized = re.sub(re.escape(old), new, sanitized, flags=re.IGNORECASE)
+        if _CORP_RE.search(sanitized):
+            return "Explore a cultural attraction nearby."
+        return sanitized
+    return text
+
+
+GOLDEN = [
+    "",
+    "Visit the Amber Fort",
+    "Sunset at Baga beach, then dinner in Anjuna",
+    # every table entry on its own (each ends up flagged by _CORP_RE or not, both paths matter)
+    *[f"Morning {old} in the old town" for old, _ in _SUBSTITUTIONS],
+    *[f"{old.upper()} downtown" for old, _ in _SUBSTITUTIONS],
+    *[f"{old.title()}s and more {old}" for old, _ in _SUBSTITUTIONS],
+    # flagged by a keyword, rewritten by other terms
+    "Business lunch with company executives near the headquarters",
+    "Networking dinner after the product launch",
+    "R&D tour, then a seminar on research and development",
+    "Meeting the employees of a local company",
+    "Company presentation followed by a networking event",
+    "A business meeting; later a workshop and a seminar",
+    "headquarters HEADQUARTERS Headquarters",
+    "Visit the Infosys headquarter campus",
+    "Team building with executive coaches",
+    # keyword flagged but the replacement still matches -> generic fallback
+    "Pottery workshop in the artisans' quarter",
+    "Executive lounge breakfast",
+    # substrings the word-bounded keyword check does not flag (left untouched)
+    "Companywide celebrations at the fort",
+    "Businessman's walk through the bazaar",
+    "Networked art installations",
+    # overlapping terms and replacement/text run-ons
+    "networkshop by the lake",
+    "A workshopresentation at noon",
+    "Join the business seminar then a businesseminar",
+    "headquarterseeting at 10, company event",
+    "presentationetwork session with executives",
+    "product launcheadquarters tour for the company",
+    "network product launch for the company",
+    "seminaresearch and development meeting",
+    "executivemployees meeting",
+]
+
+TERMS = [old for old, _ in _SUBSTITUTIONS] + ["headquarter", "networking", "employee", "executives", "meetup"]
+FILLER = ["visit", "the", "fort", "beach", "lunch", "and", "then", "a", "local", "market", "-", ",", "tour"]
+
+
+def fuzz_slot(rng: random.Random) -> str:
+    words = []
+    for _ in range(rng.randint(1, 8)):
+        word = rng.choice(TERMS if rng.random() < 0.5 else FILLER)
+        word = rng.choice([word, word.upper(), word.title()])
+        # glue some words together to hit overlap and run-on cases
+        words.append(word if rng.random() < 0.8 or not words else words.pop() + word)
+    return " ".join(words)
+
+
+@pytest.mark.parametrize("text", GOLDEN)
+def test_golden_cases_match_the_legacy_sanitizer(text):
+    assert _sanitize_text_for_tourist(text) == legacy_sanitize(text)
+
+
+def test_random_slots_match_the_legacy_sanitizer():
+    rng = random.Random(7)
+    for text in (fuzz_slot(rng) for _ in range(2000)):
+        assert _sanitize_text_for_tourist(text) == legacy_sanitize(text), text
+
+
+@pytest.mark.parametrize("text,expected", [
+    ("Visit the Amber Fort", "Visit the Amber Fort"),
+    ("Meeting the employees of a local company", "a leisurely city walk the locals of a local local attraction"),
+    ("Pottery workshop in the artisans' quarter", "Explore a cultural attraction nearby."),
+    ("Companywide celebrations at the fort", "Companywide celebrations at the fort"),
+])
+def test_sanitized_text(text, expected):
+    assert _sanitize_text_for_tourist(text) == expected
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from app.utils import serpapi_helper
+from app.utils.rate_limit import BudgetExhaustedError
+from app.utils.resilience import CircuitBreaker, ConcurrencyLimitError
+
+
+class FakeResponse:
+    status_code = 200
+    headers = {}
+
+    def json(self):
+        return {"best_flights": []}
+
+
+class FakeSession:
+    def __init__(self):
+        self.calls = 0
+
+    def get(self, url, params=None, timeout=None):
+        self.calls += 1
+        return FakeResponse()
+
+
+class SheddingLimiter:
+    def acquire(self, priority=None, timeout=None):
+        raise ConcurrencyLimitError("serpapi: shed for higher-priority calls")
+
+    async def acquire_async(self, priority=None, timeout=None):
+        self.acquire(priority, timeout)
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = CircuitBreaker("serpapi", failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    monkeypatch.setattr(serpapi_helper, "serpapi_breaker", breaker)
+    session = FakeSession()
+    monkeypatch.setattr(serpapi_helper, "_session", session)
+    return breaker
+
+
+def test_budget_exhaustion_hands_back_the_half_open_probe(breaker, monkeypatch):
+    monkeypatch.setattr(serpapi_helper, "take_serpapi_call", lambda: False)
+    with pytest.raises(BudgetExhaustedError):
+        serpapi_helper._get_json({})
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    monkeypatch.setattr(serpapi_helper, "take_serpapi_call", lambda: True)
+    assert serpapi_helper._get_json({}) == {"best_flights": []}
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_shed_call_hands_back_the_half_open_probe(breaker, monkeypatch):
+    monkeypatch.setattr(serpapi_helper, "take_serpapi_call", lambda: True)
+    monkeypatch.setattr(serpapi_helper, "serpapi_limiter", SheddingLimiter())
+    with pytest.raises(ConcurrencyLimitError):
+        serpapi_helper._get_json({})
+    assert serpapi_helper._session.calls == 0
+    assert breaker.allow()
+
+
+def test_async_budget_exhaustion_hands_back_the_half_open_probe(breaker, monkeypatch):
+    async def no_budget():
+        return False
+
+    monkeypatch.setattr(serpapi_helper, "take_serpapi_call_async", no_budget)
+    with pytest.raises(BudgetExhaustedError):
+        asyncio.run(serpapi_helper._get_json_async({}))
+    assert breaker.allow()
+
+
+def test_async_shed_call_hands_back_the_half_open_probe(breaker, monkeypatch):
+    async def budget():
+        return True
+
+    monkeypatch.setattr(serpapi_helper, "take_serpapi_call_async", budget)
+    monkeypatch.setattr(serpapi_helper, "serpapi_limiter", SheddingLimiter())
+    with pytest.raises(ConcurrencyLimitError):
+        asyncio.run(serpapi_helper._get_json_async({}))
+    assert breaker.allow()